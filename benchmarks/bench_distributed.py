@@ -0,0 +1,125 @@
+"""Benchmark distributed sweeps: one coordinator, 1..N worker processes.
+
+    python benchmarks/bench_distributed.py [--channels 400] [--worker-counts 1,2,4] [--workers 10] [--json run.json]
+
+Starts benchmarks/iptv_server.py, then for each worker count runs a full
+sweep of its playlist the way it is run for real: `main.py coordinate` plus
+that many `main.py worker` processes, each with --workers threads.  Reports
+per count the sweep time, entries/sec, speedup over the first count and
+scaling efficiency (speedup / worker ratio).  The sweep time is the
+coordinator's own, from the first lease to the last result (read from its
+/status), so playlist loading and process start-up and shutdown are left
+out.  A sweep is I/O bound, so on
+one box efficiency should stay near 1 until the synthetic server or the
+machine's CPU becomes the bottleneck.  All server options (--fail, --pace,
+--max-connections, ...) are accepted.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+from bench_tester import free_port, start_server  # noqa: E402
+from iptv_server import PASSWORD, USERNAME, add_server_args  # noqa: E402
+
+MAIN = os.path.join(ROOT, 'main.py')
+POLL = 0.2
+
+
+def wait_for_sweep(port, coordinator):
+    """Poll the coordinator's /status until the sweep finishes; returns its
+    sweep_seconds (first lease to last result)."""
+    url = f'http://127.0.0.1:{port}/status'
+    while coordinator.poll() is None:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                status = json.load(response)
+        except (OSError, ValueError):
+            status = None  # still loading the playlist
+        if status is not None and status['finished']:
+            return status['sweep_seconds'] or 0.0
+        time.sleep(POLL)
+    raise SystemExit(f"coordinator exited with {coordinator.returncode} before the sweep finished")
+
+
+def sweep(playlist_url, count, args, workdir):
+    """Run one coordinator and `count` workers to completion; returns figures."""
+    port = free_port()
+    journal = os.path.join(workdir, f'sweep-{count}.jsonl')
+    summary = os.path.join(workdir, f'sweep-{count}.json')
+    coordinator = subprocess.Popen(
+        [sys.executable, MAIN, 'coordinate', '--m3u', playlist_url, '--listen', f'127.0.0.1:{port}',
+         '--shard-size', str(args.shard_size), '--journal', journal, '--out', summary, '-q'],
+        stderr=subprocess.DEVNULL)
+    workers = [subprocess.Popen(
+        [sys.executable, MAIN, 'worker', '--coordinator', f'http://127.0.0.1:{port}', '--name', f'bench-{i}',
+         '--workers', str(args.workers), '--probe', args.probe, '-q'],
+        stderr=subprocess.DEVNULL) for i in range(count)]
+    try:
+        elapsed = wait_for_sweep(port, coordinator)
+        coordinator.wait()
+    finally:
+        for worker in workers:
+            try:
+                worker.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                worker.kill()
+    if coordinator.returncode:
+        raise SystemExit(f"coordinator exited with {coordinator.returncode}")
+    with open(summary, encoding='utf-8') as f:
+        stats = json.load(f)
+    return {'workers': count, 'elapsed_seconds': round(elapsed, 2), 'channels': stats['channels'],
+            'ok': stats['ok'], 'entries_per_second': round(stats['channels'] / elapsed, 2) if elapsed else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark coordinator/worker sweeps against a synthetic provider")
+    add_server_args(parser)
+    parser.add_argument('--worker-counts', default='1,2,4', metavar='N,N,...',
+                        help="worker process counts to compare (default: 1,2,4)")
+    parser.add_argument('--workers', type=int, default=10, help="threads per worker process (default: 10)")
+    parser.add_argument('--shard-size', type=int, default=25)
+    parser.add_argument('--probe', choices=('native', 'single', 'legacy'), default='native')
+    parser.add_argument('--json', metavar='FILE', help="also write the figures as JSON")
+    args = parser.parse_args()
+    try:
+        counts = [int(n) for n in args.worker_counts.split(',')]
+    except ValueError:
+        raise SystemExit(f"error: --worker-counts: expected numbers, got {args.worker_counts!r}")
+
+    port = free_port()
+    server = start_server(args, port)
+    playlist_url = f"http://127.0.0.1:{port}/get.php?username={USERNAME}&password={PASSWORD}"
+    runs = []
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            for count in counts:
+                runs.append(sweep(playlist_url, count, args, workdir))
+    finally:
+        server.terminate()
+        server.wait()
+
+    base = runs[0]
+    print(f"{base['channels']} channel entries, {args.workers} threads per worker, shards of {args.shard_size}")
+    for run in runs:
+        speedup = base['elapsed_seconds'] / run['elapsed_seconds'] if run['elapsed_seconds'] else None
+        run['speedup'] = round(speedup, 2) if speedup else None
+        run['efficiency'] = round(speedup / (run['workers'] / base['workers']), 2) if speedup else None
+        print(f"  {run['workers']:>3} workers  {run['elapsed_seconds']:8.2f} s  {run['entries_per_second']:8.2f} "
+              f"entries/s  speedup {run['speedup']}  efficiency {run['efficiency']}  ({run['ok']} OK)")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'threads_per_worker': args.workers, 'shard_size': args.shard_size, 'runs': runs}, f,
+                      indent=2)
+
+
+if __name__ == '__main__':
+    main()
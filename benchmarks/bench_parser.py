@@ -0,0 +1,96 @@
+"""Benchmark the streaming M3U parser on a synthetic playlist.
+
+    python benchmarks/bench_parser.py [--lines 1000000] [--legacy]
+
+Writes a playlist with `--lines` lines (two per channel) to a temp file,
+parses it with iptvchecker.playlist and reports wall time and peak RSS.
+--legacy runs the original read()/split()/dict parser instead, for
+comparison; run each mode in its own process so peak RSS is meaningful.
+"""
+import argparse
+import os
+import re
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from iptvchecker.playlist import iter_file_lines, load_m3u  # noqa: E402
+
+
+def write_playlist(path, lines):
+    groups = [f"Group {i:03d} | FHD" for i in range(400)]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('#EXTM3U\n')
+        for i in range(lines // 2):
+            group = groups[i % len(groups)]
+            f.write(f'#EXTINF:-1 tvg-id="ch{i}.uk" tvg-name="Channel {i}" '
+                    f'tvg-logo="http://logos.example/{i}.png" group-title="{group}",Channel {i}\n')
+            f.write(f'http://provider.example:8080/live/user/pass/{i}.ts\n')
+
+
+def legacy_parse(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    channels, groups = [], {}
+    current = {}
+    for line in content.split('\n'):
+        line = line.strip()
+        if line.startswith('#EXTINF'):
+            group = "Uncategorized"
+            m = re.search(r'group-title="([^"]*)"', line, re.IGNORECASE)
+            if m:
+                group = m.group(1).strip()
+            else:
+                m = re.search(r"group-title='([^']*)'", line, re.IGNORECASE)
+                if m:
+                    group = m.group(1).strip()
+            parts = line.split(',', 1)
+            current = {'name': parts[1].strip() if len(parts) > 1 else "Unknown", 'group': group}
+        elif line and not line.startswith('#') and current:
+            current['url'] = line
+            channels.append(current)
+            groups.setdefault(current['group'], []).append(current)
+            current = {}
+    return channels, groups
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=1000000)
+    parser.add_argument('--legacy', action='store_true', help="benchmark the original parser")
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.m3u')
+    os.close(fd)
+    try:
+        write_playlist(path, args.lines)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        baseline = peak_rss_mb()
+        start = time.perf_counter()
+        if args.legacy:
+            channels, groups = legacy_parse(path)
+            count, group_count = len(channels), len(groups)
+        else:
+            playlist = load_m3u(iter_file_lines(path))
+            count, group_count = len(playlist), len(playlist.groups)
+        elapsed = time.perf_counter() - start
+    finally:
+        os.remove(path)
+
+    print(f"parser:    {'legacy' if args.legacy else 'streaming'}")
+    print(f"playlist:  {args.lines} lines, {size_mb:.1f} MB")
+    print(f"channels:  {count} in {group_count} groups")
+    print(f"time:      {elapsed:.2f}s ({args.lines / elapsed:,.0f} lines/s)")
+    print(f"peak RSS:  {peak_rss_mb():.0f} MB (+{peak_rss_mb() - baseline:.0f} MB while parsing)")
+
+
+if __name__ == '__main__':
+    main()
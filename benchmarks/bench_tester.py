@@ -0,0 +1,190 @@
+"""Benchmark the stream tester against the local synthetic provider.
+
+    python benchmarks/bench_tester.py [--channels 200] [--workers 20] [--source xtream] [--json run.json]
+
+Starts benchmarks/iptv_server.py in a child process (rendering its test
+streams with ffmpeg on first use), loads its playlist over M3U or the Xtream
+API, runs iptvchecker's StreamTester over every channel and reports:
+
+    throughput   channel entries/sec and unique sources/sec
+    latency      p50/p95/p99 of the per-source test_stream() time
+    CPU          user+system seconds of this process and its ffprobe children
+    memory       peak RSS of this process and of the largest child
+
+All server options (--fail, --pace, --max-connections, ...) are accepted, so
+the same scenario can be replayed before and after a change; --json writes
+the figures for comparison.
+"""
+import argparse
+import json
+import math
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import Counter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from iptv_server import PASSWORD, USERNAME, add_server_args  # noqa: E402
+
+from iptvchecker.playlist import iter_url_lines, load_m3u  # noqa: E402
+from iptvchecker.tester import StreamTester  # noqa: E402
+from iptvchecker.xtream import load_xtream  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(args, port):
+    command = [sys.executable, os.path.join(HERE, 'iptv_server.py'), '--port', str(port),
+               '--channels', str(args.channels), '--fail', args.fail, '--hls-share', str(args.hls_share),
+               '--duplicates', str(args.duplicates), '--max-connections', str(args.max_connections),
+               '--pace', str(args.pace), '--slow-seconds', str(args.slow_seconds),
+               '--stall-seconds', str(args.stall_seconds), '--media-dir', args.media_dir,
+               '--seed', str(args.seed)]
+    # The server renders any missing test streams before listening, which can
+    # take a while on first use; doing it there keeps ffmpeg out of our rusage.
+    server = subprocess.Popen(command)
+    probe_url = f"http://127.0.0.1:{port}/player_api.php?username={USERNAME}&password={PASSWORD}"
+    deadline = time.monotonic() + 600
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit("benchmark server exited during startup")
+        try:
+            urllib.request.urlopen(probe_url, timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise SystemExit("benchmark server did not come up")
+
+
+def percentile(ordered, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def cpu_seconds(who):
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+def rss_mb(kb):
+    # ru_maxrss is in KB on Linux, bytes on macOS
+    return kb / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark StreamTester against a synthetic provider")
+    add_server_args(parser)
+    parser.add_argument('--source', choices=('m3u', 'xtream'), default='m3u',
+                        help="load channels from get.php or player_api.php (default: m3u)")
+    parser.add_argument('--workers', type=int, default=20)
+    parser.add_argument('--per-host', type=int, default=0)
+    parser.add_argument('--probe', choices=('native', 'single', 'legacy'), default='native')
+    parser.add_argument('--no-preflight', action='store_true')
+    parser.add_argument('--bitrate-tolerance', type=float, default=5, metavar='PCT')
+    parser.add_argument('--hls-variants', choices=('top', 'all'), default='top')
+    parser.add_argument('--json', metavar='FILE', help="also write the figures as JSON")
+    args = parser.parse_args()
+
+    port = free_port()
+    server = start_server(args, port)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        started = time.perf_counter()
+        if args.source == 'xtream':
+            playlist = load_xtream(base, USERNAME, PASSWORD)
+        else:
+            playlist = load_m3u(iter_url_lines(f"{base}/get.php?username={USERNAME}&password={PASSWORD}"))
+        load_seconds = time.perf_counter() - started
+
+        tester = StreamTester(workers=args.workers, per_host=args.per_host, probe=args.probe,
+                              use_preflight=not args.no_preflight, limits=playlist.accounts,
+                              tolerance=args.bitrate_tolerance / 100, hls_variants=args.hls_variants)
+        latencies = []
+        test_stream = tester.test_stream
+
+        def timed(channel, cancel=None):
+            t0 = time.perf_counter()
+            try:
+                return test_stream(channel, cancel)
+            finally:
+                latencies.append(time.perf_counter() - t0)
+
+        tester.test_stream = timed
+        statuses = Counter()
+        cpu_self, cpu_children = cpu_seconds(resource.RUSAGE_SELF), cpu_seconds(resource.RUSAGE_CHILDREN)
+        started = time.perf_counter()
+        tester.run(playlist.channels, on_result=lambda r: statuses.update([r['status']]))
+        elapsed = time.perf_counter() - started
+        cpu_self = cpu_seconds(resource.RUSAGE_SELF) - cpu_self
+        # The server is still running, so children here are the reaped ffprobe processes only.
+        cpu_children = cpu_seconds(resource.RUSAGE_CHILDREN) - cpu_children
+        peak_child = rss_mb(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+    figures = {
+        'source': args.source,
+        'workers': args.workers,
+        'probe': args.probe,
+        'preflight': not args.no_preflight,
+        'bitrate_tolerance': args.bitrate_tolerance,
+        'hls_variants': args.hls_variants,
+        'entries': tester.entries,
+        'sources': tester.sources,
+        'load_seconds': round(load_seconds, 3),
+        'elapsed_seconds': round(elapsed, 3),
+        'entries_per_second': round(tester.entries / elapsed, 2) if elapsed else None,
+        'sources_per_second': round(tester.sources / elapsed, 2) if elapsed else None,
+        'latency_p50': percentile(latencies, 50),
+        'latency_p95': percentile(latencies, 95),
+        'latency_p99': percentile(latencies, 99),
+        'cpu_seconds': round(cpu_self, 2),
+        'child_cpu_seconds': round(cpu_children, 2),
+        'peak_rss_mb': round(rss_mb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss), 1),
+        'peak_child_rss_mb': round(peak_child, 1),
+        'analyzed': tester.analyzed,
+        'ffprobe_fallbacks': tester.fallbacks,
+        'playlist_fetches': tester.playlists.misses,
+        'playlist_cache_hits': tester.playlists.hits,
+        'statuses': dict(statuses),
+    }
+    for key in ('latency_p50', 'latency_p95', 'latency_p99'):
+        if figures[key] is not None:
+            figures[key] = round(figures[key], 3)
+
+    print(f"{figures['entries']} entries ({figures['sources']} unique sources) via {args.source}, "
+          f"{args.workers} workers, probe={args.probe}, preflight={figures['preflight']}")
+    print(f"  playlist load   {figures['load_seconds']:.2f} s")
+    print(f"  test run        {figures['elapsed_seconds']:.2f} s")
+    print(f"  throughput      {figures['entries_per_second']} entries/s, {figures['sources_per_second']} sources/s")
+    print(f"  latency         p50 {figures['latency_p50']} s, p95 {figures['latency_p95']} s, "
+          f"p99 {figures['latency_p99']} s")
+    print(f"  CPU             {figures['cpu_seconds']} s tester, {figures['child_cpu_seconds']} s ffprobe")
+    print(f"  peak RSS        {figures['peak_rss_mb']} MB tester, {figures['peak_child_rss_mb']} MB largest child")
+    if args.probe == 'native':
+        print(f"  native probe    {tester.analyzed} analyzed in-process, {tester.fallbacks} ffprobe fallbacks")
+        print(f"  HLS playlists   {tester.playlists.misses} fetched, {tester.playlists.hits} shared from cache")
+    print("  statuses        " + ", ".join(f"{k} {v}" for k, v in statuses.most_common()))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(figures, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,361 @@
+"""Local synthetic IPTV provider for benchmarks.
+
+    python benchmarks/iptv_server.py [--channels 500] [--port 8765] [--fail 404=0.1,slow=0.05]
+
+Test streams are rendered once with ffmpeg's lavfi sources (testsrc2 video,
+a sine tone for audio) into --media-dir, one MPEG-TS file and one HLS
+rendition per profile, and reused on later runs.  The server then plays an
+Xtream Codes panel on top of them:
+
+    /get.php?username=U&password=P     M3U playlist of every channel
+    /player_api.php?...                auth, get_live_categories, get_live_streams
+    /live/U/P/<id>.ts                  MPEG-TS stream
+    /live/U/P/<id>.m3u8                HLS master playlist
+    /hls/<profile>/...                 HLS variant playlists and segments
+
+Each channel gets a profile (resolution, fps, bitrate) and optionally one of
+the failure modes below, assigned deterministically from --seed:
+
+    404        the stream URL answers 404
+    slow       the first byte is delayed by --slow-seconds
+    stall      a few seconds of data, then nothing for --stall-seconds
+    truncated  part of the stream, cut off mid-packet
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+USERNAME = 'bench'
+PASSWORD = 'bench'
+MEDIA_SECONDS = 12
+CHUNK = 188 * 64
+
+# name, width, height, fps, video kbps
+PROFILES = [
+    ('sd', 720, 576, 25, 1500),
+    ('hd720p50', 1280, 720, 50, 3500),
+    ('fhd25', 1920, 1080, 25, 6000),
+    ('fhd50', 1920, 1080, 50, 8000),
+    ('mobile', 640, 360, 30, 800),
+]
+FAILURES = ('404', 'slow', 'stall', 'truncated')
+CATEGORIES = ['News', 'Sports', 'Movies', 'Kids', 'Music', 'Documentary']
+
+
+def render_media(media_dir, profiles=PROFILES, seconds=MEDIA_SECONDS, ffmpeg='ffmpeg'):
+    """Render every profile to <name>.ts and <name>/index.m3u8 unless present."""
+    os.makedirs(media_dir, exist_ok=True)
+    for name, width, height, fps, kbps in profiles:
+        ts_path = os.path.join(media_dir, f'{name}.ts')
+        hls_dir = os.path.join(media_dir, name)
+        if os.path.exists(ts_path) and os.path.exists(os.path.join(hls_dir, 'index.m3u8')):
+            continue
+        if shutil.which(ffmpeg) is None:
+            raise SystemExit(f"{ffmpeg} not found; it is needed once to render the test streams")
+        source = [
+            ffmpeg, '-v', 'error', '-y',
+            '-f', 'lavfi', '-i', f'testsrc2=size={width}x{height}:rate={fps}',
+            '-f', 'lavfi', '-i', 'sine=frequency=1000:sample_rate=48000',
+            '-t', str(seconds),
+            '-c:v', 'libx264', '-preset', 'ultrafast', '-b:v', f'{kbps}k', '-maxrate', f'{kbps}k',
+            '-bufsize', f'{kbps * 2}k', '-g', str(fps * 2), '-pix_fmt', 'yuv420p',
+            '-c:a', 'aac', '-b:a', '96k', '-ac', '2', '-metadata:s:a:0', 'language=eng',
+        ]
+        if not os.path.exists(ts_path):
+            print(f"Rendering {name} ({width}x{height}@{fps}, {kbps} kbps)", file=sys.stderr)
+            subprocess.run(source + ['-f', 'mpegts', ts_path], check=True)
+        if not os.path.exists(os.path.join(hls_dir, 'index.m3u8')):
+            os.makedirs(hls_dir, exist_ok=True)
+            subprocess.run(source + ['-f', 'hls', '-hls_time', '2', '-hls_list_size', '0',
+                                     '-hls_segment_filename', os.path.join(hls_dir, 'seg_%03d.ts'),
+                                     os.path.join(hls_dir, 'index.m3u8')], check=True)
+
+
+def parse_failures(text):
+    """'404=0.1,stall=0.05' -> {'404': 0.1, 'stall': 0.05}."""
+    rates = {}
+    for item in filter(None, (text or '').split(',')):
+        mode, _, rate = item.partition('=')
+        if mode not in FAILURES:
+            raise ValueError(f"unknown failure mode {mode!r}; use {', '.join(FAILURES)}")
+        rates[mode] = float(rate)
+    if sum(rates.values()) > 1:
+        raise ValueError("failure rates add up to more than 1")
+    return rates
+
+
+def build_catalog(channels, failures=None, hls_share=0.2, duplicates=0.0, seed=1):
+    """One dict per stream id: name, category, profile, kind ('ts'/'hls'), failure.
+
+    `duplicates` is the share of extra M3U entries that repeat an existing
+    stream under another category, as provider playlists tend to.
+    """
+    rng = random.Random(seed)
+    failures = failures or {}
+    catalog = {}
+    for stream_id in range(1, channels + 1):
+        roll = rng.random()
+        failure = None
+        for mode, rate in failures.items():
+            if roll < rate:
+                failure = mode
+                break
+            roll -= rate
+        catalog[stream_id] = {
+            'name': f"Bench {stream_id}",
+            'category': stream_id % len(CATEGORIES) + 1,
+            'profile': PROFILES[stream_id % len(PROFILES)][0],
+            'kind': 'hls' if rng.random() < hls_share else 'ts',
+            'failure': failure,
+            'also_in': [rng.randrange(1, len(CATEGORIES) + 1)] if rng.random() < duplicates else [],
+        }
+    return catalog
+
+
+class Provider:
+    """Everything a request handler needs: catalog, media and failure timings."""
+
+    def __init__(self, catalog, media_dir, max_connections=0, pace=1.0, slow_seconds=8.0,
+                 stall_seconds=30.0, username=USERNAME, password=PASSWORD):
+        self.catalog = catalog
+        self.media_dir = media_dir
+        self.max_connections = max_connections
+        self.pace = pace
+        self.slow_seconds = slow_seconds
+        self.stall_seconds = stall_seconds
+        self.username = username
+        self.password = password
+        self.active = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.profiles = {p[0]: p for p in PROFILES}
+
+    def base(self, handler):
+        return f"http://{handler.headers.get('Host') or '%s:%d' % handler.server.server_address[:2]}"
+
+    def m3u(self, base):
+        lines = ['#EXTM3U']
+        for stream_id, ch in self.catalog.items():
+            ext = 'm3u8' if ch['kind'] == 'hls' else 'ts'
+            for category in [ch['category']] + ch['also_in']:
+                lines.append(f'#EXTINF:-1 tvg-id="bench{stream_id}" tvg-name="{ch["name"]}" '
+                             f'group-title="{CATEGORIES[category - 1]}",{ch["name"]}')
+                lines.append(f'{base}/live/{self.username}/{self.password}/{stream_id}.{ext}')
+        return '\n'.join(lines) + '\n'
+
+    def player_api(self, query, base):
+        action = query.get('action', [''])[0]
+        if action == 'get_live_categories':
+            return [{'category_id': str(i), 'category_name': name, 'parent_id': 0}
+                    for i, name in enumerate(CATEGORIES, 1)]
+        if action == 'get_live_streams':
+            wanted = query.get('category_id', [None])[0]
+            return [{'num': i, 'name': ch['name'], 'stream_type': 'live', 'stream_id': stream_id,
+                     'stream_icon': '', 'epg_channel_id': f'bench{stream_id}',
+                     'category_id': str(ch['category'])}
+                    for i, (stream_id, ch) in enumerate(self.catalog.items(), 1)
+                    if wanted is None or str(ch['category']) == wanted]
+        host, _, port = base.split('://', 1)[1].partition(':')
+        return {
+            'user_info': {'username': self.username, 'password': self.password, 'auth': 1,
+                          'status': 'Active', 'max_connections': str(self.max_connections or 100),
+                          'active_cons': str(self.active)},
+            'server_info': {'url': host, 'port': port or '80', 'server_protocol': 'http'},
+        }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    provider = None  # set on the subclass made by make_server()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        provider = self.provider
+        with provider.lock:
+            provider.requests += 1
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        parts = [p for p in url.path.split('/') if p]
+        if url.path == '/get.php':
+            if not self._authorized(query):
+                return self._status(403)
+            return self._body(provider.m3u(provider.base(self)).encode(), 'audio/x-mpegurl')
+        if url.path == '/player_api.php':
+            if not self._authorized(query):
+                return self._json({'user_info': {'auth': 0}})
+            return self._json(provider.player_api(query, provider.base(self)))
+        if len(parts) == 4 and parts[0] == 'live':
+            if (parts[1], parts[2]) != (provider.username, provider.password):
+                return self._status(403)
+            stream_id, _, ext = parts[3].partition('.')
+            channel = provider.catalog.get(int(stream_id)) if stream_id.isdigit() else None
+            if channel is None:
+                return self._status(404)
+            return self._live(channel, ext)
+        if len(parts) == 3 and parts[0] == 'hls' and parts[1] in provider.profiles:
+            return self._file(os.path.join(provider.media_dir, parts[1], os.path.basename(parts[2])))
+        return self._status(404)
+
+    def _authorized(self, query):
+        return (query.get('username', [''])[0], query.get('password', [''])[0]) == \
+            (self.provider.username, self.provider.password)
+
+    def _status(self, code):
+        self.send_response(code)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _body(self, data, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _json(self, data):
+        self._body(json.dumps(data).encode(), 'application/json')
+
+    def _file(self, path):
+        if not os.path.isfile(path):
+            return self._status(404)
+        content_type = 'application/vnd.apple.mpegurl' if path.endswith('.m3u8') else 'video/mp2t'
+        with open(path, 'rb') as f:
+            self._body(f.read(), content_type)
+
+    def _live(self, channel, ext):
+        provider = self.provider
+        failure = channel['failure']
+        if failure == '404':
+            return self._status(404)
+        with provider.lock:
+            if provider.max_connections and provider.active >= provider.max_connections:
+                refused = True
+            else:
+                refused = False
+                provider.active += 1
+        if refused:
+            return self._status(429)
+        try:
+            if failure == 'slow':
+                time.sleep(provider.slow_seconds)
+            if ext == 'm3u8':
+                return self._master(channel)
+            self._stream(channel, failure)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with provider.lock:
+                provider.active -= 1
+
+    def _master(self, channel):
+        name, width, height, fps, kbps = self.provider.profiles[channel['profile']]
+        variants = [(name, width, height, fps, kbps)]
+        if name != 'mobile':
+            variants.append(self.provider.profiles['mobile'])
+        lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+        for v_name, v_width, v_height, v_fps, v_kbps in variants:
+            lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={(v_kbps + 96) * 1000},'
+                         f'RESOLUTION={v_width}x{v_height},FRAME-RATE={v_fps},CODECS="avc1.640028,mp4a.40.2"')
+            lines.append(f'/hls/{v_name}/index.m3u8')
+        self._body(('\n'.join(lines) + '\n').encode(), 'application/vnd.apple.mpegurl')
+
+    def _stream(self, channel, failure):
+        """Send the channel's TS file like a live source: no length, paced at
+        `pace` times real time (0 = as fast as possible)."""
+        provider = self.provider
+        path = os.path.join(provider.media_dir, f"{channel['profile']}.ts")
+        size = os.path.getsize(path)
+        rate = size / MEDIA_SECONDS * provider.pace if provider.pace else None
+        limit = size // 2 + 77 if failure == 'truncated' else size  # cut mid-packet
+        stall_at = int(rate * 3) if failure == 'stall' and rate else size // 4
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp2t')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        started = time.monotonic()
+        sent = 0
+        with open(path, 'rb') as f:
+            while sent < limit:
+                if failure == 'stall' and sent >= stall_at:
+                    time.sleep(provider.stall_seconds)
+                    return
+                chunk = f.read(min(CHUNK, limit - sent))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                sent += len(chunk)
+                if rate:
+                    ahead = sent / rate - (time.monotonic() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+
+
+def make_server(provider, host='127.0.0.1', port=0):
+    """A ThreadingHTTPServer for `provider`; port 0 picks a free one."""
+    handler = type('ProviderHandler', (Handler,), {'provider': provider})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def add_server_args(parser):
+    parser.add_argument('--channels', type=int, default=200, help="number of streams (default: 200)")
+    parser.add_argument('--fail', default='404=0.1,slow=0.05,stall=0.05,truncated=0.05', metavar='MODE=SHARE,...',
+                        help="failure mode shares (default: %(default)s)")
+    parser.add_argument('--hls-share', type=float, default=0.2, help="share of HLS channels (default: 0.2)")
+    parser.add_argument('--duplicates', type=float, default=0.25,
+                        help="share of streams listed under a second category (default: 0.25)")
+    parser.add_argument('--max-connections', type=int, default=0,
+                        help="refuse streams past this many at once with 429 (default: no limit)")
+    parser.add_argument('--pace', type=float, default=1.0,
+                        help="stream speed relative to real time, 0 for unthrottled (default: 1)")
+    parser.add_argument('--slow-seconds', type=float, default=8.0, help="first-byte delay for 'slow' (default: 8)")
+    parser.add_argument('--stall-seconds', type=float, default=30.0, help="pause length for 'stall' (default: 30)")
+    parser.add_argument('--media-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'media'),
+                        help="where rendered test streams are kept (default: benchmarks/media)")
+    parser.add_argument('--seed', type=int, default=1)
+
+
+def provider_from_args(args):
+    render_media(args.media_dir)
+    try:
+        failures = parse_failures(args.fail)
+    except ValueError as e:
+        raise SystemExit(f"error: --fail: {e}")
+    catalog = build_catalog(args.channels, failures, args.hls_share, args.duplicates, args.seed)
+    return Provider(catalog, args.media_dir, max_connections=args.max_connections, pace=args.pace,
+                    slow_seconds=args.slow_seconds, stall_seconds=args.stall_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    add_server_args(parser)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    server = make_server(provider_from_args(args), args.host, args.port)
+    base = f"http://{args.host}:{server.server_address[1]}"
+    print(f"Serving {args.channels} channels", file=sys.stderr)
+    print(f"  M3U:    {base}/get.php?username={USERNAME}&password={PASSWORD}&type=m3u_plus", file=sys.stderr)
+    print(f"  Xtream: {base} {USERNAME} {PASSWORD}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""Check the in-process TS analyzer against ffprobe on generated streams.
+
+    python benchmarks/validate_tsinfo.py [--media-dir benchmarks/media] [--json report.json]
+
+Renders a corpus of MPEG-TS files with ffmpeg's lavfi sources (the
+benchmark server's profiles plus H.264 high/interlaced, HEVC, MPEG-2 and
+AC-3/E-AC-3/MP2/MP3 audio, multi-track and audio-only), serves them over a
+local HTTP server and reads each one both ways: through preflight() with the
+tsinfo analyzer, as the 'native' probe does, and with probe_stream().  Codec,
+resolution, frame rate, audio tracks and bitrate (within --bitrate-tolerance)
+must agree; exits 1 on any mismatch.
+"""
+import argparse
+import functools
+import http.server
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from iptv_server import MEDIA_SECONDS, PROFILES, render_media  # noqa: E402
+
+from iptvchecker.preflight import make_session, preflight  # noqa: E402
+from iptvchecker.probe import probe_stream  # noqa: E402
+from iptvchecker.tsinfo import analyze  # noqa: E402
+
+VIDEO = {
+    'h264': ['-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p'],
+    'h264i': ['-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p', '-flags', '+ildct+ilme'],
+    'hevc': ['-c:v', 'libx265', '-preset', 'ultrafast', '-x265-params', 'log-level=error'],
+    'mpeg2': ['-c:v', 'mpeg2video', '-q:v', '4'],
+}
+AUDIO = {'aac': 'aac', 'mp2': 'mp2', 'mp3': 'libmp3lame', 'ac3': 'ac3', 'eac3': 'eac3'}
+
+# name, video encoder (None for radio), width, height, rate, [(audio codec, channels, language)]
+CORPUS = [
+    ('h264-1080p25-aac', 'h264', 1920, 1080, '25', [('aac', 2, 'eng')]),
+    ('h264-720p50-ac3', 'h264', 1280, 720, '50', [('ac3', 6, 'eng'), ('aac', 2, 'deu')]),
+    ('h264-480p2997-mp2', 'h264', 720, 480, '30000/1001', [('mp2', 2, None)]),
+    ('h264-odd-mp3', 'h264', 854, 478, '24', [('mp3', 1, 'fra')]),
+    ('h264-576i25', 'h264i', 720, 576, '25', [('aac', 2, 'eng')]),
+    ('hevc-1080p25-eac3', 'hevc', 1920, 1080, '25', [('eac3', 6, 'eng')]),
+    ('hevc-720p60-aac', 'hevc', 1280, 720, '60', [('aac', 1, None)]),
+    ('mpeg2-576i25-mp2', 'mpeg2', 720, 576, '25', [('mp2', 2, 'eng'), ('ac3', 2, 'spa')]),
+    ('radio-aac', None, 0, 0, '25', [('aac', 2, 'eng')]),
+]
+
+
+def render_corpus(media_dir, seconds=MEDIA_SECONDS, ffmpeg='ffmpeg'):
+    """Render every CORPUS entry to <media_dir>/tsinfo/<name>.ts unless present."""
+    out_dir = os.path.join(media_dir, 'tsinfo')
+    os.makedirs(out_dir, exist_ok=True)
+    for name, video, width, height, rate, tracks in CORPUS:
+        path = os.path.join(out_dir, f'{name}.ts')
+        if os.path.exists(path):
+            continue
+        if shutil.which(ffmpeg) is None:
+            raise SystemExit(f"{ffmpeg} not found; it is needed once to render the test streams")
+        command = [ffmpeg, '-v', 'error', '-y']
+        if video:
+            command += ['-f', 'lavfi', '-i', f'testsrc2=size={width}x{height}:rate={rate}']
+        command += ['-f', 'lavfi', '-i', 'sine=frequency=1000:sample_rate=48000', '-t', str(seconds)]
+        if video:
+            command += ['-map', '0:v'] + VIDEO[video] + ['-b:v', '2000k']
+        audio_input = 1 if video else 0
+        for i, (codec, channels, language) in enumerate(tracks):
+            command += ['-map', f'{audio_input}:a', f'-c:a:{i}', AUDIO[codec], f'-ac:a:{i}', str(channels),
+                        f'-b:a:{i}', '192k' if channels > 2 else '96k']
+            if language:
+                command += [f'-metadata:s:a:{i}', f'language={language}']
+        print(f"Rendering {name}", file=sys.stderr)
+        subprocess.run(command + ['-f', 'mpegts', path], check=True)
+    return [os.path.join('tsinfo', f'{entry[0]}.ts') for entry in CORPUS]
+
+
+def serve(directory):
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=directory)
+    handler.log_message = lambda *args: None
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def summary(info):
+    """The comparable fields of a probe info dict."""
+    return {
+        'codec': info['codec'],
+        'resolution': f"{info['width']}x{info['height']}" if info['width'] else None,
+        'fps': round(info['fps'], 2) if info['fps'] else None,
+        'audio': [(t['codec'], t['channels'], t['language']) for t in info['audio_tracks']],
+        'bitrate_kbps': round(info['bitrate_kbps']) if info['bitrate_kbps'] else None,
+    }
+
+
+def compare(native, reference, tolerance):
+    """Names of the fields where the analyzer disagrees with ffprobe."""
+    wrong = [field for field in ('codec', 'resolution', 'audio') if native[field] != reference[field]]
+    if reference['fps'] and (not native['fps'] or abs(native['fps'] - reference['fps']) / reference['fps'] > 0.01):
+        wrong.append('fps')
+    if reference['bitrate_kbps']:
+        if not native['bitrate_kbps'] or abs(native['bitrate_kbps'] / reference['bitrate_kbps'] - 1) > tolerance:
+            wrong.append('bitrate_kbps')
+    return wrong
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate iptvchecker.tsinfo against ffprobe")
+    parser.add_argument('--media-dir', default=os.path.join(HERE, 'media'))
+    parser.add_argument('--bitrate-tolerance', type=float, default=0.15,
+                        help="allowed relative bitrate difference (default: 0.15)")
+    parser.add_argument('--json', metavar='FILE', help="also write the comparison as JSON")
+    args = parser.parse_args()
+
+    render_media(args.media_dir)
+    files = [f'{profile[0]}.ts' for profile in PROFILES] + render_corpus(args.media_dir)
+    server = serve(args.media_dir)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    session = make_session(1)
+    report = []
+    try:
+        for name in files:
+            url = f"{base}/{name}"
+            started = time.perf_counter()
+            status, detail = preflight(url, session, analyze=analyze)
+            native_seconds = time.perf_counter() - started
+            analyzer = detail['analysis']
+            started = time.perf_counter()
+            _, info = probe_stream(url)
+            ffprobe_seconds = time.perf_counter() - started
+            reference = summary(info)
+            row = {'file': name, 'preflight': status, 'decided': bool(analyzer and analyzer.decided),
+                   'native_seconds': round(native_seconds, 3), 'ffprobe_seconds': round(ffprobe_seconds, 3),
+                   'ffprobe': reference}
+            if analyzer is not None:
+                row['native'] = summary(analyzer.info())
+                row['mismatch'] = compare(row['native'], reference, args.bitrate_tolerance)
+            else:
+                row['mismatch'] = ['not analyzed']
+            report.append(row)
+    finally:
+        server.shutdown()
+
+    failed = 0
+    for row in report:
+        verdict = "ok" if not row['mismatch'] else "MISMATCH " + ", ".join(row['mismatch'])
+        if not row['decided']:
+            verdict += " (undecided, would fall back to ffprobe)"
+        failed += bool(row['mismatch'])
+        print(f"{row['file']:<32} {row['native_seconds']:6.2f}s vs {row['ffprobe_seconds']:6.2f}s  {verdict}")
+        if row['mismatch']:
+            print(f"    native  {row.get('native')}\n    ffprobe {row['ffprobe']}")
+    print(f"{len(report) - failed}/{len(report)} streams match ffprobe")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
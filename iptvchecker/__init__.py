@@ -0,0 +1,2 @@
+"""Core library for the IPTV Stream Quality Tester."""
+from .engine import StreamTestEngine, Cancelled, run_command
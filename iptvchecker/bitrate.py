@@ -0,0 +1,148 @@
+"""Adaptive bitrate sampling.
+
+A fixed read (say 10 seconds, total bytes / 10) is slow for every channel
+and wrong whenever a provider bursts its buffer at startup or stalls, since
+the time divided by is not the time the bytes cover.  BitrateSampler is fed
+(bytes, stream timestamp, wall clock) observations as they arrive:
+
+* the estimate is bytes over the span of stream time they cover (wall time
+  only when the source has no timestamps), so bursts and stalls do not
+  skew it;
+* every WINDOW seconds of stream time the running estimate is noted, and
+  sampling is done once the last few agree within `tolerance`, after at
+  least `min_seconds`; erratic streams keep sampling up to `max_seconds`;
+* per-window rates give the min/max, wall gaps of `stall_seconds` or more
+  count as stalls, and falling `underrun_seconds` behind real time (what a
+  player without a pre-buffer would do) counts as an underrun;
+* a source that stops mid-read (a read timeout or a dropped connection) is
+  marked with interrupt(), a zero-byte observation at that wall time that
+  counts as a stall and an underrun, since nothing more will arrive.
+"""
+import time
+
+TOLERANCE = 0.05
+MIN_SECONDS = 3.0
+MAX_SECONDS = 20.0
+WINDOW = 0.5
+STABLE_WINDOWS = 6
+STALL_SECONDS = 1.0
+UNDERRUN_SECONDS = 1.0
+
+
+def empty_stats():
+    return {'bitrate_kbps': None, 'bitrate_min_kbps': None, 'bitrate_max_kbps': None, 'stalls': 0,
+            'underruns': 0, 'sample_seconds': None}
+
+
+class BitrateSampler:
+    def __init__(self, tolerance=TOLERANCE, min_seconds=MIN_SECONDS, max_seconds=MAX_SECONDS, window=WINDOW,
+                 stall_seconds=STALL_SECONDS, underrun_seconds=UNDERRUN_SECONDS):
+        self.tolerance = tolerance
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.window = window
+        self.stall_seconds = stall_seconds
+        self.underrun_seconds = underrun_seconds
+        self.bytes = 0
+        self.stalls = 0
+        self.underruns = 0
+        self.first_ts = self.last_ts = None
+        self.first_wall = self.last_wall = None
+        self._timestamps = None  # decided by the first observation
+        self._window_start = None
+        self._window_bytes = 0
+        self._rates = []  # kbps of each completed window
+        self._estimates = []  # running estimate at the end of each window
+        self._underrun = False
+        self.interrupted = False
+
+    @property
+    def span(self):
+        """Seconds of stream covered so far."""
+        if self.first_ts is None:
+            return 0.0
+        return self.last_ts - self.first_ts
+
+    @property
+    def estimate(self):
+        span = self.span
+        return self.bytes * 8 / 1000 / span if span > 0 else None
+
+    @property
+    def converged(self):
+        if self.span < self.min_seconds or len(self._estimates) < STABLE_WINDOWS:
+            return False
+        current = self._estimates[-1]
+        return current > 0 and all(abs(e - current) <= self.tolerance * current
+                                   for e in self._estimates[-STABLE_WINDOWS:])
+
+    @property
+    def done(self):
+        return self.converged or self.span >= self.max_seconds
+
+    def add(self, size, ts=None, now=None):
+        """Record `size` bytes at stream time `ts` (seconds) seen at wall time `now`.
+
+        Sources that carry no timestamps pass ts=None throughout; the wall
+        clock is then the stream time.
+        """
+        now = time.monotonic() if now is None else now
+        if self._timestamps is None:
+            self._timestamps = ts is not None
+            self.first_wall = now
+        elif now - self.last_wall >= self.stall_seconds:
+            self.stalls += 1
+        self.last_wall = now
+        if not self._timestamps:
+            ts = now
+        elif ts is None:
+            ts = self.last_ts
+            if ts is None:
+                return
+        if self.first_ts is None:
+            # what arrives at the first timestamp plays before the span starts
+            self.first_ts = self.last_ts = self._window_start = ts
+            return
+        if ts > self.last_ts:
+            self.last_ts = ts
+        self.bytes += size
+        self._window_bytes += size
+        if self.last_ts - self._window_start >= self.window:
+            self._rates.append(self._window_bytes * 8 / 1000 / (self.last_ts - self._window_start))
+            self._estimates.append(self.estimate)
+            self._window_start = self.last_ts
+            self._window_bytes = 0
+        # seconds of stream in hand beyond what real time has used up since the first byte
+        ahead = self.span - (now - self.first_wall)
+        if ahead < -self.underrun_seconds and not self._underrun:
+            self.underruns += 1
+            self._underrun = True
+        elif ahead >= 0:
+            self._underrun = False
+
+    def interrupt(self, now=None):
+        """Record that the source stopped delivering at wall time `now`."""
+        if self.first_wall is None or self.interrupted:
+            return
+        stalls = self.stalls
+        self.add(0, None, now)
+        self.interrupted = True
+        if self.stalls == stalls:
+            self.stalls += 1
+        if not self._underrun:
+            self.underruns += 1
+            self._underrun = True
+
+    def stats(self):
+        """An empty_stats() dict filled in from what was sampled."""
+        stats = empty_stats()
+        stats['stalls'] = self.stalls
+        stats['underruns'] = self.underruns
+        estimate = self.estimate
+        if estimate is None or self.span < self.window:
+            return stats
+        stats['bitrate_kbps'] = estimate
+        stats['bitrate_min_kbps'] = min(self._rates, default=estimate)
+        stats['bitrate_max_kbps'] = max(self._rates, default=estimate)
+        stats['sample_seconds'] = round(self.span, 2)
+        return stats
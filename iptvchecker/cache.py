@@ -0,0 +1,166 @@
+"""Persistent probe-result cache.
+
+Results are stored in SQLite under the user cache directory, keyed by the
+normalized stream URL, so a stream confirmed a few minutes ago in another run
+or another group is not probed again.  How long a result stays valid depends
+on its status: a working stream is trusted for hours, a dead one is rechecked
+soon.
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+from .metrics import TIMING_FIELDS
+
+DEFAULT_TTLS = {
+    'OK': 6 * 3600,
+    'Dead': 30 * 60,
+    'Auth': 30 * 60,
+    'Redirect': 30 * 60,
+    'Timeout': 15 * 60,
+    'Stalled': 15 * 60,
+}
+DEFAULT_TTL = 10 * 60
+MAX_ENTRIES = 200000
+
+# Per-run fields that should not be replayed from another run.
+_UNCACHED = ('channel', 'group', 'url', 'cached') + TIMING_FIELDS
+_TRANSIENT = ('Error', 'Throttled')  # says nothing about the stream itself
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def cache_dir():
+    """Per-user cache directory (created on demand)."""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser(os.path.join('~', '.cache'))
+    path = os.path.join(base, 'iptvchecker')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def normalize_url(url):
+    """Canonical form used as the cache key: lower-case scheme and host,
+    default port and fragment dropped.  Path and query are kept verbatim
+    since providers encode credentials and stream ids there."""
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if port and port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+    if parts.username is not None:
+        auth = parts.username + (f":{parts.password}" if parts.password is not None else '')
+        host = f"{auth}@{host}"
+    return urlunsplit((scheme, host, parts.path or '/', parts.query, ''))
+
+
+def parse_duration(text):
+    """'90s', '30m', '6h', '2d' or plain seconds -> seconds."""
+    text = text.strip().lower()
+    if text[-1:] in _UNITS:
+        return float(text[:-1]) * _UNITS[text[-1]]
+    return float(text)
+
+
+def parse_ttls(specs):
+    """['OK=6h', 'Dead=30m'] -> {'OK': 21600.0, 'Dead': 1800.0}."""
+    ttls = {}
+    for spec in specs or ():
+        status, sep, duration = spec.partition('=')
+        if not sep:
+            raise ValueError(f"expected STATUS=DURATION, got {spec!r}")
+        ttls[status.strip()] = parse_duration(duration)
+    return ttls
+
+
+class ResultCache:
+    """Thread-safe SQLite store of probe results with per-status TTLs.
+
+    Results whose status starts with "Error" are never cached.  Once the
+    table grows past `max_entries`, the oldest checks are evicted.
+    """
+
+    def __init__(self, path=None, ttls=None, default_ttl=DEFAULT_TTL, max_entries=MAX_ENTRIES):
+        self.path = path or os.path.join(cache_dir(), 'results.sqlite3')
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " url TEXT PRIMARY KEY,"
+                " status TEXT NOT NULL,"
+                " checked_at REAL NOT NULL,"
+                " data TEXT NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_checked_at ON results (checked_at)")
+
+    def ttl(self, status):
+        return self.ttls.get(status, self.default_ttl)
+
+    def get(self, url, now=None):
+        """The cached result for `url` if still fresh, else None."""
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._db.execute("SELECT status, checked_at, data FROM results WHERE url = ?",
+                                   (normalize_url(url),)).fetchone()
+        if row is None or now - row[1] > self.ttl(row[0]):
+            self.misses += 1
+            return None
+        self.hits += 1
+        data = json.loads(row[2])
+        data['checked_at'] = row[1]
+        return data
+
+    def put(self, url, result, now=None):
+        if result['status'].startswith(_TRANSIENT):
+            return
+        now = time.time() if now is None else now
+        data = {k: v for k, v in result.items() if k not in _UNCACHED}
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO results (url, status, checked_at, data) VALUES (?, ?, ?, ?)",
+                             (normalize_url(url), result['status'], now, json.dumps(data)))
+            self._writes += 1
+            if self._writes % 1000 == 0:
+                self._evict()
+
+    def _evict(self):
+        count = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        if count > self.max_entries:
+            self._db.execute("DELETE FROM results WHERE url IN "
+                             "(SELECT url FROM results ORDER BY checked_at LIMIT ?)",
+                             (count - self.max_entries,))
+
+    def prune(self):
+        """Drop expired rows and enforce max_entries."""
+        now = time.time()
+        with self._lock, self._db:
+            for status, ttl in self.ttls.items():
+                self._db.execute("DELETE FROM results WHERE status = ? AND checked_at < ?", (status, now - ttl))
+            known = list(self.ttls)
+            self._db.execute(f"DELETE FROM results WHERE status NOT IN ({','.join('?' * len(known))}) "
+                             "AND checked_at < ?", known + [now - self.default_ttl])
+            self._evict()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,451 @@
+"""Headless command line interface.
+
+    python main.py check --m3u playlist.m3u --groups "UK Sports" --out results.jsonl
+    python main.py check --xtream http://host:8080 USER PASS --list-groups
+    python main.py monitor --m3u playlist.m3u --budget 120 --events events.jsonl
+    python main.py coordinate --m3u playlist.m3u --listen 0.0.0.0:8765 --out results.csv
+    python main.py worker --coordinator http://10.0.0.5:8765 --workers 20
+
+Only argparse is imported up front; the tester (and with it requests) is
+loaded once a command actually runs, numpy only for .txt/.json reports and
+--chart, and matplotlib only for --chart.
+"""
+import argparse
+import json
+import os
+import sys
+
+
+def add_source_args(parser):
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--m3u', metavar='FILE_OR_URL', help="M3U playlist file or http(s) URL")
+    source.add_argument('--xtream', nargs=3, metavar=('SERVER', 'USERNAME', 'PASSWORD'),
+                        help="Xtream Codes panel and credentials")
+    parser.add_argument('--groups', action='append', metavar='GROUP',
+                        help="group to test; repeat for several (default: all groups)")
+    parser.add_argument('--list-groups', action='store_true', help="print the groups and exit")
+
+
+def add_probe_args(parser):
+    parser.add_argument('--workers', type=int, default=10, help="parallel tests (default: 10)")
+    parser.add_argument('--per-host', type=int, default=0,
+                        help="max parallel tests per server account (default: the panel's max_connections, "
+                             "else no limit)")
+    parser.add_argument('--probe', choices=('native', 'single', 'legacy'), default='native',
+                        help="read MPEG-TS headers in-process, falling back to ffprobe (default), "
+                             "always a single ffprobe pass, or the legacy ffmpeg + ffprobe pair")
+    parser.add_argument('--no-preflight', action='store_true', help="skip the HTTP liveness check")
+    parser.add_argument('--bitrate-tolerance', type=float, default=5, metavar='PCT',
+                        help="stop sampling once the bitrate estimate is stable within PCT percent (default: 5)")
+    parser.add_argument('--hls-variants', choices=('top', 'all'), default='top',
+                        help="with --probe native, test an HLS channel's best playable variant (default) "
+                             "or every variant")
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics while running")
+
+
+def add_output_args(parser, journal_name):
+    parser.add_argument('--out', action='append', default=[], metavar='FILE',
+                        help="write results to FILE; format from extension: .jsonl, .csv, .txt or .json "
+                             "(summary statistics only) (repeatable; default: JSON Lines on stdout)")
+    parser.add_argument('--chart', metavar='PNG', help="also write the quality pie chart")
+    parser.add_argument('--journal', metavar='PATH',
+                        help="append each result to this JSON Lines journal as it completes "
+                             f"(default: {journal_name} in the user cache dir)")
+    parser.add_argument('--resume', action='store_true',
+                        help="keep the journal's results and only test channels not in it yet")
+    parser.add_argument('-q', '--quiet', action='store_true', help="no per-channel progress on stderr")
+
+
+def duration(text):
+    from .cache import parse_duration
+
+    try:
+        return parse_duration(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid duration {text!r} (e.g. 90s, 30m, 6h)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="main.py", description="IPTV Stream Quality Tester")
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    check = commands.add_parser('check', help="test the channels of a playlist and export the results")
+    add_source_args(check)
+    add_output_args(check, 'last-check.jsonl')
+    add_probe_args(check)
+    check.add_argument('--refresh', action='store_true', help="ignore cached results and probe everything again")
+    check.add_argument('--no-cache', action='store_true', help="neither read nor write the result cache")
+    check.add_argument('--cache-file', metavar='PATH', help="result cache database (default: user cache dir)")
+    check.add_argument('--ttl', action='append', metavar='STATUS=DURATION',
+                       help="how long a cached status stays valid, e.g. OK=6h or Dead=30m (repeatable)")
+    check.set_defaults(func=cmd_check)
+
+    coordinate = commands.add_parser('coordinate', help="hand a playlist's channels to worker processes "
+                                                        "and merge their results")
+    add_source_args(coordinate)
+    add_output_args(coordinate, 'last-sweep.jsonl')
+    coordinate.add_argument('--listen', default='127.0.0.1:8765', metavar='HOST:PORT',
+                            help="address workers connect to (default: 127.0.0.1:8765; "
+                                 "use 0.0.0.0:PORT for workers on other hosts)")
+    coordinate.add_argument('--shard-size', type=int, default=50, metavar='N',
+                            help="channels per leased shard (default: 50)")
+    coordinate.add_argument('--lease', type=duration, default='60s', metavar='DURATION',
+                            help="reassign a shard whose worker has been silent this long (default: 60s)")
+    coordinate.add_argument('--secret', help="shared secret workers must present (default: none)")
+    coordinate.set_defaults(func=cmd_coordinate)
+
+    worker = commands.add_parser('worker', help="test shards leased from a coordinator")
+    worker.add_argument('--coordinator', required=True, metavar='URL',
+                        help="coordinator address, e.g. http://10.0.0.5:8765")
+    worker.add_argument('--name', help="worker name in the coordinator's bookkeeping (default: random)")
+    worker.add_argument('--secret', help="shared secret the coordinator was started with")
+    add_probe_args(worker)
+    worker.add_argument('-q', '--quiet', action='store_true', help="no per-channel progress on stderr")
+    worker.set_defaults(func=cmd_worker)
+
+    monitor = commands.add_parser('monitor', help="keep rechecking channels, most at-risk first")
+    add_source_args(monitor)
+    add_probe_args(monitor)
+    monitor.add_argument('--budget', type=int, default=60, metavar='N',
+                         help="max probes per minute across all channels (default: 60)")
+    monitor.add_argument('--min-interval', type=duration, metavar='DURATION', default='2m',
+                         help="recheck delay for failing or flaky channels (default: 2m)")
+    monitor.add_argument('--max-interval', type=duration, metavar='DURATION', default='6h',
+                         help="recheck delay for long-stable channels (default: 6h)")
+    monitor.add_argument('--dead-interval', type=duration, metavar='DURATION', default='1h',
+                         help="cap on the backoff for channels that stay down (default: 1h)")
+    monitor.add_argument('--state', metavar='PATH', help="history database (default: user cache dir)")
+    monitor.add_argument('--events', metavar='FILE', help="append up/down events to FILE as JSON Lines")
+    monitor.add_argument('--summary-every', type=duration, default='1m', metavar='DURATION',
+                         help="how often to print a status summary (default: 1m)")
+    monitor.set_defaults(func=cmd_monitor)
+    return parser
+
+
+def load_playlist(args):
+    if args.xtream:
+        from .xtream import XtreamError, load_xtream
+
+        # Fetch only the requested categories, unless listing them all.
+        groups = None if args.list_groups else args.groups
+        try:
+            return load_xtream(*args.xtream, groups=groups)
+        except XtreamError as e:
+            raise SystemExit(f"error: {e}")
+    from .playlist import iter_file_lines, iter_url_lines, load_m3u
+
+    if args.m3u.lower().startswith(('http://', 'https://')):
+        return load_m3u(iter_url_lines(args.m3u))
+    return load_m3u(iter_file_lines(args.m3u))
+
+
+def select_channels(playlist, groups):
+    if not groups:
+        return list(playlist.channels)
+    missing = [g for g in groups if g not in playlist.groups]
+    if missing:
+        raise SystemExit(f"error: unknown group(s): {', '.join(missing)} (see --list-groups)")
+    channels = []
+    for group in groups:
+        channels.extend(playlist.group_channels(group))
+    return channels
+
+
+def serve_metrics(tester, port):
+    """Attach a Metrics aggregate to `tester` and serve it; None without a port."""
+    if not port:
+        return None
+    from .metrics import Metrics, serve_metrics as serve, tester_gauges
+
+    tester.metrics = Metrics(tester_gauges(tester))
+    try:
+        server = serve(tester.metrics, port)
+    except OSError as e:
+        raise SystemExit(f"error: --metrics-port {port}: {e}")
+    print(f"Metrics at http://127.0.0.1:{port}/metrics", file=sys.stderr)
+    return server
+
+
+def print_accounts(governor):
+    """Report accounts that have a connection cap or have pushed back."""
+    from .governor import format_stats
+
+    stats = [s for s in governor.stats() if s['cap'] or s['throttles']]
+    for line in format_stats(stats):
+        print(f"Account {line}", file=sys.stderr)
+
+
+def print_groups(playlist):
+    for group in sorted(playlist.groups):
+        print(f"{group}\t{len(playlist.groups[group])}")
+
+
+def check_outputs(args):
+    from .export import WRITERS
+
+    for filename in args.out:
+        ext = os.path.splitext(filename)[1].lower()
+        if ext not in WRITERS:
+            raise SystemExit(f"error: unsupported output format {ext or filename!r}; use .jsonl, .csv, .txt or .json")
+
+
+def write_outputs(args, results):
+    """Write --out files and --chart from `results`; returns 1 if the chart needs matplotlib."""
+    from .export import WRITERS, ExportError, write_pie_chart
+
+    for filename in args.out:
+        try:
+            WRITERS[os.path.splitext(filename)[1].lower()](results, filename)
+        except ExportError as e:
+            print(f"{filename}: {e}", file=sys.stderr)
+    if args.chart:
+        try:
+            write_pie_chart(results, args.chart)
+        except ImportError:
+            print("Matplotlib needed for chart export: pip install matplotlib", file=sys.stderr)
+            return 1
+        except ExportError as e:
+            print(f"{args.chart}: {e}", file=sys.stderr)
+    return 0
+
+
+def count_ok(results):
+    ok = count = 0
+    for r in results:
+        count += 1
+        ok += r['status'] == 'OK'
+    return f"{ok}/{count} OK"
+
+
+def pending_channels(args, playlist, journal_path):
+    """The selected channels, less those already journaled with --resume; and the journal reader."""
+    from .journal import JournalReader, channel_key
+
+    channels = select_channels(playlist, args.groups)
+    journaled = JournalReader(journal_path)
+    if args.resume:
+        done = journaled.done_keys()
+        channels = [c for c in channels if channel_key(c) not in done]
+        print(f"Resuming: {len(done)} results already in {journal_path}", file=sys.stderr)
+    print(f"Testing {len(channels)} channels from {len(playlist)} loaded", file=sys.stderr)
+    return channels, journaled
+
+
+def progress(args, total):
+    """on_result callback printing per-channel progress, and the rows on stdout without --out."""
+    tested = 0
+
+    def on_result(result):
+        nonlocal tested
+        tested += 1
+        if not args.quiet:
+            cached = " (cached)" if result.get('cached') else ""
+            print(f"[{tested}/{total}] {result['status']:<8} {result['channel']}{cached}", file=sys.stderr)
+        if not args.out:
+            sys.stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+            sys.stdout.flush()
+
+    return on_result
+
+
+def cmd_check(args):
+    from .journal import ResultJournal, default_journal_path
+    from .tester import StreamTester
+
+    check_outputs(args)
+    playlist = load_playlist(args)
+    if args.list_groups:
+        print_groups(playlist)
+        return 0
+    journal_path = args.journal or default_journal_path('last-check.jsonl')
+    channels, journaled = pending_channels(args, playlist, journal_path)
+    on_result = progress(args, len(channels))
+
+    cache = None
+    if not args.no_cache:
+        from .cache import ResultCache, parse_ttls
+
+        try:
+            ttls = parse_ttls(args.ttl)
+        except ValueError as e:
+            raise SystemExit(f"error: --ttl: {e}")
+        cache = ResultCache(args.cache_file, ttls=ttls)
+    journal = ResultJournal(journal_path, resume=args.resume)
+    tester = StreamTester(workers=args.workers, per_host=args.per_host, probe=args.probe,
+                          use_preflight=not args.no_preflight, cache=cache, refresh=args.refresh,
+                          journal=journal, limits=playlist.accounts, tolerance=args.bitrate_tolerance / 100,
+                          hls_variants=args.hls_variants)
+    metrics_server = serve_metrics(tester, args.metrics_port)
+    try:
+        tester.run(channels, on_result=on_result)
+    except KeyboardInterrupt:
+        tester.stop()
+        print("Interrupted; exporting partial results (continue with --resume)", file=sys.stderr)
+    finally:
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        journal.close()
+        print_accounts(tester.governor)
+        if cache is not None:
+            print(f"Cache: {cache.hits} hits, {cache.misses} misses", file=sys.stderr)
+            cache.close()
+
+    if write_outputs(args, journaled):
+        return 1
+    print(f"Done: {count_ok(journaled)}; this run probed {tester.sources} unique sources "
+          f"for {tester.entries} channel entries", file=sys.stderr)
+    if tester.analyzed or tester.fallbacks:
+        print(f"Analyzed in-process: {tester.analyzed}, ffprobe fallbacks: {tester.fallbacks}", file=sys.stderr)
+    playlists = tester.playlists
+    if playlists.misses:
+        print(f"HLS playlists fetched: {playlists.misses}, shared from cache: {playlists.hits}", file=sys.stderr)
+    return 0
+
+
+def cmd_coordinate(args):
+    import time
+
+    from .distributed import POLL_SECONDS, Coordinator, ShardQueue
+    from .journal import ResultJournal, default_journal_path
+
+    check_outputs(args)
+    host, sep, port = args.listen.rpartition(':')
+    if not sep or not port.isdigit():
+        raise SystemExit(f"error: --listen: expected HOST:PORT, got {args.listen!r}")
+    playlist = load_playlist(args)
+    if args.list_groups:
+        print_groups(playlist)
+        return 0
+    journal_path = args.journal or default_journal_path('last-sweep.jsonl')
+    channels, journaled = pending_channels(args, playlist, journal_path)
+    queue = ShardQueue(channels, shard_size=max(1, args.shard_size), lease_seconds=args.lease)
+    journal = ResultJournal(journal_path, resume=args.resume)
+    coordinator = Coordinator(queue, journal=journal, limits=playlist.accounts, secret=args.secret,
+                              on_result=progress(args, queue.total))
+    try:
+        address = coordinator.serve(host or '0.0.0.0', int(port))
+    except OSError as e:
+        raise SystemExit(f"error: --listen {args.listen}: {e}")
+    stats = queue.stats()
+    print(f"Coordinating {stats['channels']} channels in {stats['shards']} shards on "
+          f"http://{address[0]}:{address[1]}", file=sys.stderr)
+    try:
+        while not coordinator.done.wait(60):
+            s = queue.stats()
+            print(f"[sweep] {s['reported']}/{s['channels']} reported, {s['leased']} shards leased, "
+                  f"{s['pending']} pending, {s['expired']} leases expired, {s['workers']} workers", file=sys.stderr)
+        # let idle workers ask once more and hear that the sweep is done
+        time.sleep(POLL_SECONDS * 2)
+    except KeyboardInterrupt:
+        print("Interrupted; exporting partial results (continue with --resume)", file=sys.stderr)
+    finally:
+        coordinator.shutdown()
+        journal.close()
+
+    if write_outputs(args, journaled):
+        return 1
+    s = queue.stats()
+    swept = f" in {s['sweep_seconds']:.1f}s" if s['sweep_seconds'] is not None else ""
+    print(f"Done: {count_ok(journaled)}; {s['reported']} results merged from {s['shards']} shards{swept}, "
+          f"{s['expired']} leases expired", file=sys.stderr)
+    return 0
+
+
+def cmd_worker(args):
+    from .distributed import DistributedError, Worker
+    from .tester import StreamTester
+
+    tester = StreamTester(workers=args.workers, per_host=args.per_host, probe=args.probe,
+                          use_preflight=not args.no_preflight, tolerance=args.bitrate_tolerance / 100,
+                          hls_variants=args.hls_variants)
+    tested = 0
+
+    def on_result(result):
+        nonlocal tested
+        tested += 1
+        if not args.quiet:
+            print(f"[{tested}] {result['status']:<8} {result['channel']}", file=sys.stderr)
+
+    worker = Worker(args.coordinator, tester, name=args.name, secret=args.secret, on_result=on_result)
+    metrics_server = serve_metrics(tester, args.metrics_port)
+    print(f"Worker {worker.name} pulling shards from {args.coordinator}", file=sys.stderr)
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
+        print("Interrupted; unfinished shards go back to the coordinator", file=sys.stderr)
+    except DistributedError as e:
+        raise SystemExit(f"error: {e}")
+    finally:
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        print_accounts(tester.governor)
+    print(f"Done: {worker.shards} shards, {tested} results, {worker.accepted} accepted, "
+          f"{worker.lost} leases lost", file=sys.stderr)
+    return 0
+
+
+def cmd_monitor(args):
+    import threading
+    import time
+
+    from .monitor import HistoryStore, Monitor, MonitorPolicy
+    from .tester import StreamTester
+
+    playlist = load_playlist(args)
+    if args.list_groups:
+        print_groups(playlist)
+        return 0
+    channels = select_channels(playlist, args.groups)
+    events = open(args.events, 'a', encoding='utf-8') if args.events else None
+    lock = threading.Lock()
+
+    def on_change(result, history):
+        state = "UP" if history.up else "DOWN"
+        stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(history.checked_at))
+        with lock:
+            print(f"{stamp} {state:<4} {result['status']:<8} [{result['group']}] {result['channel']}", flush=True)
+            if events is not None:
+                events.write(json.dumps({'time': history.checked_at, 'event': state, 'uptime': history.uptime,
+                                         **result}, ensure_ascii=False) + "\n")
+                events.flush()
+
+    store = HistoryStore(args.state)
+    policy = MonitorPolicy(args.min_interval, args.max_interval, args.dead_interval)
+    tester = StreamTester(workers=args.workers, per_host=args.per_host, probe=args.probe,
+                          use_preflight=not args.no_preflight, limits=playlist.accounts,
+                          tolerance=args.bitrate_tolerance / 100, hls_variants=args.hls_variants)
+    metrics_server = serve_metrics(tester, args.metrics_port)
+    monitor = Monitor(channels, tester, store=store, policy=policy, probes_per_minute=args.budget,
+                      on_change=on_change)
+    print(f"Monitoring {len(monitor.history)} unique streams at up to {args.budget} probes/min",
+          file=sys.stderr)
+
+    def summarize(stop):
+        while not stop.wait(args.summary_every):
+            s = monitor.stats()
+            print(f"[monitor] {s['checked']}/{s['channels']} checked, {s['up']} up, {s['down']} down, "
+                  f"{s['due']} due, {s['in_flight']} in flight", file=sys.stderr)
+            print_accounts(tester.governor)
+
+    stop = threading.Event()
+    threading.Thread(target=summarize, args=(stop,), daemon=True).start()
+    try:
+        monitor.run()
+    except KeyboardInterrupt:
+        monitor.stop()
+    finally:
+        stop.set()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        store.close()
+        if events is not None:
+            events.close()
+    return 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
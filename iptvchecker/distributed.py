@@ -0,0 +1,507 @@
+"""Distributed sweeps: a coordinator handing leased shards to workers.
+
+One machine's bandwidth and CPU cap how many streams a sweep can probe at
+once.  The coordinator holds the channel list and cuts it into shards, with
+every entry of a source in the same shard so each source is still probed
+once.  It serves them over a small JSON-over-HTTP protocol.  Workers, as
+processes on one box or on several hosts, lease a shard and test it with
+their own StreamTester.  They stream results back as they finish and
+heartbeat while they work.  A lease that is not renewed within
+`lease_seconds` expires, and the shard's unreported channels go back in the
+queue.  The result for an entry is accepted once, whoever sends it, and is
+appended to the coordinator's journal, which is the merged result set.
+
+    POST /lease      {worker}                                  -> 200 shard, 204 none free now, 410 sweep done
+    POST /heartbeat  {worker, shard, token}                    -> 200, 409 lease lost
+    POST /results    {worker, shard, token, results, done}     -> 200 {accepted, leased}, 400 malformed row
+    GET  /status                                               -> progress counters, sweep time
+
+Panel connection caps are per account, not per worker, so the coordinator
+also hands out connections: each lease carries a grant of the free
+connections of every capped account in the shard, at most an even share
+among the live workers and never more than the other workers leave free.
+A grant is held until the worker's next lease or its shard is done; when an
+account has nothing left to grant, the shard stays queued (204).
+"""
+import hmac
+import json
+import secrets
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from .governor import account_key
+from .journal import channel_key, result_key
+from .playlist import Channel
+from .tester import unique_sources
+
+SHARD_SIZE = 50
+LEASE_SECONDS = 60.0
+HEARTBEAT_SECONDS = 10.0
+FLUSH_SECONDS = 1.0
+POLL_SECONDS = 2.0
+CONNECT_WAIT = 30.0
+REQUEST_TIMEOUT = (5, 30)
+SECRET_HEADER = 'X-Sweep-Secret'
+RESULT_FIELDS = ('channel', 'group', 'url', 'status')
+
+
+class DistributedError(Exception):
+    """The coordinator could not be reached or refused a request."""
+
+
+def channel_to_dict(channel):
+    return {field: getattr(channel, field) for field in Channel.__slots__}
+
+
+def channel_from_dict(data):
+    return Channel(**{field: data.get(field) for field in Channel.__slots__})
+
+
+def valid_result(row):
+    """Whether a reported row carries what the queue and journal key on."""
+    return (isinstance(row, dict) and all(field in row for field in RESULT_FIELDS)
+            and isinstance(row['status'], str))
+
+
+def make_shards(channels, size=SHARD_SIZE):
+    """Lists of about `size` channels, never splitting the entries of one source."""
+    primaries, followers = unique_sources(channels)
+    shard = []
+    for primary in primaries:
+        shard.append(primary)
+        shard.extend(followers.get((primary.group, primary.name, primary.url), ()))
+        if len(shard) >= size:
+            yield shard
+            shard = []
+    if shard:
+        yield shard
+
+
+class Shard:
+    __slots__ = ('id', 'remaining', 'worker', 'token', 'expires', 'leases')
+
+    def __init__(self, shard_id, channels):
+        self.id = shard_id
+        self.remaining = {channel_key(c): c for c in channels}  # entries not reported yet
+        self.worker = None
+        self.token = None
+        self.expires = 0.0
+        self.leases = 0
+
+
+class ShardQueue:
+    """Thread-safe shard bookkeeping: pending shards, leases and what is left.
+
+    A shard goes back to the front of the queue when its lease expires, or
+    at once when its worker reports it done with entries still missing.
+    """
+
+    def __init__(self, channels, shard_size=SHARD_SIZE, lease_seconds=LEASE_SECONDS, clock=time.monotonic):
+        self.lease_seconds = lease_seconds
+        self.clock = clock
+        self.total = self.reported = self.expired = 0
+        self.first_lease = self.last_result = None  # clock() readings bounding the sweep
+        self._lock = threading.Lock()
+        self._shards = {}
+        self._pending = deque()
+        self._leased = {}
+        self._workers = {}  # worker -> last seen
+        for shard_id, channels in enumerate(make_shards(channels, shard_size)):
+            shard = self._shards[shard_id] = Shard(shard_id, channels)
+            self.total += len(shard.remaining)
+            self._pending.append(shard)
+
+    @property
+    def finished(self):
+        with self._lock:
+            return not self._pending and not self._leased
+
+    def _seen(self, worker, now):
+        self._workers[worker] = now
+
+    def _reclaim(self, now):
+        for shard in [s for s in self._leased.values() if s.expires <= now]:
+            del self._leased[shard.id]
+            shard.worker = shard.token = None
+            self._pending.appendleft(shard)
+            self.expired += 1
+
+    def live_workers(self):
+        """Names of the workers heard from within the lease period."""
+        now = self.clock()
+        with self._lock:
+            return {worker for worker, seen in self._workers.items() if now - seen < self.lease_seconds}
+
+    def lease(self, worker):
+        """(shard id, token, channels) for `worker`, or None if nothing is free now."""
+        now = self.clock()
+        with self._lock:
+            self._seen(worker, now)
+            self._reclaim(now)
+            if not self._pending:
+                return None
+            shard = self._pending.popleft()
+            if self.first_lease is None:
+                self.first_lease = now
+            shard.worker = worker
+            shard.token = secrets.token_hex(8)
+            shard.expires = now + self.lease_seconds
+            shard.leases += 1
+            self._leased[shard.id] = shard
+            return shard.id, shard.token, list(shard.remaining.values())
+
+    def requeue(self, shard_id, token):
+        """Hand a shard just leased back to the front of the queue."""
+        with self._lock:
+            shard = self._leased.get(shard_id)
+            if shard is not None and shard.token == token:
+                del self._leased[shard_id]
+                shard.worker = shard.token = None
+                self._pending.appendleft(shard)
+
+    def renew(self, worker, shard_id, token):
+        """Extend a lease; False if it expired and went to someone else."""
+        now = self.clock()
+        with self._lock:
+            self._seen(worker, now)
+            shard = self._leased.get(shard_id)
+            if shard is None or shard.token != token:
+                return False
+            shard.expires = now + self.lease_seconds
+            return True
+
+    def report(self, worker, shard_id, token, results, done=False):
+        """(accepted results, whether the lease still holds).
+
+        Results for entries still outstanding are accepted even from a lost
+        lease; they are as good as anyone's.
+        """
+        accepted = []
+        now = self.clock()
+        with self._lock:
+            self._seen(worker, now)
+            shard = self._shards.get(shard_id)
+            if shard is None:
+                return accepted, False
+            for result in results:
+                if shard.remaining.pop(result_key(result), None) is not None:
+                    accepted.append(result)
+            self.reported += len(accepted)
+            if accepted:
+                self.last_result = now
+            leased = self._leased.get(shard_id) is shard and shard.token == token
+            if leased:
+                shard.expires = now + self.lease_seconds
+                if done or not shard.remaining:
+                    del self._leased[shard_id]
+                    shard.worker = shard.token = None
+                    if shard.remaining:
+                        self._pending.appendleft(shard)
+            elif not shard.remaining and shard in self._pending:
+                self._pending.remove(shard)
+        return accepted, leased
+
+    def stats(self):
+        """Progress counters; sweep_seconds runs from the first lease to the
+        latest accepted result, so it leaves out setup and idle workers."""
+        now = self.clock()
+        with self._lock:
+            sweep = self.last_result - self.first_lease if self.last_result is not None else None
+            return {'channels': self.total, 'reported': self.reported, 'shards': len(self._shards),
+                    'pending': len(self._pending), 'leased': len(self._leased), 'expired': self.expired,
+                    'workers': sum(1 for seen in self._workers.values() if now - seen < self.lease_seconds),
+                    'finished': not self._pending and not self._leased,
+                    'sweep_seconds': round(sweep, 3) if sweep is not None else None}
+
+
+class Coordinator:
+    """Serves a ShardQueue and merges what workers report.
+
+    Accepted results go to `journal` (if any), then to on_result.  `limits`
+    maps account keys to the (max_connections, active_cons) a panel
+    reported; each lease carries a grant of those connections (see grant()).
+    Requests must carry `secret` in the X-Sweep-Secret header when one is set.
+    """
+
+    def __init__(self, queue, journal=None, limits=None, secret=None, on_result=None):
+        self.queue = queue
+        self.journal = journal
+        self.limits = limits or {}
+        self.secret = secret
+        self.on_result = on_result
+        self.done = threading.Event()
+        self.server = None
+        self._lock = threading.Lock()  # keeps journal and on_result in arrival order
+        self._grant_lock = threading.Lock()
+        self._free = {}  # account key -> connections the panel left free
+        for key, (max_connections, active) in self.limits.items():
+            try:
+                free = int(max_connections) - int(active or 0)
+            except (TypeError, ValueError):
+                continue
+            if free > 0:
+                self._free[key] = free
+        self._grants = {}  # worker -> {account key: connections}
+        if queue.finished:
+            self.done.set()
+
+    def grant(self, worker, channels):
+        """Connections per capped account for `worker` to test `channels`
+        with, as {key: (max_connections, 0)}; None if an account has none
+        left.  Replaces the worker's previous grant."""
+        with self._grant_lock:
+            live = self.queue.live_workers() | {worker}
+            accounts = {account_key(c.url) for c in channels if c.url} & self._free.keys()
+            grants = {}
+            for key in accounts:
+                free = self._free[key]
+                held = sum(g.get(key, 0) for w, g in self._grants.items() if w != worker and w in live)
+                grants[key] = min(max(1, free // len(live)), free - held)
+                if grants[key] < 1:
+                    self._grants.pop(worker, None)
+                    return None
+            self._grants[worker] = grants
+        return {key: (connections, 0) for key, connections in grants.items()}
+
+    def release(self, worker):
+        """Return `worker`'s connections to the pool."""
+        with self._grant_lock:
+            self._grants.pop(worker, None)
+
+    def handle(self, path, payload):
+        """(HTTP status, response dict or None) for one protocol request."""
+        queue = self.queue
+        if path == '/status':
+            return 200, queue.stats()
+        worker = str(payload.get('worker') or '?')
+        if path == '/lease':
+            if queue.finished:
+                return 410, None
+            lease = queue.lease(worker)
+            if lease is None:
+                return 204, None
+            shard_id, token, channels = lease
+            limits = self.grant(worker, channels)
+            if limits is None:
+                queue.requeue(shard_id, token)
+                return 204, None
+            return 200, {'shard': shard_id, 'token': token, 'lease_seconds': queue.lease_seconds,
+                         'limits': limits, 'channels': [channel_to_dict(c) for c in channels]}
+        if path == '/heartbeat':
+            if queue.renew(worker, payload.get('shard'), payload.get('token')):
+                return 200, {'leased': True}
+            return 409, {'leased': False}
+        if path == '/results':
+            results = payload.get('results') or []
+            if not isinstance(results, list) or not all(valid_result(r) for r in results):
+                return 400, None
+            accepted, leased = queue.report(worker, payload.get('shard'), payload.get('token'), results,
+                                            bool(payload.get('done')))
+            if payload.get('done'):
+                self.release(worker)
+            with self._lock:
+                for result in accepted:
+                    if self.journal is not None:
+                        self.journal.append(result)
+                    if self.on_result is not None:
+                        self.on_result(result)
+            if queue.finished:
+                self.done.set()
+            return 200, {'accepted': len(accepted), 'leased': leased}
+        return 404, None
+
+    def serve(self, host='127.0.0.1', port=0):
+        """Start serving from a daemon thread; returns the (host, port) bound."""
+        coordinator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, code, body=None):
+                data = json.dumps(body).encode() if body is not None else b''
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _allowed(self):
+                if coordinator.secret is None:
+                    return True
+                return hmac.compare_digest(self.headers.get(SECRET_HEADER, ''), coordinator.secret)
+
+            def do_GET(self):
+                if not self._allowed():
+                    return self._reply(403)
+                if self.path.split('?', 1)[0] != '/status':
+                    return self._reply(404)
+                self._reply(*coordinator.handle('/status', {}))
+
+            def do_POST(self):
+                if not self._allowed():
+                    return self._reply(403)
+                try:
+                    payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+                except ValueError:
+                    return self._reply(400)
+                if not isinstance(payload, dict):
+                    return self._reply(400)
+                self._reply(*coordinator.handle(self.path.split('?', 1)[0], payload))
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.server_address[:2]
+
+    def shutdown(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class Worker:
+    """Leases shards from a coordinator and tests them with `tester`.
+
+    run() returns once the coordinator reports the sweep done, after stop(),
+    or once a coordinator that has answered before stays unreachable for a
+    lease period (by then it has finished or handed our shards on); until
+    then failed requests are retried.  Results are sent every
+    FLUSH_SECONDS; a lease found lost stops the shard's test run, and a
+    coordinator unreachable for a whole lease period does too (the shard is
+    reassigned by then).
+    """
+
+    def __init__(self, url, tester, name=None, secret=None, on_result=None):
+        self.url = url.rstrip('/')
+        self.tester = tester
+        self.name = name or f"worker-{secrets.token_hex(4)}"
+        self.on_result = on_result
+        self.shards = self.sent = self.accepted = self.lost = 0
+        self.session = requests.Session()
+        if secret is not None:
+            self.session.headers[SECRET_HEADER] = secret
+        self._limits = {}
+        self._lease_seconds = LEASE_SECONDS  # as last granted
+        self._stop = threading.Event()
+
+    def _post(self, path, payload):
+        """(status code, response dict or None); raises DistributedError."""
+        try:
+            response = self.session.post(self.url + path, json=dict(payload, worker=self.name),
+                                         timeout=REQUEST_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            raise DistributedError(f"coordinator unreachable: {e}")
+        if response.status_code == 403:
+            raise DistributedError("coordinator refused the secret")
+        try:
+            body = response.json() if response.content else None
+        except ValueError:
+            body = None
+        return response.status_code, body
+
+    def stop(self):
+        self._stop.set()
+        self.tester.stop()
+
+    def run(self):
+        """Work until the sweep is done; returns the number of shards tested."""
+        connected = False
+        contact = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                status, lease = self._post('/lease', {})
+            except DistributedError:
+                silent = time.monotonic() - contact
+                if connected and silent > self._lease_seconds:
+                    break  # shut down after the sweep, or gone for good
+                if not connected and silent > CONNECT_WAIT:
+                    raise
+                self._stop.wait(POLL_SECONDS)
+                continue
+            connected = True
+            contact = time.monotonic()
+            if status == 410:
+                break
+            if status != 200 or not lease:
+                self._stop.wait(POLL_SECONDS)
+                continue
+            self._work(lease)
+        self.session.close()
+        return self.shards
+
+    def _apply_limits(self, limits):
+        for key, (max_connections, active) in limits.items():
+            if self._limits.get(key) != (max_connections, active):
+                self.tester.governor.register(key, max_connections, active)
+                self._limits[key] = (max_connections, active)
+
+    def _work(self, lease):
+        shard, token = lease['shard'], lease['token']
+        lease_seconds = self._lease_seconds = lease.get('lease_seconds') or LEASE_SECONDS
+        self._apply_limits(lease.get('limits') or {})
+        channels = [channel_from_dict(c) for c in lease['channels']]
+        pending = []
+        lock = threading.Lock()
+        finished = threading.Event()
+        state = {'contact': time.monotonic(), 'leased': True}
+
+        def on_result(result):
+            with lock:
+                pending.append(result)
+            if self.on_result is not None:
+                self.on_result(result)
+
+        def flush(done=False):
+            with lock:
+                batch = pending[:]
+                del pending[:]
+            try:
+                if batch or done:
+                    _, reply = self._post('/results', {'shard': shard, 'token': token, 'results': batch,
+                                                       'done': done})
+                    self.sent += len(batch)
+                    self.accepted += (reply or {}).get('accepted', 0)
+                    leased = (reply or {}).get('leased', False)
+                else:
+                    status, _ = self._post('/heartbeat', {'shard': shard, 'token': token})
+                    leased = status == 200
+            except DistributedError:
+                with lock:
+                    pending[:0] = batch
+                if time.monotonic() - state['contact'] > lease_seconds:
+                    state['leased'] = False
+                    self.tester.stop()
+                return False
+            state['contact'] = time.monotonic()
+            if not leased and state['leased'] and not done:
+                state['leased'] = False
+                self.lost += 1
+                self.tester.stop()
+            return True
+
+        def report():
+            beat = time.monotonic()
+            while not finished.wait(FLUSH_SECONDS):
+                with lock:
+                    due = bool(pending)
+                if due or time.monotonic() - beat >= min(HEARTBEAT_SECONDS, lease_seconds / 3):
+                    flush()
+                    beat = time.monotonic()
+
+        reporter = threading.Thread(target=report, daemon=True)
+        reporter.start()
+        try:
+            self.tester.run(channels, on_result=on_result)
+        finally:
+            finished.set()
+            reporter.join()
+            for _ in range(3):
+                if flush(done=True):
+                    break
+                time.sleep(POLL_SECONDS)
+        self.shards += 1
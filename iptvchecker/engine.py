@@ -0,0 +1,323 @@
+"""Concurrent scheduler for stream tests.
+
+Stream tests spend nearly all their time waiting on the network and on
+ffmpeg/ffprobe child processes, so a pool of plain threads is enough to keep
+hundreds of probes in flight without the GIL getting in the way.
+"""
+import queue
+import subprocess
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+_DONE = object()
+_POLL = 0.25
+
+_processes = 0
+_processes_lock = threading.Lock()
+
+
+class Cancelled(Exception):
+    """Raised inside a test when the engine has been stopped."""
+
+
+def host_of(url):
+    try:
+        return urlsplit(url).netloc.lower()
+    except ValueError:
+        return ''
+
+
+def error_result(channel, error):
+    """Row reported for a channel whose test raised unexpectedly."""
+    return {'channel': channel.name, 'group': channel.group, 'url': channel.url,
+            'status': f'Error: {str(error)[:50]}'}
+
+
+def running_processes():
+    """Number of child processes started here that are still running."""
+    return _processes
+
+
+def _spawn(command):
+    global _processes
+    proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    with _processes_lock:
+        _processes += 1
+    return proc
+
+
+def _reaped():
+    global _processes
+    with _processes_lock:
+        _processes -= 1
+
+
+def run_command(command, timeout, cancel=None):
+    """Drop-in for subprocess.run(..., timeout=...) that can be interrupted.
+
+    The child is killed as soon as `cancel` (a threading.Event) is set, so
+    stopping a run does not have to wait for every in-flight ffmpeg/ffprobe
+    to hit its own timeout.
+    """
+    proc = _spawn(command)
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(command, timeout)
+            try:
+                stdout, stderr = proc.communicate(timeout=min(remaining, _POLL))
+                return subprocess.CompletedProcess(command, proc.returncode, stdout, stderr)
+            except subprocess.TimeoutExpired:
+                if cancel is not None and cancel.is_set():
+                    raise Cancelled()
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.communicate()
+        _reaped()
+
+
+class StreamingCommand:
+    """Runs a command and yields its stdout line by line as it is produced.
+
+    Used as a context manager.  A watchdog kills the child on timeout or
+    cancellation, which unblocks the reader; afterwards `timed_out` and
+    `cancelled` say why the output ended.  stderr is drained on a side
+    thread so a chatty child can never fill the pipe and stall.
+    """
+
+    def __init__(self, command, timeout, cancel=None):
+        self.command = command
+        self.timeout = timeout
+        self.cancel = cancel
+        self.timed_out = False
+        self.cancelled = False
+        self.started = None
+        self.proc = None
+        self._stderr = []
+        self._threads = []
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        self.proc = _spawn(self.command)
+        for target in (self._drain_stderr, self._watch):
+            t = threading.Thread(target=target, daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def __exit__(self, *exc):
+        self.kill()
+        self.proc.wait()
+        _reaped()
+        self.proc.stdout.close()
+        for t in self._threads:
+            t.join()
+        self.proc.stderr.close()
+        return False
+
+    def __iter__(self):
+        for raw in self.proc.stdout:
+            yield raw.decode('utf-8', 'replace').rstrip('\r\n')
+
+    def kill(self):
+        if self.proc.poll() is None:
+            self.proc.kill()
+
+    @property
+    def returncode(self):
+        return self.proc.poll()
+
+    @property
+    def stderr(self):
+        return b''.join(self._stderr).decode('utf-8', 'replace')
+
+    def _drain_stderr(self):
+        for chunk in iter(lambda: self.proc.stderr.read(4096), b''):
+            self._stderr.append(chunk)
+
+    def _watch(self):
+        deadline = self.started + self.timeout
+        while self.proc.poll() is None:
+            if self.cancel is not None and self.cancel.is_set():
+                self.cancelled = True
+                self.kill()
+            elif time.monotonic() >= deadline:
+                self.timed_out = True
+                self.kill()
+            else:
+                time.sleep(0.1)
+
+
+class StreamTestEngine:
+    """Runs `test_func(channel, cancel)` over many Channel records with a worker pool.
+
+    workers    -- number of concurrent tests
+    per_host   -- max concurrent tests against one host (0 = unlimited)
+    queue_size -- bound on channels buffered ahead of the workers
+    on_result  -- called from worker threads with each result as it finishes;
+                  if it raises, the run stops and run() re-raises the error
+    on_error   -- maps (channel, exception) to the result reported when
+                  test_func raises (default: error_result)
+    key_func   -- maps a URL to the key slots are counted by (default: host)
+    limit      -- callable giving the current cap for a key, replacing per_host
+    """
+
+    def __init__(self, test_func, workers=10, per_host=0, queue_size=None, on_result=None,
+                 key_func=host_of, limit=None, on_error=error_result):
+        self.test_func = test_func
+        self.workers = max(1, int(workers))
+        self.per_host = max(0, int(per_host or 0))
+        self.key_func = key_func
+        self.limit = limit or (lambda key: self.per_host)
+        self.queue_size = queue_size or self.workers * 4
+        self.on_result = on_result
+        self.on_error = on_error
+        self.error = None  # what stopped the run, re-raised by run()
+        self.cancel = threading.Event()
+        self.completed = 0
+        self.busy = 0
+        self._work = None
+        self._cond = threading.Condition()
+        self._active = {}
+        self._parked = {}
+        self._parked_count = 0
+
+    def stop(self):
+        self.cancel.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    @property
+    def stopped(self):
+        return self.cancel.is_set()
+
+    def stats(self):
+        """Snapshot of the pool: size, busy workers, queued and parked channels."""
+        with self._cond:
+            return {
+                'workers': self.workers,
+                'busy': self.busy,
+                'queued': self._work.qsize() if self._work is not None else 0,
+                'parked': self._parked_count,
+                'completed': self.completed,
+            }
+
+    def run(self, channels):
+        """Test every channel; blocks until all are done or stop() is called."""
+        self.error = None
+        work = self._work = queue.Queue(maxsize=self.queue_size)
+        threads = [threading.Thread(target=self._worker, args=(work,), daemon=True)
+                   for _ in range(self.workers)]
+        for t in threads:
+            t.start()
+        try:
+            for channel in channels:
+                if not self._put(work, channel):
+                    break
+        except BaseException:
+            self.stop()
+            raise
+        finally:
+            for _ in threads:
+                work.put(_DONE)
+            for t in threads:
+                t.join()
+        if self.error is not None:
+            raise self.error
+        return self.completed
+
+    def _put(self, work, item):
+        while not self.cancel.is_set():
+            try:
+                work.put(item, timeout=_POLL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _admit(self, host, channel):
+        """Take a slot on `host`, or park the channel until one frees up.
+
+        Returns True if the caller now owns a slot for `host`.  Parking is
+        bounded by queue_size; past that the caller waits so memory stays
+        flat even when a whole playlist points at a single provider.
+        """
+        with self._cond:
+            while True:
+                if self.cancel.is_set():
+                    return False
+                limit = self.limit(host)
+                if not limit or self._active.get(host, 0) < limit:
+                    self._active[host] = self._active.get(host, 0) + 1
+                    return True
+                if self._parked_count < self.queue_size:
+                    self._parked.setdefault(host, deque()).append(channel)
+                    self._parked_count += 1
+                    return False
+                self._cond.wait(_POLL)
+
+    def _next_for(self, host):
+        """Hand the slot on `host` to a parked channel, or release it.
+
+        The slot is released instead if the limit has shrunk below the number
+        of active tests; the last one always carries on, so parked channels
+        are never stranded.
+        """
+        with self._cond:
+            parked = self._parked.get(host)
+            limit = self.limit(host)
+            if parked and not self.cancel.is_set() and (not limit or self._active[host] <= limit):
+                self._parked_count -= 1
+                return parked.popleft()
+            self._active[host] -= 1
+            if parked is not None and not parked:
+                del self._parked[host]
+            self._cond.notify_all()
+            return None
+
+    def _worker(self, work):
+        while True:
+            channel = work.get()
+            if channel is _DONE:
+                return
+            host = self.key_func(channel.url)
+            if not self._admit(host, channel):
+                continue
+            while channel is not None:
+                try:
+                    self._test(channel)
+                except BaseException as e:
+                    self._fail(e)
+                # after a failure the run is stopped, so this frees the slot
+                channel = self._next_for(host)
+
+    def _fail(self, error):
+        """Keep the first error for run() to re-raise and stop the run."""
+        with self._cond:
+            if self.error is None:
+                self.error = error
+        self.stop()
+
+    def _test(self, channel):
+        if self.cancel.is_set():
+            return
+        with self._cond:
+            self.busy += 1
+        try:
+            result = self.test_func(channel, self.cancel)
+        except Cancelled:
+            return
+        except Exception as e:
+            result = self.on_error(channel, e)
+        finally:
+            with self._cond:
+                self.busy -= 1
+        with self._cond:
+            self.completed += 1
+        if self.on_result is not None:
+            self.on_result(result)
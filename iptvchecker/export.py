@@ -0,0 +1,160 @@
+"""Result exporters: CSV, TXT report, JSON Lines, JSON summary and the
+quality pie chart.
+
+Each takes result rows and a filename.  The rows may be a list or anything
+re-iterable, such as a JournalReader, in which case they are streamed from
+disk instead of being held in memory.  The TXT report, the JSON summary and
+the chart compute their statistics on a columnar ResultTable (numpy), which
+is imported only when one of them is written; matplotlib only for the chart.
+"""
+import json
+from datetime import datetime
+
+from .metrics import TIMING_FIELDS
+
+CSV_HEADER = ("Channel,Group,Resolution,FPS,Bitrate,Codec,Status,Audio,First Packet (ms),"
+              "DNS (ms),Connect (ms),Redirects,First Byte (ms),Pre-flight (ms),Probe (ms),Total (ms),"
+              "Bytes Read,Attempts,Bitrate (kbps),Min Bitrate (kbps),Max Bitrate (kbps),Stalls,Underruns,"
+              "Throughput (kbps),HLS Variants\n")
+STATS_FIELDS = ('bitrate_kbps', 'bitrate_min_kbps', 'bitrate_max_kbps', 'stalls', 'underruns', 'throughput_kbps')
+
+
+class ExportError(Exception):
+    """Nothing suitable to export; the message says why."""
+
+
+def write_csv(results, filename):
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write(CSV_HEADER)
+        for r in results:
+            ch = r['channel'].replace(',', ';')
+            gr = r['group'].replace(',', ';')
+            au = r.get('audio', 'N/A').replace(',', ';')
+            ttfp = r.get('first_packet_ms')
+            ttfp = 'N/A' if ttfp is None else ttfp
+            timings = ','.join('' if r.get(field) is None else str(r[field]) for field in TIMING_FIELDS)
+            stats = ','.join('' if r.get(field) is None else str(r[field]) for field in STATS_FIELDS)
+            variants = len(r['variants']) if r.get('variants') else ''
+            f.write(f'"{ch}","{gr}",{r["resolution"]},{r["fps"]},{r["bitrate"]},{r["codec"]},{r["status"]},"{au}",{ttfp},'
+                    f'{timings},{stats},{variants}\n')
+
+
+def write_jsonl(results, filename):
+    with open(filename, 'w', encoding='utf-8') as f:
+        for r in results:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+
+def _table(results):
+    from .resultstore import ResultTable
+
+    table = ResultTable(results)
+    if not len(table):
+        raise ExportError("No results to export")
+    return table
+
+
+def _kbps(value):
+    return 'N/A' if value is None else f"{round(value)} Kbps"
+
+
+def write_txt(results, filename):
+    """Two passes over `results`: a ResultTable for the statistics, then details."""
+    table = _table(results)
+    total = len(table)
+    success = int(table.ok.sum())
+    columns = table.group_columns()
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write("="*80 + "\n")
+        f.write("IPTV STREAM TEST RESULTS\n")
+        f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"Total Channels Tested: {total}\n")
+        f.write(f"Unique Stream URLs: {table.sources}\n")
+        f.write("="*80 + "\n\n")
+        fail = total - success
+        f.write(f"Successful Tests: {success}\nFailed Tests: {fail}\n")
+        f.write(f"Success Rate: {(success/total)*100:.1f}%\n\n")
+        if fail:
+            f.write("Status Breakdown:\n")
+            for k, v in table.status_counts():
+                f.write(f"{k}: {v} channels ({v/total*100:.1f}%)\n")
+            f.write("\n")
+        for title, suffix, histogram in (("Resolution Distribution", "", table.resolution_histogram()),
+                                         ("FPS Distribution", " FPS", table.fps_histogram())):
+            if histogram:
+                count = sum(v for _, v in histogram)
+                f.write(f"{title}:\n")
+                for k, v in histogram:
+                    f.write(f"{k}{suffix}: {v} channels ({v/count*100:.1f}%)\n")
+                f.write("\n")
+        percentiles = table.bitrate_percentiles()
+        if any(v is not None for v in percentiles.values()):
+            f.write("Bitrate (working channels): "
+                    + ", ".join(f"p{q} {_kbps(v)}" for q, v in percentiles.items()) + "\n\n")
+        worst = table.worst_groups(columns=columns)
+        if len(table.groups) > 1 and worst:
+            f.write("Worst Groups:\n")
+            for g in worst:
+                f.write(f"{g['group']}: {g['ok']}/{g['channels']} OK ({g['success_rate']*100:.1f}%), "
+                        f"median bitrate {_kbps(g['p50_kbps'])}\n")
+            f.write("\n")
+        f.write("Detailed Results:\n")
+        f.write("="*80 + "\n")
+        for idx, r in enumerate(results, 1):
+            f.write(f"#{idx} Name: {r['channel']}\nGroup: {r['group']}\n")
+            f.write(f"Resolution: {r['resolution']}\nFPS: {r['fps']}\n")
+            f.write(f"Bitrate: {r['bitrate']}\nCodec: {r['codec']}\nAudio: {r.get('audio', 'N/A')}\n")
+            for v in r.get('variants') or ():
+                f.write(f"Variant: {v['resolution'] or '?'} {_kbps(v['bandwidth_kbps'])} {v['codecs'] or '?'} - ")
+                if v.get('tested', True):
+                    f.write(f"{v['status']}, segment {_kbps(v['segment_kbps'])}, "
+                            f"throughput {_kbps(v['throughput_kbps'])}\n")
+                else:
+                    f.write("not tested\n")
+            f.write(f"Status: {r['status']}\n\n")
+
+
+def write_summary_json(results, filename):
+    """Aggregate report only: totals, histograms and per-group statistics."""
+    summary = _table(results).summary()
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+WRITERS = {'.csv': write_csv, '.jsonl': write_jsonl, '.txt': write_txt, '.json': write_summary_json}
+
+
+def write_pie_chart(results, filename):
+    """Raises ImportError without matplotlib, ExportError without usable data."""
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    from .resultstore import ResultTable
+
+    quality = ResultTable(results).quality_histogram()
+    if not quality:
+        raise ExportError("No successful results with resolution and FPS to chart")
+    labels, sizes = zip(*quality)
+    fig, ax = plt.subplots(figsize=(12, 10))
+    fig.suptitle(f'IPTV Stream Quality Distribution: {datetime.now().strftime("%B %d")}', fontsize=18, fontweight='bold', y=0.98)
+    colors = plt.cm.tab20c(range(len(labels)))
+
+    def autopct(pct):
+        return f'{pct:.1f}%' if pct > 2 else ''
+
+    wedges, texts, autotexts = ax.pie(sizes, labels=None, colors=colors, autopct=autopct,
+                                      startangle=90, pctdistance=0.85, explode=[0.02]*len(sizes))
+    for autotext in autotexts:
+        autotext.set_color('white')
+        autotext.set_fontsize(11)
+        autotext.set_fontweight('bold')
+    for i, (label, size) in enumerate(zip(labels, sizes)):
+        angle = (wedges[i].theta2 + wedges[i].theta1) / 2
+        x = 1.3 * np.cos(np.radians(angle))
+        y = 1.3 * np.sin(np.radians(angle))
+        ha = 'left' if x > 0 else 'right'
+        ax.text(x, y, f'{label} ({size})', ha=ha, va='center', fontsize=11, fontweight='bold')
+    ax.axis('equal')
+    plt.tight_layout(rect=[0, 0, 1, 0.96])
+    plt.savefig(filename, dpi=300, bbox_inches='tight', facecolor='white')
+    plt.close(fig)
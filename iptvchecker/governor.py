@@ -0,0 +1,185 @@
+"""Per-account connection governor.
+
+Xtream panels cap how many streams an account may open at once and answer
+anything beyond that with 403/429/509 (or ban the account), which would
+otherwise show up as false Dead results.  The governor keeps a concurrency
+window per account (per host for plain playlists), seeded from the panel's
+`max_connections - active_cons`, and adjusts it AIMD-style: every clean probe
+grows the window by 1/window up to the cap, every throttled probe halves it
+and puts the account in an exponentially growing cooldown before the probe
+is retried.  A probe waits in acquire() while its account is cooling down
+or has its window full; the engine's own --per-host cap stays per host.
+"""
+import threading
+import time
+
+from .engine import Cancelled, host_of
+from .probe import THROTTLED
+
+MAX_RETRIES = 3
+BACKOFF = 5.0
+MAX_BACKOFF = 120.0
+POLL = 0.25  # how often a waiting acquire() checks for cancellation
+
+_STREAM_PREFIXES = ('live', 'movie', 'series', 'timeshift')
+
+
+def account_key(url):
+    """'host/username' for Xtream-style stream URLs, otherwise the host.
+
+    Matches both http://host/live/USER/PASS/ID.ts and the http://host/USER/PASS/ID
+    form that get.php playlists use.
+    """
+    host = host_of(url)
+    path = url.split('://', 1)[-1].split('?', 1)[0]
+    parts = [p for p in path.split('/')[1:] if p]
+    if parts and parts[0] in _STREAM_PREFIXES:
+        parts = parts[1:]
+    if len(parts) == 3:
+        return f"{host}/{parts[0]}"
+    return host
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class AccountBudget:
+    __slots__ = ('key', 'cap', 'window', 'in_use', 'peak', 'probes', 'throttles', 'retries',
+                 'strikes', 'cooldown_until')
+
+    def __init__(self, key, cap=None):
+        self.key = key
+        self.cap = cap
+        self.window = float(cap) if cap else None  # None: no limit seen yet
+        self.in_use = 0
+        self.peak = 0
+        self.probes = 0
+        self.throttles = 0
+        self.retries = 0
+        self.strikes = 0
+        self.cooldown_until = 0.0
+
+    @property
+    def limit(self):
+        return max(1, int(self.window)) if self.window is not None else 0
+
+
+class Governor:
+    """Shared by the tester's workers: account windows, cooldowns, retries."""
+
+    def __init__(self, max_retries=MAX_RETRIES, backoff=BACKOFF, max_backoff=MAX_BACKOFF):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._budgets = {}
+        self._lock = threading.Condition()  # notified whenever a probe is released
+
+    key_for = staticmethod(account_key)
+
+    def _budget(self, key):
+        budget = self._budgets.get(key)
+        if budget is None:
+            budget = self._budgets[key] = AccountBudget(key)
+        return budget
+
+    def register(self, key, max_connections, active_connections=0):
+        """Seed `key` with the cap a panel reported; unknown caps are ignored."""
+        cap = _int(max_connections)
+        if not cap or cap <= 0:
+            return
+        cap = max(1, cap - (_int(active_connections) or 0))
+        with self._lock:
+            budget = self._budget(key)
+            budget.cap = cap
+            budget.window = float(cap)
+
+    def limit(self, key):
+        """Max concurrent probes for `key` right now (0 = unlimited)."""
+        with self._lock:
+            budget = self._budgets.get(key)
+            return budget.limit if budget is not None else 0
+
+    def acquire(self, key, cancel=None):
+        """Wait out any cooldown on `key` and for room in its window, then
+        count a probe as in flight."""
+        with self._lock:
+            while True:
+                budget = self._budget(key)
+                wait = budget.cooldown_until - time.monotonic()
+                if wait <= 0 and (not budget.limit or budget.in_use < budget.limit):
+                    budget.in_use += 1
+                    budget.peak = max(budget.peak, budget.in_use)
+                    budget.probes += 1
+                    return
+                if cancel is not None and cancel.is_set():
+                    raise Cancelled()
+                self._lock.wait(min(wait, 1.0) if wait > 0 else POLL)
+
+    def release(self, key, status, attempt):
+        """Record a finished probe; returns None if it should be retried,
+        otherwise the status to report.
+
+        THROTTLED always counts as pushback.  Auth (a bare 403) does too when
+        the account was at its known cap with other probes in flight, since
+        that is how many panels refuse the connection past max_connections;
+        a 403 on a lone probe is about that stream, and leaves the account
+        alone.  Pushback that outlasts the retries is reported as THROTTLED,
+        which is transient and never cached.
+        """
+        with self._lock:
+            budget = self._budget(key)
+            in_use = budget.in_use
+            budget.in_use -= 1
+            self._lock.notify_all()
+            throttled = status == THROTTLED or (status == "Auth" and budget.cap is not None
+                                                and in_use > 1 and in_use >= budget.cap)
+            if not throttled:
+                budget.strikes = 0
+                if budget.window is not None:
+                    budget.window += 1 / budget.window
+                    if budget.cap is not None:
+                        budget.window = min(budget.window, float(budget.cap))
+                return status
+            budget.throttles += 1
+            budget.strikes += 1
+            current = budget.window if budget.window is not None else float(in_use)
+            budget.window = max(1.0, current / 2)
+            delay = min(self.max_backoff, self.backoff * 2 ** (budget.strikes - 1))
+            budget.cooldown_until = max(budget.cooldown_until, time.monotonic() + delay)
+            if attempt < self.max_retries:
+                budget.retries += 1
+                return None
+            return THROTTLED
+
+    def stats(self):
+        """One dict per account: cap, current window, use and pushback counts."""
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                'account': b.key,
+                'cap': b.cap,
+                'window': b.limit or None,
+                'in_use': b.in_use,
+                'peak': b.peak,
+                'utilization': round(b.in_use / b.cap, 2) if b.cap else None,
+                'probes': b.probes,
+                'throttles': b.throttles,
+                'retries': b.retries,
+                'cooldown': round(max(0.0, b.cooldown_until - now), 1),
+            } for b in self._budgets.values()]
+
+
+def format_stats(stats):
+    """Human-readable lines for Governor.stats()."""
+    lines = []
+    for s in sorted(stats, key=lambda s: s['account']):
+        cap = f"{s['in_use']}/{s['cap']} connections" if s['cap'] else f"{s['in_use']} connections"
+        window = f", window {s['window']}" if s['window'] else ""
+        cooldown = f", cooling down {s['cooldown']}s" if s['cooldown'] else ""
+        lines.append(f"{s['account']}: {cap} (peak {s['peak']}){window}, {s['probes']} probes, "
+                     f"{s['throttles']} throttled, {s['retries']} retried{cooldown}")
+    return lines
@@ -0,0 +1,434 @@
+"""Tkinter client for the stream tester."""
+import queue
+import threading
+import time
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+
+from .cache import ResultCache
+from .export import ExportError, write_csv, write_pie_chart, write_summary_json, write_txt
+from .journal import JournalReader, ResultJournal, channel_key, default_journal_path, result_key
+from .playlist import Playlist, iter_file_lines, iter_url_lines, load_m3u
+from .resultsview import ALL, COLUMNS, FILTERABLE, ResultView
+from .tester import StreamTester
+from .xtream import XtreamError, load_xtream
+
+
+# Results are handed from worker threads to Tk through a queue and drained in
+# time-sliced batches, so the event loop never backs up behind per-row callbacks.
+DRAIN_INTERVAL_MS = 100
+DRAIN_SLICE = 0.02
+REDRAW_INTERVAL = 0.5
+
+
+class IPTVStreamTester:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("IPTV Stream Quality Tester")
+        self.root.geometry("1000x700")
+        self.playlist = Playlist()
+        self.test_results = []
+        self.is_testing = False
+        self.tester = None
+        self.cache = None
+        self.journal_path = default_journal_path()
+        self.journaled = False
+        self.result_queue = queue.SimpleQueue()
+        self.results_view = ResultView()
+        self.total_to_test = 0
+        self.last_redraw = 0
+        self.view_dirty = False
+        self.create_widgets()
+
+    def create_widgets(self):
+        notebook = ttk.Notebook(self.root)
+        notebook.pack(fill='both', expand=True, padx=10, pady=10)
+        self.m3u_frame = ttk.Frame(notebook)
+        notebook.add(self.m3u_frame, text='M3U Playlist')
+        self.create_m3u_tab()
+        self.xtream_frame = ttk.Frame(notebook)
+        notebook.add(self.xtream_frame, text='Xtream Codes')
+        self.create_xtream_tab()
+        self.results_frame = ttk.Frame(notebook)
+        notebook.add(self.results_frame, text='Test Results')
+        self.create_results_tab()
+
+    def create_m3u_tab(self):
+        input_frame = ttk.LabelFrame(self.m3u_frame, text="M3U Source", padding=10)
+        input_frame.pack(fill='x', padx=10, pady=10)
+        ttk.Label(input_frame, text="M3U URL:").grid(row=0, column=0, sticky='w', pady=5)
+        self.m3u_url_entry = ttk.Entry(input_frame, width=50)
+        self.m3u_url_entry.grid(row=0, column=1, padx=5, pady=5)
+        ttk.Button(input_frame, text="Load from File", command=self.load_m3u_file).grid(row=0, column=2, padx=5, pady=5)
+        ttk.Button(input_frame, text="Load from URL", command=self.load_m3u_url).grid(row=0, column=3, padx=5, pady=5)
+        self.create_groups_section(self.m3u_frame)
+
+    def load_m3u_file(self):
+        filename = filedialog.askopenfilename(
+            title="Select M3U File",
+            filetypes=(("M3U files", "*.m3u"), ("All files", "*.*"))
+        )
+        if filename:
+            self.load_playlist_async(lambda report: load_m3u(iter_file_lines(filename), progress=report),
+                                     "Failed to read file")
+
+    def load_m3u_url(self):
+        url = self.m3u_url_entry.get()
+        if url:
+            self.load_playlist_async(lambda report: load_m3u(iter_url_lines(url), progress=report),
+                                     "Failed to load M3U")
+
+    def load_playlist_async(self, load, error_prefix, done_prefix="Loaded"):
+        """Run load(progress) on a background thread so the UI stays responsive."""
+        def report(count):
+            self.root.after(0, self.progress_var.set, f"Loading... {count} channels")
+
+        def worker():
+            try:
+                playlist = load(report)
+            except XtreamError as e:
+                self.root.after(0, messagebox.showerror, "Error", str(e))
+                self.root.after(0, self.progress_var.set, "Ready")
+                return
+            except Exception as e:
+                self.root.after(0, messagebox.showerror, "Error", f"{error_prefix}: {str(e)}")
+                self.root.after(0, self.progress_var.set, "Ready")
+                return
+            self.root.after(0, self.set_playlist, playlist,
+                            f"{done_prefix} {len(playlist)} channels in {len(playlist.groups)} groups")
+
+        self.progress_var.set("Loading...")
+        threading.Thread(target=worker, daemon=True).start()
+
+    def set_playlist(self, playlist, message):
+        self.playlist = playlist
+        self.update_groups_listbox()
+        self.progress_var.set("Ready")
+        messagebox.showinfo("Success", message)
+
+    def create_xtream_tab(self):
+        login_frame = ttk.LabelFrame(self.xtream_frame, text="Xtream Codes Login", padding=10)
+        login_frame.pack(fill='x', padx=10, pady=10)
+        ttk.Label(login_frame, text="Server URL:").grid(row=0, column=0, sticky='w', pady=5)
+        self.xtream_server = ttk.Entry(login_frame, width=40)
+        self.xtream_server.grid(row=0, column=1, padx=5, pady=5)
+        ttk.Label(login_frame, text="Username:").grid(row=1, column=0, sticky='w', pady=5)
+        self.xtream_username = ttk.Entry(login_frame, width=40)
+        self.xtream_username.grid(row=1, column=1, padx=5, pady=5)
+        ttk.Label(login_frame, text="Password:").grid(row=2, column=0, sticky='w', pady=5)
+        self.xtream_password = ttk.Entry(login_frame, width=40, show="*")
+        self.xtream_password.grid(row=2, column=1, padx=5, pady=5)
+        ttk.Button(login_frame, text="Connect", command=self.connect_xtream).grid(row=3, column=1, pady=10)
+        self.create_groups_section(self.xtream_frame)
+
+    def connect_xtream(self):
+        server = self.xtream_server.get().rstrip('/')
+        username = self.xtream_username.get()
+        password = self.xtream_password.get()
+        if not all([server, username, password]):
+            messagebox.showerror("Error", "Please fill in all fields")
+            return
+        self.load_playlist_async(lambda report: load_xtream(server, username, password, progress=report),
+                                 "Connection failed", "Connected! Loaded")
+
+    def create_groups_section(self, parent):
+        groups_frame = ttk.LabelFrame(parent, text="Channel Groups", padding=10)
+        groups_frame.pack(fill='both', expand=True, padx=10, pady=10)
+        list_frame = ttk.Frame(groups_frame)
+        list_frame.pack(side='left', fill='both', expand=True)
+        scrollbar = ttk.Scrollbar(list_frame)
+        scrollbar.pack(side='right', fill='y')
+        self.groups_listbox = tk.Listbox(list_frame, selectmode='multiple', yscrollcommand=scrollbar.set)
+        self.groups_listbox.pack(side='left', fill='both', expand=True)
+        scrollbar.config(command=self.groups_listbox.yview)
+        button_frame = ttk.Frame(groups_frame)
+        button_frame.pack(side='right', fill='y', padx=10)
+        ttk.Button(button_frame, text="Select All", command=self.select_all_groups).pack(pady=5)
+        ttk.Button(button_frame, text="Deselect All", command=self.deselect_all_groups).pack(pady=5)
+        ttk.Button(button_frame, text="Start Testing", command=self.start_testing).pack(pady=(20, 5))
+        ttk.Button(button_frame, text="Resume Last Run", command=lambda: self.start_testing(resume=True)).pack(pady=5)
+        ttk.Button(button_frame, text="Stop Testing", command=self.stop_testing).pack(pady=5)
+        options_frame = ttk.Frame(button_frame)
+        options_frame.pack(pady=5)
+        ttk.Label(options_frame, text="Workers:").grid(row=0, column=0, sticky='w')
+        self.workers_var = tk.IntVar(value=10)
+        ttk.Spinbox(options_frame, from_=1, to=200, width=5, textvariable=self.workers_var).grid(row=0, column=1, padx=2)
+        ttk.Label(options_frame, text="Per host:").grid(row=1, column=0, sticky='w')
+        self.per_host_var = tk.IntVar(value=0)
+        ttk.Spinbox(options_frame, from_=0, to=200, width=5, textvariable=self.per_host_var).grid(row=1, column=1, padx=2)
+        ttk.Label(options_frame, text="Probe:").grid(row=2, column=0, sticky='w')
+        self.probe_mode_var = tk.StringVar(value='Native')
+        ttk.Combobox(options_frame, textvariable=self.probe_mode_var, values=('Native', 'Single', 'Legacy'),
+                     state='readonly', width=7).grid(row=2, column=1, padx=2)
+        self.preflight_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(options_frame, text="Pre-flight check", variable=self.preflight_var).grid(row=3, column=0, columnspan=2, sticky='w')
+        self.use_cache_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(options_frame, text="Use result cache", variable=self.use_cache_var).grid(row=4, column=0, columnspan=2, sticky='w')
+        self.refresh_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Force refresh", variable=self.refresh_var).grid(row=5, column=0, columnspan=2, sticky='w')
+        self.progress_var = tk.StringVar(value="Ready")
+        ttk.Label(button_frame, textvariable=self.progress_var, wraplength=150).pack(pady=10)
+        self.progress_bar = ttk.Progressbar(button_frame, mode='determinate')
+        self.progress_bar.pack(pady=5)
+
+    def update_groups_listbox(self):
+        self.groups_listbox.delete(0, tk.END)
+        groups = self.playlist.groups
+        for group in sorted(groups):
+            self.groups_listbox.insert(tk.END, f"{group} ({len(groups[group])} channels)")
+
+    def select_all_groups(self):
+        self.groups_listbox.select_set(0, 'end')
+
+    def deselect_all_groups(self):
+        self.groups_listbox.select_clear(0, 'end')
+
+    def create_results_tab(self):
+        filter_frame = ttk.Frame(self.results_frame)
+        filter_frame.pack(fill='x', padx=10, pady=(10, 0))
+        self.filter_boxes = {}
+        for column in FILTERABLE:
+            ttk.Label(filter_frame, text=f"{column}:").pack(side='left')
+            box = ttk.Combobox(filter_frame, values=(ALL,), state='readonly', width=18)
+            box.set(ALL)
+            box.bind('<<ComboboxSelected>>', lambda event, c=column: self.apply_filter(c))
+            box.pack(side='left', padx=(2, 10))
+            self.filter_boxes[column] = box
+        ttk.Button(filter_frame, text=">", width=3, command=lambda: self.turn_page(1)).pack(side='right')
+        self.page_var = tk.StringVar(value="Page 1/1")
+        ttk.Label(filter_frame, textvariable=self.page_var).pack(side='right', padx=5)
+        ttk.Button(filter_frame, text="<", width=3, command=lambda: self.turn_page(-1)).pack(side='right')
+        table_frame = ttk.Frame(self.results_frame)
+        table_frame.pack(fill='both', expand=True)
+        self.results_tree = ttk.Treeview(table_frame, columns=COLUMNS, show='tree headings')
+        for col in COLUMNS:
+            self.results_tree.heading(col, text=col, command=lambda c=col: self.sort_results(c))
+            self.results_tree.column(col, width=120)
+        scrollbar = ttk.Scrollbar(table_frame, orient='vertical', command=self.results_tree.yview)
+        self.results_tree.configure(yscrollcommand=scrollbar.set)
+        self.results_tree.pack(side='left', fill='both', expand=True, padx=10, pady=10)
+        scrollbar.pack(side='right', fill='y', pady=10)
+        export_frame = ttk.Frame(self.results_frame)
+        export_frame.pack(pady=5)
+        ttk.Button(export_frame, text="Export to CSV", command=self.export_to_csv).pack(side='left', padx=5)
+        ttk.Button(export_frame, text="Export to TXT", command=self.export_to_txt).pack(side='left', padx=5)
+        ttk.Button(export_frame, text="Export Summary (JSON)", command=self.export_summary).pack(side='left', padx=5)
+        ttk.Button(export_frame, text="Export Pie Chart (PNG)", command=self.export_pie_charts).pack(side='left', padx=5)
+
+    def start_testing(self, resume=False):
+        """Test the selected groups; with resume, keep the journal's results
+        and only test the channels it does not have yet."""
+        if self.is_testing:
+            messagebox.showwarning("Warning", "A test run is already in progress")
+            return
+        selected_indices = self.groups_listbox.curselection()
+        if not selected_indices:
+            messagebox.showwarning("Warning", "Please select at least one group")
+            return
+        selected_groups = [self.groups_listbox.get(i).rsplit(' (', 1)[0] for i in selected_indices]
+        channels_to_test = []
+        for group in selected_groups:
+            channels_to_test.extend(self.playlist.group_channels(group))
+        if not channels_to_test:
+            messagebox.showerror("Error", "No channels found in selected groups")
+            return
+        previous = []
+        if resume:
+            previous = list(JournalReader(self.journal_path))
+            done = {result_key(r) for r in previous}
+            channels_to_test = [c for c in channels_to_test if channel_key(c) not in done]
+            if not channels_to_test:
+                messagebox.showinfo("Resume", "Every channel in the selected groups is already in the last run")
+                return
+        try:
+            journal = ResultJournal(self.journal_path, resume=resume)
+        except OSError as e:
+            journal = None
+            messagebox.showwarning("Warning", f"Result journal unavailable, results will not survive a crash: {str(e)}")
+        self.is_testing = True
+        self.test_results = previous
+        self.journaled = journal is not None
+        self.results_view.reset(self.test_results)
+        self.refresh_filter_options()
+        self.redraw_results()
+        self.total_to_test = len(previous) + len(channels_to_test)
+        self.progress_bar['maximum'] = self.total_to_test
+        self.progress_bar['value'] = len(previous)
+        try:
+            workers, per_host = self.workers_var.get(), self.per_host_var.get()
+        except tk.TclError:
+            workers, per_host = 10, 0
+        if self.use_cache_var.get() and self.cache is None:
+            try:
+                self.cache = ResultCache()
+            except Exception as e:
+                messagebox.showwarning("Warning", f"Result cache unavailable: {str(e)}")
+        self.tester = StreamTester(workers=workers, per_host=per_host,
+                                   probe=self.probe_mode_var.get().lower(),
+                                   use_preflight=self.preflight_var.get(),
+                                   cache=self.cache if self.use_cache_var.get() else None,
+                                   refresh=self.refresh_var.get(),
+                                   journal=journal, limits=self.playlist.accounts)
+        threading.Thread(target=self.test_channels, args=(channels_to_test,), daemon=True).start()
+        self.root.after(DRAIN_INTERVAL_MS, self.drain_results)
+
+    def stop_testing(self):
+        if self.tester:
+            self.tester.stop()
+        self.progress_var.set("Stopping...")
+
+    def test_channels(self, channels):
+        total = len(channels)
+        self.root.after(0, self.progress_var.set, f"Testing {total} channels with {self.tester.workers} workers...")
+        try:
+            done = self.tester.run(channels, on_result=self.result_queue.put)
+        except Exception as e:
+            # e.g. the journal's disk filled up; the engine has stopped
+            self.root.after(0, self.finish_testing, f"Testing failed: {e}")
+            return
+        finally:
+            if self.tester.journal is not None:
+                self.tester.journal.close()
+        sources = f"{self.tester.sources} unique sources"
+        if self.tester.stopped:
+            message = f"Testing stopped after {done}/{total} channels ({sources})"
+        elif self.tester.cache is not None:
+            message = f"Complete! Tested {done} channels ({sources}, {self.tester.cache.hits} from cache)"
+        else:
+            message = f"Complete! Tested {done} channels ({sources})"
+        retried = sum(s['retries'] for s in self.tester.governor.stats())
+        if retried:
+            message += f"; {retried} probes retried after provider pushback"
+        self.root.after(0, self.finish_testing, message)
+
+    def finish_testing(self, message):
+        self.is_testing = False
+        self.drain_results()
+        self.progress_var.set(message)
+
+    def drain_results(self):
+        """Move queued results into the view for at most DRAIN_SLICE seconds."""
+        start = len(self.test_results)
+        deadline = time.monotonic() + DRAIN_SLICE
+        while time.monotonic() < deadline:
+            try:
+                self.test_results.append(self.result_queue.get_nowait())
+            except queue.Empty:
+                break
+        done = len(self.test_results)
+        if done > start:
+            if self.results_view.extend(start):
+                self.view_dirty = True
+            self.progress_bar['value'] = done
+            if self.is_testing:
+                self.progress_var.set(f"Tested {done}/{self.total_to_test}: {self.test_results[-1]['channel'][:30]}")
+        now = time.monotonic()
+        if self.view_dirty and (now - self.last_redraw >= REDRAW_INTERVAL or not self.is_testing):
+            self.refresh_filter_options()
+            self.redraw_results()
+        if self.is_testing or not self.result_queue.empty():
+            self.root.after(DRAIN_INTERVAL_MS, self.drain_results)
+
+    def redraw_results(self):
+        """Show the current page of the view; the tree never holds more than a page."""
+        self.results_tree.delete(*self.results_tree.get_children())
+        for result in self.results_view.page_rows():
+            self.results_tree.insert('', 'end', values=(
+                result['channel'], result['group'], result['resolution'], result['fps'],
+                result['bitrate'], result['codec'], result['status']
+            ))
+        view = self.results_view
+        self.page_var.set(f"Page {view.page + 1}/{view.pages} ({len(view)} rows)")
+        self.view_dirty = False
+        self.last_redraw = time.monotonic()
+
+    def refresh_filter_options(self):
+        for column, box in self.filter_boxes.items():
+            values = (ALL,) + tuple(sorted(self.results_view.options[column]))
+            if tuple(box['values']) != values:
+                box['values'] = values
+
+    def apply_filter(self, column):
+        self.results_view.set_filter(column, self.filter_boxes[column].get())
+        self.redraw_results()
+
+    def sort_results(self, column):
+        self.results_view.sort_by(column)
+        arrow = " \u25bc" if self.results_view.descending else " \u25b2"
+        for col in COLUMNS:
+            self.results_tree.heading(col, text=col + (arrow if col == column else ""))
+        self.redraw_results()
+
+    def turn_page(self, delta):
+        self.results_view.turn(delta)
+        self.redraw_results()
+
+    def export_source(self):
+        """Stream exports from the run's journal; fall back to memory without one."""
+        if self.journaled and not self.is_testing:
+            return JournalReader(self.journal_path)
+        return self.test_results
+
+    def export_to_csv(self):
+        if not self.test_results:
+            messagebox.showwarning("Warning", "No results to export")
+            return
+        filename = filedialog.asksaveasfilename(defaultextension=".csv",
+                                                filetypes=(("CSV files", "*.csv"), ("All files", "*.*")))
+        if filename:
+            try:
+                write_csv(self.export_source(), filename)
+                messagebox.showinfo("Success", f"Results exported to {filename}")
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to export CSV: {str(e)}")
+
+    def export_to_txt(self):
+        if not self.test_results:
+            messagebox.showwarning("Warning", "No results to export")
+            return
+        filename = filedialog.asksaveasfilename(defaultextension=".txt",
+                                                filetypes=(("Text files", "*.txt"), ("All files", "*.*")))
+        if filename:
+            try:
+                write_txt(self.export_source(), filename)
+                messagebox.showinfo("Success", f"Results exported to {filename}")
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to export TXT: {str(e)}")
+
+    def export_summary(self):
+        if not self.test_results:
+            messagebox.showwarning("Warning", "No results to export")
+            return
+        filename = filedialog.asksaveasfilename(defaultextension=".json",
+                                                filetypes=(("JSON files", "*.json"), ("All files", "*.*")))
+        if filename:
+            try:
+                write_summary_json(self.export_source(), filename)
+                messagebox.showinfo("Success", f"Summary exported to {filename}")
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to export summary: {str(e)}")
+
+    def export_pie_charts(self):
+        if not self.test_results:
+            messagebox.showwarning("Warning", "No results to export")
+            return
+        filename = filedialog.asksaveasfilename(defaultextension=".png",
+                                                filetypes=(("PNG files", "*.png"), ("All files", "*.*")),
+                                                title="Save Pie Chart")
+        if not filename:
+            return
+        try:
+            write_pie_chart(self.export_source(), filename)
+            messagebox.showinfo("Success", f"Pie chart exported successfully!\nFile: {filename}")
+        except ImportError:
+            messagebox.showerror("Error", "Matplotlib needed for pie chart export.\npip install matplotlib")
+        except ExportError as e:
+            messagebox.showwarning("Warning", str(e))
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to export pie chart: {str(e)}")
+
+
+def run():
+    root = tk.Tk()
+    IPTVStreamTester(root)
+    root.mainloop()
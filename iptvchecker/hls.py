@@ -0,0 +1,317 @@
+"""Native HLS stage: master playlist, variants and one segment per variant.
+
+Left to ffprobe, an .m3u8 channel costs a master playlist, a variant
+playlist and segments per tool run, with the variant picked by the tool.
+Here the master playlist comes from the pre-flight request itself, every
+EXT-X-STREAM-INF variant is listed with its advertised bandwidth,
+resolution, frame rate and codecs, and each tested variant gets its media
+playlist (through a short-lived PlaylistCache shared by all channels, so
+channels on one CDN share playlist fetches) and one segment.  The segment
+download gives the real throughput and, for MPEG-TS segments, goes through
+the tsinfo analyzer for the actual stream metadata.
+"""
+import re
+import threading
+import time
+from urllib.parse import urljoin
+
+import requests
+
+from .preflight import CONNECT_TIMEOUT, FIRST_BYTE_TIMEOUT, READ_BYTES, http_status, read_playlist
+from .probe import THROTTLED, empty_info
+from .tsinfo import TSAnalyzer
+
+PLAYLIST_TTL = 5.0
+MAX_PLAYLISTS = 4096
+LIVE_EDGE_SEGMENTS = 3
+VARIANT_MODES = ('top', 'all')
+
+_ATTRIBUTE_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+_CODECS = {'avc1': 'h264', 'avc3': 'h264', 'hvc1': 'hevc', 'hev1': 'hevc', 'av01': 'av1', 'vp09': 'vp9',
+           'mp4a': 'aac', 'ac-3': 'ac3', 'ec-3': 'eac3', 'opus': 'opus'}
+_VIDEO_CODECS = {'h264', 'hevc', 'av1', 'vp9'}
+
+
+class HLSError(Exception):
+    """A playlist or segment request failed; `status` is the result status."""
+
+    def __init__(self, status, message=None):
+        super().__init__(message or status)
+        self.status = status
+
+
+def parse_attributes(text):
+    """'BANDWIDTH=1280000,CODECS="avc1.4d401f,mp4a.40.2"' -> dict, quotes stripped."""
+    return {key: value.strip('"') for key, value in _ATTRIBUTE_RE.findall(text)}
+
+
+def codec_names(codecs):
+    """'avc1.640028,mp4a.40.2' -> ('h264', 'aac'); None for unknown entries."""
+    names = [_CODECS.get(c.strip().split('.', 1)[0].lower()) for c in codecs.split(',')] if codecs else []
+    video = next((n for n in names if n in _VIDEO_CODECS), None)
+    audio = next((n for n in names if n and n not in _VIDEO_CODECS), None)
+    return video, audio
+
+
+class Variant:
+    __slots__ = ('url', 'bandwidth', 'width', 'height', 'fps', 'codecs')
+
+    def __init__(self, url, bandwidth=None, width=None, height=None, fps=None, codecs=None):
+        self.url = url
+        self.bandwidth = bandwidth
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.codecs = codecs
+
+
+def parse_master(text, base_url):
+    """Variants of a master playlist, highest bandwidth first; None if `text`
+    is a media playlist already (it then stands for its only variant)."""
+    variants = []
+    attributes = None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('#EXT-X-STREAM-INF:'):
+            attributes = parse_attributes(line[18:])
+        elif line.startswith('#EXTINF:'):
+            return None
+        elif line and not line.startswith('#') and attributes is not None:
+            width = height = None
+            size = attributes.get('RESOLUTION', '').lower().partition('x')
+            if size[0].isdigit() and size[2].isdigit():
+                width, height = int(size[0]), int(size[2])
+            bandwidth = attributes.get('AVERAGE-BANDWIDTH') or attributes.get('BANDWIDTH')
+            try:
+                fps = float(attributes['FRAME-RATE'])
+            except (KeyError, ValueError):
+                fps = None
+            variants.append(Variant(urljoin(base_url, line), int(bandwidth) if bandwidth and bandwidth.isdigit()
+                                    else None, width, height, fps, attributes.get('CODECS')))
+            attributes = None
+    variants.sort(key=lambda v: v.bandwidth or 0, reverse=True)
+    return variants
+
+
+def parse_media(text, base_url):
+    """(segments, live) of a media playlist: [(url, seconds), ...] and whether
+    it is still growing (no EXT-X-ENDLIST)."""
+    segments = []
+    duration = None
+    live = True
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('#EXTINF:'):
+            try:
+                duration = float(line[8:].split(',', 1)[0])
+            except ValueError:
+                duration = None
+        elif line.startswith('#EXT-X-ENDLIST'):
+            live = False
+        elif line and not line.startswith('#'):
+            segments.append((urljoin(base_url, line), duration))
+            duration = None
+    return segments, live
+
+
+def pick_segment(segments, live):
+    """The segment a player would start with: a few back from a live edge,
+    the first of a finished playlist."""
+    if not segments:
+        return None
+    if live:
+        return segments[max(0, len(segments) - LIVE_EDGE_SEGMENTS)]
+    return segments[0]
+
+
+class PlaylistCache:
+    """Thread-safe playlist texts by URL for `ttl` seconds.
+
+    Concurrent requests for a URL that is being fetched wait for that fetch
+    instead of starting their own; failures are not cached.
+    """
+
+    def __init__(self, ttl=PLAYLIST_TTL, max_entries=MAX_PLAYLISTS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = {}  # url -> (expires, final url, text)
+        self._pending = {}  # url -> Event set when its fetch ends
+
+    def put(self, url, final_url, text):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[url] = (now + self.ttl, final_url, text)
+
+    def get(self, url, fetch):
+        """(final url, text) of `url`, calling fetch(url) on a miss."""
+        while True:
+            with self._lock:
+                entry = self._entries.get(url)
+                if entry is not None and entry[0] > time.monotonic():
+                    self.hits += 1
+                    return entry[1], entry[2]
+                pending = self._pending.get(url)
+                if pending is None:
+                    self._pending[url] = threading.Event()
+                    self.misses += 1
+                    break
+            pending.wait()
+        try:
+            final_url, text = fetch(url)
+            self.put(url, final_url, text)
+            return final_url, text
+        finally:
+            with self._lock:
+                self._pending.pop(url).set()
+
+
+def _request(session, url):
+    """session.get() with the pre-flight timeouts, mapping failures to HLSError."""
+    try:
+        response = session.get(url, stream=True, timeout=(CONNECT_TIMEOUT, FIRST_BYTE_TIMEOUT))
+    except requests.exceptions.Timeout:
+        raise HLSError("Timeout")
+    except requests.exceptions.RequestException as e:
+        raise HLSError("Dead", str(e))
+    status = http_status(response.status_code)
+    if status:
+        response.close()
+        raise HLSError(status, f"HTTP {response.status_code} for {url}")
+    return response
+
+
+def fetch_playlist(session, url):
+    with _request(session, url) as response:
+        try:
+            text = read_playlist(response.iter_content(READ_BYTES))
+        except requests.exceptions.RequestException:
+            raise HLSError("Timeout")
+    if text is None:
+        raise HLSError("Dead", f"playlist too large: {url}")
+    return response.url, text
+
+
+def measure_segment(session, url, cancel=None):
+    """Download one segment: (bytes, seconds, TSAnalyzer or None)."""
+    analyzer = None
+    size = 0
+    started = time.perf_counter()
+    with _request(session, url) as response:
+        try:
+            for chunk in response.iter_content(READ_BYTES):
+                if cancel is not None and cancel.is_set():
+                    break
+                if not size and chunk[:1] == b'\x47':
+                    analyzer = TSAnalyzer()
+                size += len(chunk)
+                if analyzer is not None:
+                    analyzer.feed(chunk)
+        except requests.exceptions.RequestException:
+            raise HLSError("Timeout")
+    if analyzer is not None:
+        analyzer.finish()
+    return size, time.perf_counter() - started, analyzer
+
+
+def variant_row(variant):
+    """The row of an untested variant: its advertised figures only."""
+    return {'bandwidth_kbps': round(variant.bandwidth / 1000) if variant.bandwidth else None,
+            'resolution': f"{variant.width}x{variant.height}" if variant.width else None,
+            'fps': variant.fps, 'codecs': variant.codecs, 'tested': False, 'segment_kbps': None,
+            'throughput_kbps': None, 'bytes': 0, 'status': None}
+
+
+def test_variant(session, cache, variant, cancel=None):
+    """One variant row: advertised figures plus the segment measurement."""
+    row = variant_row(variant)
+    row['tested'] = True
+    try:
+        final_url, text = cache.get(variant.url, lambda url: fetch_playlist(session, url))
+        segment = pick_segment(*parse_media(text, final_url))
+        if segment is None:
+            raise HLSError("Dead", "empty media playlist")
+        size, seconds, analyzer = measure_segment(session, segment[0], cancel)
+    except HLSError as e:
+        row['status'] = e.status
+        return row, None
+    row['bytes'] = size
+    if not size:
+        row['status'] = "Dead"
+        return row, None
+    if segment[1]:
+        row['segment_kbps'] = round(size * 8 / 1000 / segment[1], 1)
+    if seconds > 0:
+        row['throughput_kbps'] = round(size * 8 / 1000 / seconds, 1)
+    row['status'] = "OK"
+    return row, analyzer
+
+
+def _variant_info(variant, row, analyzer):
+    """A probe info dict for a tested variant: the segment's own headers
+    where the analyzer read them, else the playlist's advertised values."""
+    info = analyzer.info() if analyzer is not None else empty_info()
+    video, audio = codec_names(variant.codecs)
+    if info['codec'] is None:
+        info['codec'] = video
+    if not info['width'] and variant.width:
+        info['width'], info['height'] = variant.width, variant.height
+    if not info['fps']:
+        info['fps'] = variant.fps
+    if not info['audio_tracks'] and audio:
+        info['audio_tracks'] = [{'codec': audio, 'channels': None, 'language': None}]
+    bitrate = row['segment_kbps'] or (variant.bandwidth / 1000 if variant.bandwidth else None)
+    if bitrate:
+        # a segment is too short for the sampler's range; its own size is exact
+        info['bitrate_kbps'] = bitrate
+        info['bitrate_min_kbps'] = min(info['bitrate_min_kbps'] or bitrate, bitrate)
+        info['bitrate_max_kbps'] = max(info['bitrate_max_kbps'] or bitrate, bitrate)
+    info['throughput_kbps'] = row['throughput_kbps']
+    return info
+
+
+def probe_hls(session, cache, url, text, final_url, variants='top', cancel=None):
+    """Test an HLS channel whose playlist `text` was read from `final_url`.
+
+    variants='top' tests variants from the highest bandwidth down until one
+    plays; 'all' tests every variant.  Returns (status, info, rows): the
+    status and probe info of the best playable variant (the first failure's
+    status if none plays) and one row per listed variant, tested or not
+    (see variant_row).  info is None when
+    the stage cannot settle the channel (no variants, or a playable variant
+    whose codec or resolution is unknown), leaving it to ffprobe.  A
+    throttled request ends the stage at once, so the governor backs off.
+    """
+    cache.put(url, final_url, text)
+    listed = parse_master(text, final_url)
+    if listed is None:
+        listed = [Variant(url)]
+    rows = [variant_row(variant) for variant in listed]
+    best = None
+    decided = False
+    status = None
+    for index, variant in enumerate(listed):
+        if cancel is not None and cancel.is_set():
+            break
+        row, analyzer = test_variant(session, cache, variant, cancel)
+        rows[index] = row
+        if row['status'] == THROTTLED:
+            return THROTTLED, empty_info(), rows
+        if row['status'] != "OK":
+            status = status or row['status']
+        elif best is None:
+            best = _variant_info(variant, row, analyzer)
+            decided = (analyzer is not None and analyzer.decided) or bool(best['codec'] and best['width'])
+            if variants == 'top':
+                break
+    if not any(row['tested'] for row in rows):
+        return None, None, rows
+    if best is None:
+        return status, empty_info(), rows
+    best['bytes_read'] = sum(row['bytes'] for row in rows)
+    return "OK", best if decided else None, rows
@@ -0,0 +1,112 @@
+"""Crash-safe result journal.
+
+Every finished result is appended to a JSON Lines file and flushed
+immediately, with an fsync every few records or seconds, so a crash, a
+sleeping laptop or Stop Testing hours into a sweep loses at most the results
+still in flight.  A later run can resume from the journal, skipping every
+channel already in it, and the exporters read straight from the file.
+"""
+import json
+import os
+import threading
+import time
+
+from .cache import cache_dir
+
+FSYNC_EVERY = 50
+FSYNC_INTERVAL = 2.0
+
+
+def default_journal_path(name='last-run.jsonl'):
+    return os.path.join(cache_dir(), name)
+
+
+def entry_key(channel, group, url):
+    """Identifies one playlist entry (the same URL may sit in several groups)."""
+    return (group, channel, url)
+
+
+def result_key(result):
+    return entry_key(result['channel'], result['group'], result['url'])
+
+
+def channel_key(channel):
+    return entry_key(channel.name, channel.group, channel.url)
+
+
+class ResultJournal:
+    """Append-only JSON Lines writer, safe to call from worker threads."""
+
+    def __init__(self, path, resume=False, fsync_every=FSYNC_EVERY, fsync_interval=FSYNC_INTERVAL):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.count = 0
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        if resume and os.path.exists(path):
+            self._terminate_partial_line()
+            self._file = open(path, 'a', encoding='utf-8')
+        else:
+            self._file = open(path, 'w', encoding='utf-8')
+
+    def _terminate_partial_line(self):
+        """A crash mid-write can leave a partial last line; never append onto it."""
+        with open(self.path, 'rb+') as f:
+            if f.seek(0, os.SEEK_END) == 0:
+                return
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+
+    def append(self, result):
+        line = json.dumps(result, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self.count += 1
+            self._unsynced += 1
+            if (self._unsynced >= self.fsync_every
+                    or time.monotonic() - self._synced_at >= self.fsync_interval):
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.flush()
+            self._sync()
+            self._file.close()
+
+
+class JournalReader:
+    """Re-iterable view of a journal: every iteration streams the file again.
+
+    Malformed lines (such as one cut short by a crash) are skipped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(result, dict) and 'status' in result:
+                    yield result
+
+    def done_keys(self):
+        return {result_key(r) for r in self}
@@ -0,0 +1,147 @@
+"""Per-phase probe timings and an optional Prometheus text endpoint.
+
+Every freshly probed result row carries how long each phase took (DNS, TCP
+connect, redirects, first byte, pre-flight, ffprobe, whole test) and how
+many bytes were read; cached rows leave them empty.  Metrics aggregates those
+rows into counters and histograms, and serve_metrics() exposes them together
+with live pool gauges (queue depth, busy workers, child processes, account
+connections) in the Prometheus text format.
+"""
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Result row fields filled in by a fresh probe; None when a phase did not run.
+TIMING_FIELDS = ('dns_ms', 'connect_ms', 'redirects', 'first_byte_ms', 'preflight_ms',
+                 'probe_ms', 'elapsed_ms', 'bytes_read', 'attempts')
+
+# Histogrammed phases, in seconds as Prometheus expects.
+PHASES = ('dns_ms', 'connect_ms', 'first_byte_ms', 'preflight_ms', 'first_packet_ms', 'probe_ms', 'elapsed_ms')
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 25, 60)
+
+
+def empty_timings():
+    return dict.fromkeys(TIMING_FIELDS)
+
+
+class Histogram:
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+class Metrics:
+    """Thread-safe aggregate of result rows; `gauges` is called at scrape time
+    and returns (name, help, [(labels dict, value), ...]) tuples."""
+
+    def __init__(self, gauges=None):
+        self.gauges = gauges
+        self._lock = threading.Lock()
+        self._results = {}
+        self._bytes = 0
+        self._retries = 0
+        self._phases = {phase: Histogram() for phase in PHASES}
+
+    def observe(self, result):
+        key = (result['status'].split(':', 1)[0], bool(result.get('cached')))
+        with self._lock:
+            self._results[key] = self._results.get(key, 0) + 1
+            if result.get('cached'):
+                return
+            self._bytes += result.get('bytes_read') or 0
+            self._retries += max(0, (result.get('attempts') or 1) - 1)
+            for phase, histogram in self._phases.items():
+                value = result.get(phase)
+                if value is not None:
+                    histogram.observe(value / 1000)
+
+    def render(self):
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            metric('iptvchecker_results_total', 'counter', "Channel results by status and cache use.")
+            for (status, cached), count in sorted(self._results.items()):
+                lines.append(f"iptvchecker_results_total{_labels(status=status, cached=str(cached).lower())} {count}")
+            metric('iptvchecker_probe_bytes_total', 'counter', "Bytes read while probing streams.")
+            lines.append(f"iptvchecker_probe_bytes_total {self._bytes}")
+            metric('iptvchecker_retries_total', 'counter', "Probes retried after provider pushback.")
+            lines.append(f"iptvchecker_retries_total {self._retries}")
+            for phase, h in self._phases.items():
+                name = f"iptvchecker_{phase[:-3]}_seconds"
+                metric(name, 'histogram', f"Time spent in the {phase[:-3].replace('_', ' ')} phase.")
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), h.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(le=bound)} {cumulative}")
+                lines.append(f"{name}_sum {h.total:.6f}")
+                lines.append(f"{name}_count {h.count}")
+        for name, help_text, samples in (self.gauges() if self.gauges else ()):
+            metric(name, 'gauge', help_text)
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(**labels) if labels else ''} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+def tester_gauges(tester):
+    """Gauge callback for a StreamTester: pool state and account usage."""
+    from .engine import running_processes
+
+    def gauges():
+        pool = tester.engine.stats() if tester.engine is not None else {}
+        accounts = [s for s in tester.governor.stats() if s['cap'] or s['throttles']]
+        return [
+            ('iptvchecker_queue_depth', "Channels waiting for a worker, parked ones included.",
+             [({}, pool.get('queued', 0) + pool.get('parked', 0))]),
+            ('iptvchecker_workers_busy', "Workers currently testing a channel.", [({}, pool.get('busy', 0))]),
+            ('iptvchecker_workers', "Size of the worker pool.", [({}, pool.get('workers', 0))]),
+            ('iptvchecker_subprocesses', "Running ffmpeg/ffprobe child processes.", [({}, running_processes())]),
+            ('iptvchecker_account_connections', "Connections in use per provider account.",
+             [({'account': s['account']}, s['in_use']) for s in accounts]),
+            ('iptvchecker_account_connection_cap', "Connection cap reported by the provider account.",
+             [({'account': s['account']}, s['cap']) for s in accounts if s['cap']]),
+        ]
+
+    return gauges
+
+
+def serve_metrics(metrics, port, host='127.0.0.1'):
+    """Serve GET /metrics from a daemon thread; returns the server."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,241 @@
+"""Continuous monitoring: recheck channels by staleness and flakiness.
+
+Instead of repeated full sweeps, every channel keeps a small history (last
+status, last check, failure streak, uptime, status flips) and a next-due
+time.  A priority queue hands the most overdue channel to the worker pool,
+throttled by a global probes-per-minute budget:
+
+* channels that just failed are rechecked within minutes, backing off as
+  the failure streak grows so long-dead links stop eating the budget;
+* flaky channels (frequent up/down flips, poor uptime) come round often;
+* channels that have been stable for a long time are checked rarely.
+
+History is persisted in SQLite, so a restarted monitor picks up where the
+previous one left off.
+"""
+import heapq
+import itertools
+import os
+import sqlite3
+import threading
+import time
+
+from .cache import _TRANSIENT, cache_dir, normalize_url
+
+MIN_INTERVAL = 2 * 60
+MAX_INTERVAL = 6 * 3600
+DEAD_INTERVAL = 3600
+
+
+class ChannelHistory:
+    __slots__ = ('channel', 'status', 'checked_at', 'streak', 'checks', 'ok_checks', 'flips')
+
+    def __init__(self, channel, status=None, checked_at=None, streak=0, checks=0, ok_checks=0, flips=0):
+        self.channel = channel
+        self.status = status
+        self.checked_at = checked_at
+        self.streak = streak
+        self.checks = checks
+        self.ok_checks = ok_checks
+        self.flips = flips
+
+    @property
+    def up(self):
+        return self.status == 'OK'
+
+    @property
+    def uptime(self):
+        return self.ok_checks / self.checks if self.checks else 0.0
+
+    @property
+    def flakiness(self):
+        """Share of checks that changed up/down state."""
+        return self.flips / (self.checks - 1) if self.checks > 1 else 0.0
+
+    def record(self, status, now):
+        """Add a check; returns True if the channel went up or down.
+
+        Throttled and Error results say nothing about the stream and leave
+        the history untouched.
+        """
+        if status.startswith(_TRANSIENT):
+            return False
+        was_up = self.up if self.status is not None else None
+        self.status = status
+        self.checked_at = now
+        self.checks += 1
+        if self.up:
+            self.ok_checks += 1
+            self.streak = 0
+        else:
+            self.streak += 1
+        changed = was_up is not None and was_up != self.up
+        if changed:
+            self.flips += 1
+        return changed
+
+
+class MonitorPolicy:
+    """Maps a channel's history to the delay before its next check."""
+
+    def __init__(self, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, dead_interval=DEAD_INTERVAL):
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.dead_interval = max(dead_interval, min_interval)
+
+    def interval(self, history):
+        if history.checks == 0:
+            return 0
+        if not history.up:
+            return min(self.min_interval * 2 ** (history.streak - 1), self.dead_interval)
+        stability = history.uptime * (1 - history.flakiness)
+        # A handful of good checks is not yet evidence of stability.
+        stability *= min(1.0, history.checks / 10)
+        return self.min_interval + (self.max_interval - self.min_interval) * stability ** 2
+
+
+class TokenBucket:
+    """Allows `rate` events per minute with bursts of up to `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate / 60.0
+        self.capacity = float(burst or max(1, rate // 10))
+        self.tokens = self.capacity
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, stop):
+        """Block until a token is available; False if `stop` is set first."""
+        while not stop.is_set():
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            stop.wait(min(wait, 1.0))
+        return False
+
+
+class HistoryStore:
+    """SQLite persistence for ChannelHistory, keyed by normalized URL."""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(cache_dir(), 'monitor.sqlite3')
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS history ("
+                " url TEXT PRIMARY KEY, status TEXT, checked_at REAL,"
+                " streak INTEGER, checks INTEGER, ok_checks INTEGER, flips INTEGER)"
+            )
+
+    def load(self, key):
+        with self._lock:
+            return self._db.execute("SELECT status, checked_at, streak, checks, ok_checks, flips "
+                                    "FROM history WHERE url = ?", (key,)).fetchone()
+
+    def save(self, key, h):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO history VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (key, h.status, h.checked_at, h.streak, h.checks, h.ok_checks, h.flips))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class Monitor:
+    """Keeps probing `channels` through `tester` until stop() is called.
+
+    on_result(result, history) is called for every check and
+    on_change(result, history) when a channel goes up or down.
+    """
+
+    def __init__(self, channels, tester, store=None, policy=None, probes_per_minute=60,
+                 on_result=None, on_change=None):
+        self.tester = tester
+        self.store = store
+        self.policy = policy or MonitorPolicy()
+        self.bucket = TokenBucket(probes_per_minute)
+        self.on_result = on_result
+        self.on_change = on_change
+        self.history = {}
+        self.in_flight = 0
+        self._heap = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        now = time.time()
+        for channel in channels:
+            key = normalize_url(channel.url)
+            if key in self.history:
+                continue
+            row = store.load(key) if store is not None else None
+            h = self.history[key] = ChannelHistory(channel, *row) if row else ChannelHistory(channel)
+            due = h.checked_at + self.policy.interval(h) if h.checked_at else now
+            heapq.heappush(self._heap, (due, next(self._seq), key))
+
+    def run(self):
+        """Blocks until stop()."""
+        return self.tester.run(self._feed(), on_result=self._record, dedupe=False)
+
+    def stop(self):
+        self._stop.set()
+        self.tester.stop()
+
+    def _feed(self):
+        while not self._stop.is_set():
+            with self._lock:
+                now = time.time()
+                if self._heap and self._heap[0][0] <= now:
+                    _, _, key = heapq.heappop(self._heap)
+                    h = self.history[key]
+                    self.in_flight += 1
+                else:
+                    h = None
+                    wait = self._heap[0][0] - now if self._heap else 1.0
+            if h is None:
+                self._stop.wait(min(wait, 1.0))
+                continue
+            if not self.bucket.take(self._stop):
+                return
+            yield h.channel
+
+    def _record(self, result):
+        key = normalize_url(result['url'])
+        now = time.time()
+        with self._lock:
+            h = self.history[key]
+            changed = h.record(result['status'], now)
+            # After a transient result the old history stands; never re-probe at once.
+            interval = max(self.policy.interval(h), self.policy.min_interval)
+            heapq.heappush(self._heap, (now + interval, next(self._seq), key))
+            self.in_flight -= 1
+        if self.store is not None:
+            self.store.save(key, h)
+        if self.on_result is not None:
+            self.on_result(result, h)
+        if changed and self.on_change is not None:
+            self.on_change(result, h)
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            histories = list(self.history.values())
+            due = sum(1 for entry in self._heap if entry[0] <= now)
+            in_flight = self.in_flight
+        checked = [h for h in histories if h.checks]
+        up = sum(1 for h in checked if h.up)
+        return {
+            'channels': len(histories),
+            'checked': len(checked),
+            'up': up,
+            'down': len(checked) - up,
+            'due': due,
+            'in_flight': in_flight,
+        }
@@ -0,0 +1,178 @@
+"""Streaming M3U parser and compact channel storage.
+
+Provider playlists can have hundreds of thousands of entries, so nothing
+here holds the whole file in memory: lines are pulled one at a time from a
+memory-mapped file or a streamed HTTP body, and each channel becomes a small
+__slots__ record with its repeated strings (groups, ids) interned.
+"""
+import mmap
+import re
+import sys
+from array import array
+
+DEFAULT_GROUP = "Uncategorized"
+
+_ATTR = re.compile(r'([A-Za-z0-9_-]+)=(?:"([^"]*)"|\'([^\']*)\')')
+# The layout Xtream panels and most generators write: these attributes, in
+# this order, each optional.  One match() reads a whole line of it.
+_COMMON = re.compile(r'#EXTINF:-?[0-9.]*(?: tvg-id="([^"]*)")?(?: tvg-name="([^"]*)")?(?: tvg-logo="([^"]*)")?'
+                     r'(?: group-title="([^"]*)")?,(.*)')
+_intern = sys.intern
+
+
+class Channel:
+    __slots__ = ('name', 'group', 'url', 'tvg_id', 'tvg_name', 'logo', 'stream_id')
+
+    def __init__(self, name, group, url, tvg_id=None, tvg_name=None, logo=None, stream_id=None):
+        self.name = name
+        self.group = group
+        self.url = url
+        self.tvg_id = tvg_id
+        self.tvg_name = tvg_name
+        self.logo = logo
+        self.stream_id = stream_id
+
+    def __repr__(self):
+        return f"Channel({self.name!r}, {self.group!r}, {self.url!r})"
+
+
+class Playlist:
+    """Channels in load order; groups map a name to indices into `channels`."""
+
+    def __init__(self):
+        self.channels = []
+        self.groups = {}
+        self.accounts = {}  # account key -> (max_connections, active_cons) a panel reported
+
+    def __len__(self):
+        return len(self.channels)
+
+    def add(self, channel):
+        index = len(self.channels)
+        self.channels.append(channel)
+        indices = self.groups.get(channel.group)
+        if indices is None:
+            indices = self.groups[channel.group] = array('L')
+        indices.append(index)
+
+    def extend(self, channels):
+        for channel in channels:
+            self.add(channel)
+        return self
+
+    def group_channels(self, group):
+        channels = self.channels
+        return [channels[i] for i in self.groups.get(group, ())]
+
+
+def _decode(raw):
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return raw.decode('latin-1')
+
+
+def _optional(value):
+    if value:
+        value = value.strip()
+    return _intern(value) if value else None
+
+
+def _split_attrs(line):
+    """Double-quoted attributes outside the _COMMON layout: one str.split()."""
+    parts = line.split('"')
+    attrs = {}
+    i = 0
+    last = len(parts) - 1
+    while i < last:
+        key = parts[i]
+        if key[-1:] != '=':
+            break
+        attrs[key[key.rfind(' ') + 1:-1].lower()] = parts[i + 1]
+        i += 2
+    return attrs, ('"'.join(parts[i:]) if i < last else parts[i])
+
+
+def _regex_attrs(line):
+    attrs = {}
+    end = 0
+    for m in _ATTR.finditer(line):
+        value = m.group(2) if m.group(2) is not None else m.group(3)
+        attrs[m.group(1).lower()] = value
+        end = m.end()
+    return attrs, line[end:]
+
+
+def parse_extinf(line):
+    """Split an #EXTINF line into (name, group, tvg_id, tvg_name, logo)."""
+    match = _COMMON.match(line)
+    if match is not None:
+        tvg_id, tvg_name, logo, group, name = match.groups()
+    else:
+        attrs, rest = _regex_attrs(line) if "='" in line else _split_attrs(line)
+        comma = rest.find(',')
+        name = rest[comma + 1:] if comma != -1 else ''
+        tvg_id, tvg_name, logo, group = (attrs.get('tvg-id'), attrs.get('tvg-name'), attrs.get('tvg-logo'),
+                                         attrs.get('group-title'))
+    name = name.strip()
+    tvg_name = tvg_name.strip() if tvg_name else ''
+    if not name:
+        name = tvg_name or "Unknown"
+    if tvg_name == name:
+        tvg_name = name  # share the string instead of storing a copy
+    group = group.strip() if group else ''
+    return (name, _intern(group or DEFAULT_GROUP), _optional(tvg_id), tvg_name or None, logo or None)
+
+
+def iter_m3u(lines):
+    """Yield a Channel for every #EXTINF entry in an iterable of text lines."""
+    pending = None
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line[0] != '#':
+            if pending is not None:
+                name, group, tvg_id, tvg_name, logo = pending
+                yield Channel(name, group, line, tvg_id, tvg_name, logo)
+                pending = None
+        elif line.startswith('#EXTINF'):
+            pending = parse_extinf(line)
+        elif line.startswith('#EXTGRP:'):
+            if pending is not None and pending[1] == DEFAULT_GROUP:
+                group = line[8:].strip() or DEFAULT_GROUP
+                pending = (pending[0], _intern(group)) + pending[2:]
+
+
+def iter_file_lines(path):
+    """Yield decoded lines of a local file through a read-only memory map."""
+    with open(path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return
+        with mm:
+            for raw in iter(mm.readline, b''):
+                yield _decode(raw)
+
+
+def iter_url_lines(url, session=None, timeout=30):
+    """Yield decoded lines of a remote playlist as the body streams in."""
+    import requests
+
+    getter = session.get if session is not None else requests.get
+    with getter(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        for raw in response.iter_lines(chunk_size=65536):
+            yield _decode(raw)
+
+
+def load_m3u(lines, progress=None, every=10000):
+    """Parse `lines` into a Playlist, calling progress(count) periodically."""
+    playlist = Playlist()
+    add = playlist.add
+    for count, channel in enumerate(iter_m3u(lines), 1):
+        add(channel)
+        if progress is not None and count % every == 0:
+            progress(count)
+    return playlist
@@ -0,0 +1,244 @@
+"""Cheap HTTP liveness check run before the expensive ffprobe stage.
+
+Most failing channels are plain dead links.  Opening the URL over a pooled
+connection with short timeouts and looking at the status code and the first
+few KB settles those in well under a second, without spawning a process.
+Along the way it records how long DNS, the TCP connect and the first byte
+took, so slow sweeps can be traced to the phase that is slow.  For MPEG-TS
+responses an `analyze` callback can keep reading the same connection, so the
+in-process analyzer (tsinfo) needs no second request; HLS playlists can be
+read whole for the HLS stage (hls) the same way.
+"""
+import socket
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .probe import THROTTLED, USER_AGENT
+
+CONNECT_TIMEOUT = 3.05
+FIRST_BYTE_TIMEOUT = 5
+SNIFF_BYTES = 4096
+READ_BYTES = 65536
+MAX_PLAYLIST_BYTES = 1024 * 1024
+MAX_REDIRECTS = 5
+TS_PACKET = 188
+TS_SYNC = 0x47
+
+AUTH_CODES = {401, 403, 407}
+THROTTLE_CODES = {429, 509}
+
+
+_phase = threading.local()  # the detail dict of the pre-flight running on this thread
+
+
+def _ms(since):
+    return round((time.perf_counter() - since) * 1000, 1)
+
+
+class _TimedConnectionMixin:
+    """Splits opening a connection into DNS and TCP connect time.
+
+    The host is resolved here and, when it has a single address, urllib3 is
+    pointed straight at it (TLS still verifies against the hostname).  With
+    several addresses urllib3 resolves again and tries each in turn, so the
+    connect time then includes that (normally cached) second lookup.  Times
+    add up across the connections a redirect chain opens.
+    """
+
+    def _new_conn(self):
+        detail = getattr(_phase, 'detail', None)
+        host = self._dns_host
+        started = time.perf_counter()
+        try:
+            addresses = {info[4][0] for info in socket.getaddrinfo(host, self.port, 0, socket.SOCK_STREAM)}
+        except OSError:
+            addresses = set()
+        if detail is not None:
+            detail['dns_ms'] = (detail['dns_ms'] or 0) + _ms(started)
+        started = time.perf_counter()
+        if len(addresses) == 1:
+            self._dns_host = addresses.pop()
+        try:
+            return super()._new_conn()
+        finally:
+            self._dns_host = host
+            if detail is not None:
+                detail['connect_ms'] = (detail['connect_ms'] or 0) + _ms(started)
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _TimedHTTPPool, 'https': _TimedHTTPSPool}
+
+
+def make_session(pool_size=10):
+    """A requests session whose connection pool matches the worker count."""
+    session = requests.Session()
+    adapter = TimedAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = USER_AGENT
+    session.max_redirects = MAX_REDIRECTS
+    return session
+
+
+def http_status(code):
+    """The result status an HTTP status code settles, or None for a 2xx."""
+    if code in AUTH_CODES:
+        return "Auth"
+    if code in THROTTLE_CODES:
+        return THROTTLED
+    if 300 <= code < 400:
+        return "Redirect"
+    if code >= 400:
+        return "Dead"
+    return None
+
+
+def read_playlist(chunks, limit=MAX_PLAYLIST_BYTES):
+    """Text of a playlist body, or None once it runs past `limit` bytes."""
+    data = b''
+    for chunk in chunks:
+        data += chunk
+        if len(data) > limit:
+            return None
+    return data.decode('utf-8', 'replace')
+
+
+def looks_like_ts(data):
+    """True if `data` holds MPEG-TS packets (0x47 sync every 188 bytes)."""
+    for offset in range(min(TS_PACKET, len(data))):
+        if data[offset] != TS_SYNC:
+            continue
+        following = range(offset + TS_PACKET, min(len(data), offset + 4 * TS_PACKET), TS_PACKET)
+        if all(data[i] == TS_SYNC for i in following):
+            return True
+    return False
+
+
+def sniff(data, content_type):
+    """Classify the first bytes of a response: 'ts', 'hls', 'html' or None."""
+    head = data.lstrip(b'\xef\xbb\xbf \t\r\n')
+    if head.startswith(b'#EXTM3U'):
+        return 'hls'
+    if looks_like_ts(data):
+        return 'ts'
+    if 'html' in content_type or head[:1] == b'<' or head[:1] == b'{':
+        return 'html'
+    return None
+
+
+def preflight(url, session, connect_timeout=CONNECT_TIMEOUT, first_byte_timeout=FIRST_BYTE_TIMEOUT, analyze=None,
+              playlist=False):
+    """Open `url` and decide whether it is worth probing.
+
+    Returns (status, detail).  status is None when the stream looks alive and
+    should go on to ffprobe, otherwise a result status: "Dead", "Auth",
+    "Redirect", "Timeout" or THROTTLED (429/509, worth retrying later).
+    detail is a dict with what was observed, including the phase timings in
+    ms (dns_ms and connect_ms stay None on a reused keep-alive connection).
+    Non-HTTP URLs (rtmp://, udp://, ...) always pass.
+
+    When the response sniffs as MPEG-TS and `analyze` is given, it is called
+    with an iterator over the body (the sniffed bytes first) while the
+    connection is still open, and its return value is kept in
+    detail['analysis'].  preflight_ms stops at the sniff; bytes_read covers
+    what the analysis read too.  With `playlist`, an HLS response is read to
+    the end and detail['playlist'] holds (text, final url after redirects).
+    """
+    detail = {'http_status': None, 'content_type': None, 'kind': None, 'dns_ms': None, 'connect_ms': None,
+              'redirects': 0, 'first_byte_ms': None, 'preflight_ms': None, 'bytes_read': 0, 'analysis': None,
+              'playlist': None}
+    if not url.lower().startswith(('http://', 'https://')):
+        return None, detail
+    started = time.perf_counter()
+    _phase.detail = detail
+    try:
+        return _check(url, session, (connect_timeout, first_byte_timeout), detail, started, analyze,
+                      playlist), detail
+    finally:
+        _phase.detail = None
+        if detail['preflight_ms'] is None:
+            detail['preflight_ms'] = _ms(started)
+
+
+def _body(data, response, detail, ended=False):
+    """The response body for an analysis or a playlist, the sniffed bytes
+    first; `ended` when the sniff already read all of it (the response can
+    only be iterated once).  A stall or drop after the sniff raises from the
+    iterator, so the consumer can tell it from the end of the body."""
+    yield data
+    if ended:
+        return
+    for chunk in response.iter_content(READ_BYTES):
+        detail['bytes_read'] += len(chunk)
+        yield chunk
+
+
+def _check(url, session, timeout, detail, started, analyze=None, playlist=False):
+    try:
+        with session.get(url, stream=True, timeout=timeout) as response:
+            detail['redirects'] = len(response.history)
+            detail['http_status'] = response.status_code
+            content_type = response.headers.get('Content-Type', '').lower()
+            detail['content_type'] = content_type
+            status = http_status(response.status_code)
+            if status:
+                return status
+            data = b''
+            ended = True  # the body was shorter than the sniff
+            for chunk in response.iter_content(SNIFF_BYTES):
+                if not data:
+                    detail['first_byte_ms'] = _ms(started)
+                data += chunk
+                if len(data) >= SNIFF_BYTES:
+                    ended = False
+                    break
+            detail['bytes_read'] = len(data)
+            if not data:
+                return "Dead"
+            detail['kind'] = sniff(data, content_type)
+            if detail['kind'] == 'html':
+                return "Dead"
+            if detail['kind'] == 'ts' and analyze is not None:
+                detail['preflight_ms'] = _ms(started)
+                detail['analysis'] = analyze(_body(data, response, detail, ended))
+            elif detail['kind'] == 'hls' and playlist:
+                text = read_playlist(_body(data, response, detail, ended))
+                if text is not None:
+                    detail['playlist'] = (text, response.url)
+    except requests.exceptions.TooManyRedirects:
+        detail['redirects'] = MAX_REDIRECTS
+        return "Redirect"
+    except requests.exceptions.Timeout:
+        return "Timeout"
+    except requests.exceptions.ConnectionError as e:
+        # urllib3 surfaces a read timeout mid-body as a ConnectionError
+        if 'timed out' in str(e).lower():
+            return "Timeout"
+        return "Dead"
+    except requests.exceptions.RequestException:
+        return "Dead"
+    return None
@@ -0,0 +1,310 @@
+"""ffmpeg/ffprobe based stream probing.
+
+probe_stream() is the default: a single ffprobe process, and therefore a
+single connection to the provider, that reports stream metadata and packet
+sizes together.  legacy_probe() keeps the original two-call path (an ffmpeg
+bitrate read followed by a separate ffprobe) as a fallback.  Both read only
+until the bitrate estimate settles (see bitrate.BitrateSampler).
+"""
+import json
+import os
+import re
+import sys
+import time
+
+from .bitrate import MAX_SECONDS, TOLERANCE, BitrateSampler, empty_stats
+from .engine import Cancelled, StreamingCommand, run_command
+
+USER_AGENT = 'VLC/3.0.14'
+CONNECT_GRACE = 15
+THROTTLED = "Throttled"
+# Delivered data, then stalled past the read timeout or dropped mid-sample.
+STALLED = "Stalled"
+
+# ffmpeg logs "HTTP error 429 Too Many Requests" at warning level and
+# "Server returned 403 Forbidden" at error level.
+_THROTTLE_RE = re.compile(r'HTTP error (?:429|509)|Too Many Requests|Bandwidth Limit Exceeded'
+                          r'|max(?:imum)? connections', re.IGNORECASE)
+_FORBIDDEN_RE = re.compile(r'Server returned 403')
+# The stream dump ffmpeg logs at info level when it opens an input, e.g.
+# "Stream #0:1[0x101](eng): Audio: aac (LC) ([15][0][0][0] / 0x000F), 48000 Hz, stereo, fltp"
+_BANNER_RE = re.compile(r'Stream #(\d+:\d+)(?:\[\w+\])?(?:\((\w+)\))?: (Video|Audio): ([\w-]+)(.*)')
+_SIZE_RE = re.compile(r', (\d{2,5})x(\d{2,5})')
+_RATE_RE = re.compile(r'([\d.]+)(?:k)? (tbr|fps)')
+_LAYOUT_RE = re.compile(r'Hz, ([^,]+)')
+_LAYOUTS = {'mono': 1, 'stereo': 2, '2.1': 3, '3.0': 3, 'quad': 4, '4.0': 4, '4.1': 5, '5.0': 5, '5.1': 6,
+            '6.0': 6, '6.1': 7, '7.0': 7, '7.1': 8}
+
+
+def resource_path(relative_path):
+    """ Get absolute path to resource, works for dev and PyInstaller """
+    try:
+        base_path = sys._MEIPASS  # PyInstaller temp folder
+    except Exception:
+        base_path = os.path.abspath(".")
+
+    return os.path.join(base_path, relative_path)
+
+
+def tool_path(name):
+    """Prefer an ffmpeg/<name>.exe bundled next to the app, else use PATH."""
+    bundled = resource_path(os.path.join("ffmpeg", f"{name}.exe"))
+    return bundled if os.path.isfile(bundled) else name
+
+
+ffmpeg_path = tool_path("ffmpeg")
+ffprobe_path = tool_path("ffprobe")
+
+
+def empty_info():
+    return {
+        'width': None,
+        'height': None,
+        'codec': None,
+        'fps': None,
+        **empty_stats(),
+        'audio_tracks': [],
+        'first_packet_ms': None,
+        'bytes_read': 0,
+    }
+
+
+def parse_rate(rate):
+    """'30000/1001' -> 29.97; None for missing or degenerate rates."""
+    try:
+        if rate and '/' in rate:
+            num, den = [float(x) for x in rate.split('/')]
+            return num / den if num and den else None
+        return float(rate) if rate else None
+    except ValueError:
+        return None
+
+
+def format_info(result, info):
+    """Copy a probe info dict into the display fields of a result row."""
+    if info['width'] and info['height']:
+        result['resolution'] = f"{info['width']}x{info['height']}"
+    if info['fps']:
+        result['fps'] = f"{info['fps']:.2f}"
+    if info['bitrate_kbps']:
+        result['bitrate'] = f"{round(info['bitrate_kbps'])} Kbps"
+        for field in ('bitrate_kbps', 'bitrate_min_kbps', 'bitrate_max_kbps'):
+            result[field] = round(info[field], 1)
+    result['stalls'] = info['stalls']
+    result['underruns'] = info['underruns']
+    if info['codec']:
+        result['codec'] = info['codec']
+    tracks = []
+    for track in info['audio_tracks']:
+        desc = track.get('codec') or '?'
+        if track.get('channels'):
+            desc += f" {track['channels']}ch"
+        if track.get('language'):
+            desc += f" {track['language']}"
+        tracks.append(desc)
+    if tracks:
+        result['audio'] = '; '.join(tracks)
+    if info['first_packet_ms'] is not None:
+        result['first_packet_ms'] = info['first_packet_ms']
+    return result
+
+
+def refusal_status(stderr):
+    """THROTTLED or "Auth" if ffmpeg's log shows the server refusing us, else None."""
+    if _THROTTLE_RE.search(stderr):
+        return THROTTLED
+    if _FORBIDDEN_RE.search(stderr):
+        return "Auth"
+    return None
+
+
+def _compact_fields(line):
+    section, _, rest = line.partition('|')
+    fields = {}
+    for item in rest.split('|'):
+        key, sep, value = item.partition('=')
+        if sep:
+            fields[key] = value
+    return section, fields
+
+
+def probe_stream(url, tolerance=TOLERANCE, max_seconds=MAX_SECONDS, cancel=None):
+    """Probe `url` with one ffprobe process and one connection.
+
+    ffprobe prints one compact line per packet while it reads the stream,
+    then one line per stream.  Packet sizes and timestamps feed a
+    BitrateSampler, and ffprobe is stopped as soon as the estimate is stable
+    within `tolerance` (at most `max_seconds` of stream are read).  The stream
+    metadata then comes from the input dump ffprobe logged on opening the
+    stream, since it never got to print its stream lines.  The wall clock at
+    the first packet line gives time-to-first-packet (an upper bound, since
+    ffprobe's stdout is block buffered).
+
+    Returns (status, info) where status is "OK", "Dead" or "Timeout", STALLED
+    when packets stopped coming before the estimate settled, or THROTTLED /
+    "Auth" when the server refused the connection.
+    """
+    command = [
+        ffprobe_path, '-hide_banner', '-v', 'info', '-user_agent', USER_AGENT,
+        '-read_intervals', f'%+{max_seconds}',
+        '-show_entries',
+        'packet=codec_type,pts_time,size'
+        ':stream=index,codec_type,codec_name,width,height,r_frame_rate,avg_frame_rate,channels'
+        ':stream_tags=language',
+        '-of', 'compact', url,
+    ]
+    info = empty_info()
+    sampler = BitrateSampler(tolerance, max_seconds=max_seconds)
+    packets = 0
+    stopped = False
+    with StreamingCommand(command, timeout=max_seconds + CONNECT_GRACE, cancel=cancel) as cmd:
+        for line in cmd:
+            section, fields = _compact_fields(line)
+            if section == 'packet':
+                now = time.monotonic()
+                if not packets:
+                    info['first_packet_ms'] = round((now - cmd.started) * 1000)
+                packets += 1
+                size = fields.get('size', '')
+                size = int(size) if size.isdigit() else 0
+                info['bytes_read'] += size
+                try:
+                    pts = float(fields.get('pts_time', ''))
+                except ValueError:
+                    pts = None
+                sampler.add(size, pts, now)
+                if sampler.done:
+                    stopped = True
+                    cmd.kill()
+                    break
+            elif section == 'stream':
+                _add_stream(info, fields)
+        ended = time.monotonic()
+        if cmd.cancelled:
+            raise Cancelled()
+        timed_out = cmd.timed_out
+        returncode = cmd.proc.wait()
+
+    if not packets:
+        return refusal_status(cmd.stderr) or ("Timeout" if timed_out else "Dead"), info
+    if info['codec'] is None and not info['audio_tracks']:
+        _add_banner_streams(info, cmd.stderr)
+    if not stopped and (timed_out or returncode != 0):
+        # killed waiting on the stream, or ffprobe lost it, before the estimate settled
+        sampler.interrupt(ended)
+    info.update(sampler.stats())
+    if returncode != 0 and not (timed_out or stopped) and info['codec'] is None:
+        return "Dead", info
+    return (STALLED if sampler.interrupted else "OK"), info
+
+
+def _add_stream(info, fields):
+    kind = fields.get('codec_type')
+    if kind == 'video' and info['codec'] is None:
+        info['codec'] = fields.get('codec_name') or None
+        width, height = fields.get('width', ''), fields.get('height', '')
+        if width.isdigit() and height.isdigit() and int(width):
+            info['width'], info['height'] = int(width), int(height)
+        info['fps'] = parse_rate(fields.get('r_frame_rate')) or parse_rate(fields.get('avg_frame_rate'))
+    elif kind == 'audio':
+        channels = fields.get('channels', '')
+        info['audio_tracks'].append({
+            'codec': fields.get('codec_name') or None,
+            'channels': int(channels) if channels.isdigit() else None,
+            'language': fields.get('tag:language') or None,
+        })
+
+
+def _add_banner_streams(info, stderr):
+    """Fill in stream metadata from ffmpeg's input dump in `stderr`."""
+    seen = set()
+    for match in _BANNER_RE.finditer(stderr):
+        index, language, kind, codec, rest = match.groups()
+        if index in seen:
+            continue
+        seen.add(index)
+        if kind == 'Video' and info['codec'] is None:
+            info['codec'] = codec
+            size = _SIZE_RE.search(rest)
+            if size and int(size.group(1)):
+                info['width'], info['height'] = int(size.group(1)), int(size.group(2))
+            rates = {unit: value for value, unit in _RATE_RE.findall(rest)}
+            info['fps'] = parse_rate(rates.get('tbr')) or parse_rate(rates.get('fps'))
+        elif kind == 'Audio':
+            layout = _LAYOUT_RE.search(rest)
+            channels = None
+            if layout:
+                name = layout.group(1).split('(', 1)[0].strip()
+                count = name.split()[0]
+                channels = _LAYOUTS.get(name) or (int(count) if count.isdigit() else None)
+            info['audio_tracks'].append({'codec': codec, 'channels': channels, 'language': language})
+
+
+def get_video_bitrate(url, tolerance=TOLERANCE, max_seconds=MAX_SECONDS, cancel=None):
+    """Adaptive ffmpeg bitrate read; returns a bitrate.empty_stats() dict.
+
+    The stream is remuxed to the null device while ffmpeg reports its output
+    size and stream time through -progress; ffmpeg is stopped once the
+    BitrateSampler has a stable estimate.
+    """
+    command = [
+        ffmpeg_path, '-v', 'error', '-nostats', '-user_agent', USER_AGENT, '-i', url,
+        '-map', '0', '-c', 'copy', '-t', str(max_seconds), '-progress', 'pipe:1', '-f', 'mpegts', '-y', os.devnull,
+    ]
+    sampler = BitrateSampler(tolerance, max_seconds=max_seconds)
+    try:
+        with StreamingCommand(command, timeout=max_seconds + CONNECT_GRACE, cancel=cancel) as cmd:
+            counted = total = 0
+            position = None
+            for line in cmd:
+                key, _, value = line.partition('=')
+                if key == 'total_size' and value.isdigit():
+                    total = int(value)
+                elif key == 'out_time_us' and value.isdigit():
+                    position = int(value) / 1e6
+                elif key == 'progress':
+                    if total > counted and position is not None:
+                        sampler.add(total - counted, position)
+                        counted = total
+                    if sampler.done:
+                        cmd.kill()
+                        break
+            if cmd.cancelled:
+                raise Cancelled()
+            if not sampler.done and (cmd.timed_out or cmd.proc.wait()):
+                sampler.interrupt()
+    except Cancelled:
+        raise
+    except Exception:
+        return empty_stats()
+    return sampler.stats()
+
+
+def legacy_probe(url, tolerance=TOLERANCE, cancel=None):
+    """The original two-call path: ffmpeg for bitrate, then ffprobe for metadata.
+
+    Opens the stream twice, so it costs double the connection slots; kept as a
+    fallback for providers or ffprobe builds the single-pass probe trips over.
+    Returns (status, info) like probe_stream(); raises TimeoutExpired.
+    """
+    info = empty_info()
+    info.update(get_video_bitrate(url, tolerance, cancel=cancel))
+
+    user_agent = "Mozilla/5.0"
+    referer = "http://example.com"
+    headers = f"User-Agent: {user_agent}\r\nReferer: {referer}\r\n"
+    command = [
+        ffprobe_path, '-headers', headers, '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height,codec_name,r_frame_rate', '-of', 'json', url,
+    ]
+    probe = run_command(command, timeout=60, cancel=cancel)
+    if probe.returncode != 0:
+        return refusal_status(probe.stderr.decode('utf-8', 'replace')) or "Dead", info
+    meta = json.loads(probe.stdout)
+    if meta.get('streams'):
+        v = meta['streams'][0]
+        if v.get('width') and v.get('height'):
+            info['width'], info['height'] = v['width'], v['height']
+        info['fps'] = parse_rate(v.get('r_frame_rate'))
+        info['codec'] = v.get('codec_name')
+    return "OK", info
@@ -0,0 +1,222 @@
+"""Columnar result store and vectorized quality statistics.
+
+Result rows are dicts of display strings ("1920x1080", "25.00",
+"4500 Kbps"), which suit a table row but make reports re-parse text for
+every statistic.  ResultTable reads the rows once into NumPy columns
+(numeric width/height/fps/bitrate, integer codes for status class, codec
+and group) and answers the report questions with array operations: status
+and codec counts, per-group success rates and bitrate percentiles,
+resolution/fps/quality histograms and the worst groups.  Past the single
+pass that reads the rows, a report over 100k+ rows takes milliseconds.
+"""
+import math
+from array import array
+from datetime import datetime
+
+import numpy as np
+
+from .cache import normalize_url
+from .resultsview import status_class
+
+PERCENTILES = (10, 50, 90)
+TOP_GROUPS = 10
+MIN_GROUP_CHANNELS = 3
+
+
+def _resolution(text):
+    width, _, height = (text or '').partition('x')
+    return (int(width), int(height)) if width.isdigit() and height.isdigit() else (0, 0)
+
+
+def _float(text):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def bitrate_of(row):
+    """Numeric kbps of a row; parses the "4500 Kbps" text of older rows."""
+    value = row.get('bitrate_kbps')
+    if value is not None:
+        return float(value)
+    return _float((row.get('bitrate') or '').split(' ', 1)[0])
+
+
+def fps_label(fps):
+    """25.0 -> '25', 29.97 -> '29.97'."""
+    return str(int(fps)) if fps == int(fps) else f"{fps:.2f}"
+
+
+class Categories:
+    """Interns labels as small integer codes, in first-seen order."""
+
+    def __init__(self):
+        self.codes = {}
+        self.labels = []
+
+    def code(self, label):
+        code = self.codes.get(label)
+        if code is None:
+            code = self.codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+    def __len__(self):
+        return len(self.labels)
+
+
+def _ranked(labels, counts):
+    """[(label, count)] by descending count, zero counts dropped."""
+    order = np.argsort(-counts, kind='stable')
+    return [(labels[i], int(counts[i])) for i in order if counts[i]]
+
+
+def _unique_ranked(keys, label):
+    values, counts = np.unique(keys, return_counts=True)
+    order = np.argsort(-counts, kind='stable')
+    return [(label(values[i]), int(counts[i])) for i in order]
+
+
+def _nan_to_none(value, digits=1):
+    return None if math.isnan(value) else round(float(value), digits)
+
+
+class ResultTable:
+    """Typed columns for a set of result rows.
+
+    width/height are 0 and fps/bitrate NaN where unknown; status, codec and
+    group hold codes into the `statuses`, `codecs` and `groups` Categories.
+    `rows` is read once, so a JournalReader streams from disk.
+    """
+
+    def __init__(self, rows=()):
+        self.statuses, self.codecs, self.groups = Categories(), Categories(), Categories()
+        width, height = array('l'), array('l')
+        fps, bitrate = array('d'), array('d')
+        status, codec, group = array('l'), array('l'), array('l')
+        urls = set()
+        for row in rows:
+            w, h = _resolution(row.get('resolution'))
+            width.append(w)
+            height.append(h)
+            fps.append(_float(row.get('fps')))
+            bitrate.append(bitrate_of(row))
+            status.append(self.statuses.code(status_class(row['status'])))
+            codec.append(self.codecs.code(row.get('codec') or 'N/A'))
+            group.append(self.groups.code(row['group']))
+            urls.add(row['url'])
+        self.width = np.asarray(width, dtype=np.int32)
+        self.height = np.asarray(height, dtype=np.int32)
+        self.fps = np.asarray(fps, dtype=np.float64)
+        self.bitrate = np.asarray(bitrate, dtype=np.float64)
+        self.status = np.asarray(status, dtype=np.int32)
+        self.codec = np.asarray(codec, dtype=np.int32)
+        self.group = np.asarray(group, dtype=np.int32)
+        self.sources = len({normalize_url(url) for url in urls})
+        self.ok = self.status == self.statuses.codes.get('OK', -1)
+
+    def __len__(self):
+        return len(self.status)
+
+    def status_counts(self):
+        return _ranked(self.statuses.labels, np.bincount(self.status, minlength=len(self.statuses)))
+
+    def codec_counts(self):
+        return _ranked(self.codecs.labels, np.bincount(self.codec[self.ok], minlength=len(self.codecs)))
+
+    def resolution_histogram(self):
+        """[('1920x1080', n), ...] over rows with a known resolution."""
+        known = self.height > 0
+        keys = (self.width[known].astype(np.int64) << 16) | self.height[known]
+        return _unique_ranked(keys, lambda key: f"{key >> 16}x{key & 0xFFFF}")
+
+    def fps_histogram(self):
+        """[('25.00', n), ...] over rows with a known frame rate."""
+        known = ~np.isnan(self.fps)
+        return _unique_ranked(np.round(self.fps[known], 2), lambda fps: f"{fps:.2f}")
+
+    def quality_histogram(self):
+        """[('1080p25', n), ...] over OK rows with resolution and frame rate."""
+        known = self.ok & (self.height > 0) & ~np.isnan(self.fps)
+        keys = (self.height[known].astype(np.int64) << 24) | np.round(self.fps[known] * 100).astype(np.int64)
+        return _unique_ranked(keys, lambda key: f"{key >> 24}p{fps_label((key & 0xFFFFFF) / 100)}")
+
+    def bitrate_percentiles(self, percentiles=PERCENTILES):
+        """{percentile: kbps} over OK rows with a measured bitrate."""
+        values = self.bitrate[self.ok & ~np.isnan(self.bitrate)]
+        if not len(values):
+            return dict.fromkeys(percentiles)
+        return dict(zip(percentiles, (round(float(v), 1) for v in np.percentile(values, percentiles))))
+
+    def group_columns(self, percentiles=PERCENTILES):
+        """Per-group arrays, indexed by group code: channels, ok, success_rate,
+        mean_kbps and p<N>_kbps for each percentile (OK rows only)."""
+        n = len(self.groups)
+        channels = np.bincount(self.group, minlength=n)
+        ok = np.bincount(self.group[self.ok], minlength=n)
+        columns = {'channels': channels, 'ok': ok,
+                   'success_rate': np.divide(ok, channels, out=np.zeros(n), where=channels > 0)}
+        measured = self.ok & ~np.isnan(self.bitrate)
+        group, bitrate = self.group[measured], self.bitrate[measured]
+        order = np.lexsort((bitrate, group))
+        group, bitrate = group[order], bitrate[order]
+        counts = np.bincount(group, minlength=n)
+        starts = np.cumsum(counts) - counts
+        present = counts > 0
+        columns['mean_kbps'] = np.divide(np.bincount(group, weights=bitrate, minlength=n), counts,
+                                         out=np.full(n, np.nan), where=present)
+        for q in percentiles:
+            # linear interpolation between the closest ranks, as np.percentile does
+            position = starts + (counts - 1).clip(0) * (q / 100)
+            low = np.floor(position).astype(np.int64)
+            high = np.ceil(position).astype(np.int64)
+            values = np.full(n, np.nan)
+            if len(bitrate):
+                low, high = low.clip(0, len(bitrate) - 1), high.clip(0, len(bitrate) - 1)
+                values = np.where(present, bitrate[low] + (bitrate[high] - bitrate[low]) * (position - low), np.nan)
+            columns[f'p{q}_kbps'] = values
+        return columns
+
+    def group_stats(self, percentiles=PERCENTILES, columns=None):
+        """One dict per group, largest groups first."""
+        columns = columns or self.group_columns(percentiles)
+        order = np.argsort(-columns['channels'], kind='stable')
+        return [self._group_row(i, columns, percentiles) for i in order]
+
+    def worst_groups(self, top=TOP_GROUPS, min_channels=MIN_GROUP_CHANNELS, columns=None):
+        """The `top` groups with the lowest success rate among those with at
+        least `min_channels` channels; ties go to the larger group."""
+        columns = columns or self.group_columns()
+        eligible = np.flatnonzero(columns['channels'] >= min_channels)
+        order = eligible[np.lexsort((-columns['channels'][eligible], columns['success_rate'][eligible]))]
+        return [self._group_row(i, columns, PERCENTILES) for i in order[:top]]
+
+    def _group_row(self, i, columns, percentiles):
+        row = {'group': self.groups.labels[i], 'channels': int(columns['channels'][i]),
+               'ok': int(columns['ok'][i]), 'success_rate': round(float(columns['success_rate'][i]), 4),
+               'mean_kbps': _nan_to_none(columns['mean_kbps'][i])}
+        for q in percentiles:
+            row[f'p{q}_kbps'] = _nan_to_none(columns[f'p{q}_kbps'][i])
+        return row
+
+    def summary(self, top=TOP_GROUPS):
+        """Everything the reports show, as a JSON-ready dict."""
+        columns = self.group_columns()
+        total = len(self)
+        ok = int(self.ok.sum())
+        return {
+            'generated': datetime.now().isoformat(timespec='seconds'),
+            'channels': total,
+            'unique_sources': self.sources,
+            'ok': ok,
+            'success_rate': round(ok / total, 4) if total else None,
+            'statuses': dict(self.status_counts()),
+            'codecs': dict(self.codec_counts()),
+            'bitrate_kbps': {f'p{q}': v for q, v in self.bitrate_percentiles().items()},
+            'resolutions': dict(self.resolution_histogram()),
+            'fps': dict(self.fps_histogram()),
+            'quality': dict(self.quality_histogram()),
+            'worst_groups': self.worst_groups(top, columns=columns),
+            'groups': self.group_stats(columns=columns),
+        }
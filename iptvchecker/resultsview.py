@@ -0,0 +1,141 @@
+"""Filtered, sorted and paged view over result rows.
+
+The Tk results table only ever shows one page of this view, so drawing cost
+does not grow with the number of channels tested.  New rows are merged into
+the view incrementally (a bisect insert when sorted) rather than by
+re-filtering everything.
+"""
+from bisect import insort
+
+COLUMNS = ('Channel', 'Group', 'Resolution', 'FPS', 'Bitrate', 'Codec', 'Status')
+FIELDS = dict(zip(COLUMNS, ('channel', 'group', 'resolution', 'fps', 'bitrate', 'codec', 'status')))
+FILTERABLE = ('Status', 'Group', 'Resolution')
+ALL = "All"
+PAGE_SIZE = 200
+
+
+def status_class(status):
+    """'Error: connection reset' -> 'Error'; other statuses unchanged."""
+    return status.split(':', 1)[0]
+
+
+def _number(text):
+    try:
+        return float(text.split()[0])
+    except (ValueError, IndexError, AttributeError):
+        return None
+
+
+def sort_key(column, row, missing=(1,)):
+    """Comparable key for `row` under `column`; missing values get `missing`."""
+    value = row[FIELDS[column]]
+    if column == 'Resolution':
+        width, _, height = value.partition('x')
+        if width.isdigit() and height.isdigit():
+            return (0, int(height), int(width))
+        return missing
+    if column in ('FPS', 'Bitrate'):
+        number = _number(value)
+        return (0, number) if number is not None else missing
+    return (0, value.lower())
+
+
+class ResultView:
+    def __init__(self, page_size=PAGE_SIZE):
+        self.page_size = page_size
+        self.rows = []
+        self.filters = {}
+        self.sort_column = None
+        self.descending = False
+        self.page = 0
+        self.options = {column: set() for column in FILTERABLE}
+        self._entries = []  # (sort key, row index), in view order
+
+    def reset(self, rows):
+        self.rows = rows
+        self.options = {column: set() for column in FILTERABLE}
+        self.page = 0
+        self._rebuild()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def pages(self):
+        return max(1, -(-len(self._entries) // self.page_size))
+
+    def _value(self, column, row):
+        value = row[FIELDS[column]]
+        return status_class(value) if column == 'Status' else value
+
+    def _matches(self, row):
+        for column, wanted in self.filters.items():
+            if self._value(column, row) != wanted:
+                return False
+        return True
+
+    def _entry(self, i):
+        """(sort key, i) for a visible row, None if filtered out."""
+        row = self.rows[i]
+        for column, values in self.options.items():
+            values.add(self._value(column, row))
+        if not self._matches(row):
+            return None
+        if self.sort_column is None:
+            return (None, i)
+        # Pages are read back to front when descending; keep N/A at the end either way.
+        missing = (-1,) if self.descending else (1,)
+        return (sort_key(self.sort_column, row, missing), i)
+
+    def _insert(self, i):
+        entry = self._entry(i)
+        if entry is None:
+            return False
+        if self.sort_column is None:
+            self._entries.append(entry)
+        else:
+            insort(self._entries, entry)
+        return True
+
+    def _rebuild(self):
+        entries = (self._entry(i) for i in range(len(self.rows)))
+        self._entries = [entry for entry in entries if entry is not None]
+        if self.sort_column is not None:
+            self._entries.sort()
+        self.page = min(self.page, self.pages - 1)
+
+    def extend(self, start):
+        """Merge rows[start:] into the view; returns True if any were visible."""
+        added = False
+        for i in range(start, len(self.rows)):
+            added = self._insert(i) or added
+        return added
+
+    def set_filter(self, column, value):
+        if value == ALL:
+            self.filters.pop(column, None)
+        else:
+            self.filters[column] = value
+        self.page = 0
+        self._rebuild()
+
+    def sort_by(self, column):
+        """Sort by `column`; sorting by the same column again flips the order."""
+        if self.sort_column == column:
+            self.descending = not self.descending
+        else:
+            self.sort_column, self.descending = column, False
+        self._rebuild()
+
+    def turn(self, delta):
+        self.page = max(0, min(self.pages - 1, self.page + delta))
+
+    def page_rows(self):
+        count = len(self._entries)
+        start = self.page * self.page_size
+        stop = min(count, start + self.page_size)
+        if self.descending:
+            positions = range(count - 1 - start, count - 1 - stop, -1)
+        else:
+            positions = range(start, stop)
+        return [self.rows[self._entries[p][1]] for p in positions]
@@ -0,0 +1,286 @@
+"""GUI-free stream tester: pre-flight, probe and result rows for a channel list."""
+import subprocess
+import threading
+import time
+
+from .cache import normalize_url
+from .engine import Cancelled, StreamTestEngine
+from .governor import Governor, account_key
+from .metrics import empty_timings
+from .preflight import make_session, preflight
+from .bitrate import MAX_SECONDS, TOLERANCE
+from .hls import PlaylistCache, probe_hls
+from .probe import CONNECT_GRACE, STALLED, format_info, legacy_probe, probe_stream
+from .tsinfo import analyze
+
+# 'native' reads MPEG-TS headers in-process during the pre-flight, tests HLS
+# channels with the hls stage and only runs its ffprobe fallback for streams
+# neither can settle.
+PROBES = {'native': probe_stream, 'single': probe_stream, 'legacy': legacy_probe}
+
+
+def new_result(channel):
+    return {
+        'channel': channel.name,
+        'group': channel.group,
+        'url': channel.url,
+        'resolution': 'N/A',
+        'fps': 'N/A',
+        'bitrate': 'N/A',
+        'bitrate_kbps': None,
+        'bitrate_min_kbps': None,
+        'bitrate_max_kbps': None,
+        'stalls': None,
+        'underruns': None,
+        'throughput_kbps': None,
+        'variants': None,
+        'codec': 'N/A',
+        'audio': 'N/A',
+        'first_packet_ms': None,
+        **empty_timings(),
+        'cached': False,
+        'status': 'Testing...'
+    }
+
+
+def error_result(channel, error):
+    """A full row for a channel whose test raised unexpectedly."""
+    result = new_result(channel)
+    result['status'] = f'Error: {str(error)[:50]}'
+    return result
+
+
+def source_key(channel):
+    """What a channel actually plays: the Xtream stream id on its account when
+    known, else the normalized URL."""
+    if channel.stream_id is not None:
+        return ('stream', account_key(channel.url), str(channel.stream_id))
+    return normalize_url(channel.url)
+
+
+def unique_sources(channels):
+    """Split `channels` into the first entry per source and the later entries
+    that share it, keyed by (group, name, url) of that first entry."""
+    first = {}
+    primaries = []
+    followers = {}
+    for channel in channels:
+        key = source_key(channel)
+        primary = first.get(key)
+        if primary is None:
+            first[key] = channel
+            primaries.append(channel)
+        else:
+            followers.setdefault((primary.group, primary.name, primary.url), []).append(channel)
+    return primaries, followers
+
+
+class StreamTester:
+    """Tests channels with the worker pool and reports each result row.
+
+    Used by both the Tk client and the command line; `run()` blocks, so the
+    GUI calls it from a background thread and stops it with `stop()`.
+    `limits` maps account keys to the (max_connections, active_cons) a panel
+    reported; the governor keeps each account within them.  A Metrics
+    instance, if given, sees every row test_stream() produces.  With the
+    'native' probe `analyzed` and `fallbacks` count the probes settled
+    in-process and those handed to ffprobe.  `tolerance` is how stable the
+    bitrate estimate must be before a probe stops sampling (see bitrate).
+    `hls_variants` is 'top' to test an HLS channel's best playable variant
+    or 'all' for every variant; the playlists fetched are shared by all
+    channels of a run for a few seconds (see hls).
+    """
+
+    def __init__(self, workers=10, per_host=0, probe='native', use_preflight=True, cache=None, refresh=False,
+                 journal=None, limits=None, metrics=None, tolerance=TOLERANCE, hls_variants='top'):
+        self.workers = workers
+        self.per_host = per_host
+        self.governor = Governor()
+        for key, (max_connections, active) in (limits or {}).items():
+            self.governor.register(key, max_connections, active)
+        self.probe = PROBES[probe]
+        self.native = probe == 'native'
+        self.tolerance = tolerance
+        self.hls_variants = hls_variants
+        self.playlists = PlaylistCache()
+        self.use_preflight = use_preflight
+        self.cache = cache
+        self.refresh = refresh
+        self.journal = journal
+        self.metrics = metrics
+        self.session = None
+        self.engine = None
+        self.entries = self.sources = 0
+        self.analyzed = self.fallbacks = 0
+        self._count_lock = threading.Lock()
+
+    def test_stream(self, channel, cancel=None):
+        """Result row for `channel`, from the cache when a fresh entry exists."""
+        result = new_result(channel)
+        if self.cache is not None and not self.refresh:
+            cached = self.cache.get(channel.url)
+            if cached is not None:
+                result.update(cached)
+                result['cached'] = True
+                if self.metrics is not None:
+                    self.metrics.observe(result)
+                return result
+        started = time.perf_counter()
+        result = self.check_stream(channel, result, cancel)
+        result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        if self.cache is not None:
+            self.cache.put(channel.url, result)
+        if self.metrics is not None:
+            self.metrics.observe(result)
+        return result
+
+    def check_stream(self, channel, result, cancel=None):
+        """Check `channel` within its account's budget, retrying after pushback."""
+        governor = self.governor
+        key = governor.key_for(channel.url)
+        attempt = 0
+        while True:
+            governor.acquire(key, cancel)
+            result.update(empty_timings())
+            result['attempts'] = attempt + 1
+            try:
+                self._check_once(channel, result, cancel)
+            except BaseException:
+                governor.release(key, None, attempt)
+                raise
+            status = governor.release(key, result['status'], attempt)
+            if status is not None:
+                result['status'] = status
+                return result
+            attempt += 1
+
+    def _analyze(self, result, cancel):
+        """Pre-flight callback running the TS analyzer; times it as the probe."""
+        def run(chunks):
+            started = time.perf_counter()
+            try:
+                return analyze(chunks, self.tolerance, deadline=time.monotonic() + MAX_SECONDS + CONNECT_GRACE,
+                               cancel=cancel)
+            finally:
+                result['probe_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return run
+
+    def _count(self, analyzed):
+        with self._count_lock:
+            if analyzed:
+                self.analyzed += 1
+            else:
+                self.fallbacks += 1
+
+    def _check_hls(self, result, detail, cancel):
+        """Run the HLS stage on a pre-flighted playlist; False if it leaves
+        the channel to ffprobe."""
+        started = time.perf_counter()
+        try:
+            status, info, variants = probe_hls(self.session, self.playlists, result['url'], *detail['playlist'],
+                                               variants=self.hls_variants, cancel=cancel)
+        finally:
+            result['probe_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        if variants:
+            result['variants'] = variants
+        if info is None:
+            return False
+        self._count(True)
+        info['first_packet_ms'] = detail['first_byte_ms']
+        format_info(result, info)
+        result['throughput_kbps'] = info.get('throughput_kbps')
+        result['bytes_read'] = (result['bytes_read'] or 0) + info['bytes_read']
+        result['status'] = status
+        return True
+
+    def _check_once(self, channel, result, cancel):
+        try:
+            if self.session is not None:
+                analyze_ts = self._analyze(result, cancel) if self.native else None
+                status, detail = preflight(channel.url, self.session, analyze=analyze_ts, playlist=self.native)
+                for field in ('dns_ms', 'connect_ms', 'redirects', 'first_byte_ms', 'preflight_ms', 'bytes_read'):
+                    result[field] = detail[field]
+                if status:
+                    result['status'] = status
+                    return result
+                if detail['playlist'] is not None and self._check_hls(result, detail, cancel):
+                    return result
+                analyzer = detail['analysis']
+                # a stream that stopped mid-read would only stop again under ffprobe
+                if analyzer is not None and (analyzer.decided or analyzer.sampler.interrupted):
+                    self._count(True)
+                    info = analyzer.info()
+                    info['first_packet_ms'] = detail['first_byte_ms']
+                    format_info(result, info)
+                    result['status'] = STALLED if analyzer.sampler.interrupted else "OK"
+                    return result
+            if self.native:
+                self._count(False)
+            started = time.perf_counter()
+            try:
+                status, info = self.probe(channel.url, tolerance=self.tolerance, cancel=cancel)
+            finally:
+                # after an undecided analysis, the probe time covers both
+                result['probe_ms'] = round((result['probe_ms'] or 0) + (time.perf_counter() - started) * 1000, 1)
+            format_info(result, info)
+            result['bytes_read'] = (result['bytes_read'] or 0) + info['bytes_read']
+            result['status'] = status
+        except subprocess.TimeoutExpired:
+            result['status'] = "Timeout"
+        except Cancelled:
+            raise
+        except Exception as e:
+            result['status'] = f'Error: {str(e)[:50]}'
+        return result
+
+    def run(self, channels, on_result=None, dedupe=True):
+        """Test `channels`; returns the number of channel entries completed.
+
+        With dedupe, each unique source (see source_key) is probed once and
+        its result is reported for every entry that references it; `entries`
+        and `sources` hold the two counts.  Pass dedupe=False for an endless
+        or already unique feed, which is then consumed lazily.  Each result
+        is written to the journal (if any) before on_result sees it.
+        """
+        if self.journal is not None:
+            journal, callback = self.journal, on_result
+
+            def on_result(result):
+                journal.append(result)
+                if callback is not None:
+                    callback(result)
+
+        fanned = []  # follower counts of finished sources; list.append is thread-safe
+        if dedupe:
+            channels = list(channels)
+            self.entries = len(channels)
+            channels, followers = unique_sources(channels)
+            self.sources = len(channels)
+            report = on_result
+
+            def on_result(result):
+                shared = followers.get((result['group'], result['channel'], result['url']), ())
+                if shared:
+                    fanned.append(len(shared))
+                if report is None:
+                    return
+                report(result)
+                for channel in shared:
+                    report(dict(result, channel=channel.name, group=channel.group, url=channel.url))
+
+        self.engine = StreamTestEngine(self.test_stream, workers=self.workers, per_host=self.per_host,
+                                       on_result=on_result, on_error=error_result)
+        self.session = make_session(self.engine.workers) if self.use_preflight else None
+        try:
+            return self.engine.run(channels) + sum(fanned)
+        finally:
+            if self.session is not None:
+                self.session.close()
+
+    def stop(self):
+        if self.engine is not None:
+            self.engine.stop()
+
+    @property
+    def stopped(self):
+        return self.engine is not None and self.engine.stopped
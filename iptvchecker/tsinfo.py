@@ -0,0 +1,542 @@
+"""In-process MPEG-TS analyzer for the metadata the tester reports.
+
+For plain MPEG-TS streams everything in a result row can be read from the
+first seconds of the stream without spawning ffprobe:
+
+* PAT/PMT give the elementary streams, their codecs and audio languages;
+* the H.264/HEVC sequence parameter set (or the MPEG-2 sequence header)
+  gives the coded size, cropped to the display size, and for H.264/MPEG-2
+  the frame rate from the VUI timing / frame_rate_code;
+* ADTS, MPEG audio and (E-)AC-3 frame headers give the channel count;
+* PCR deltas give the time base for the bitrate, sampled adaptively by a
+  BitrateSampler, and PTS spacing gives the frame rate where the headers
+  do not carry it.
+
+Packets are parsed straight out of the received chunks through memoryview
+slices; only the few PES payloads that are needed (up to the first SPS and
+one audio frame per track) are copied.  TSAnalyzer.decided says whether
+every field was found; when it is not, the caller falls back to ffprobe.
+"""
+import time
+
+from .bitrate import MAX_SECONDS, TOLERANCE, BitrateSampler
+from .engine import Cancelled
+from .probe import empty_info
+
+PACKET = 188
+SYNC = 0x47
+NULL_PID = 0x1FFF
+METADATA_SECONDS = 5.0
+MAX_BYTES = 64 * 1024 * 1024
+MAX_PES = 256 * 1024
+PTS_SAMPLES = 48
+
+VIDEO_TYPES = {0x01: 'mpeg1video', 0x02: 'mpeg2video', 0x10: 'mpeg4', 0x1B: 'h264', 0x24: 'hevc', 0xEA: 'vc1'}
+AUDIO_TYPES = {0x03: 'mp2', 0x04: 'mp2', 0x0F: 'aac', 0x11: 'aac_latm', 0x81: 'ac3', 0x87: 'eac3'}
+# Codecs whose headers are parsed here; anything else goes to ffprobe.
+PARSED = {'mpeg1video', 'mpeg2video', 'h264', 'hevc', 'mp2', 'mp3', 'aac', 'ac3', 'eac3'}
+# DVB descriptors that identify audio carried as stream_type 0x06.
+PRIVATE_AUDIO = {0x6A: 'ac3', 0x7A: 'eac3'}
+
+MPEG2_RATES = {1: 24000 / 1001, 2: 24.0, 3: 25.0, 4: 30000 / 1001, 5: 30.0, 6: 50.0, 7: 60000 / 1001, 8: 60.0}
+COMMON_RATES = (24000 / 1001, 24.0, 25.0, 30000 / 1001, 30.0, 50.0, 60000 / 1001, 60.0, 100.0, 120.0)
+AC3_CHANNELS = (2, 1, 2, 3, 3, 4, 4, 5)
+ADTS_CHANNELS = (None, 1, 2, 3, 4, 5, 6, 8)
+H264_HIGH_PROFILES = {100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135}
+
+
+class BitReader:
+    """MSB-first reader over an RBSP (emulation prevention bytes removed)."""
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def u(self, n):
+        value = 0
+        for _ in range(n):
+            byte = self.data[self.pos >> 3]
+            value = (value << 1) | ((byte >> (7 - (self.pos & 7))) & 1)
+            self.pos += 1
+        return value
+
+    def skip(self, n):
+        self.pos += n
+
+    def ue(self):
+        zeros = 0
+        while not self.u(1):
+            zeros += 1
+            if zeros > 31:
+                raise ValueError("bad Exp-Golomb code")
+        return (1 << zeros) - 1 + self.u(zeros)
+
+    def se(self):
+        k = self.ue()
+        return (k + 1) // 2 if k & 1 else -(k // 2)
+
+
+def rbsp(nal):
+    """Strip emulation prevention bytes (00 00 03 -> 00 00)."""
+    out = bytearray()
+    zeros = 0
+    for byte in nal:
+        if zeros >= 2 and byte == 3:
+            zeros = 0
+            continue
+        out.append(byte)
+        zeros = zeros + 1 if byte == 0 else 0
+    return bytes(out)
+
+
+def _skip_scaling_list(r, size):
+    last = nxt = 8
+    for _ in range(size):
+        if nxt:
+            nxt = (last + r.se() + 256) % 256
+        last = nxt or last
+
+
+def parse_h264_sps(nal):
+    """(width, height, fps or None) from an H.264 SPS NAL unit, header byte included."""
+    r = BitReader(rbsp(nal[1:]))
+    profile = r.u(8)
+    r.skip(16)  # constraint flags, level
+    r.ue()  # seq_parameter_set_id
+    chroma = 1
+    separate_planes = 0
+    if profile in H264_HIGH_PROFILES:
+        chroma = r.ue()
+        if chroma == 3:
+            separate_planes = r.u(1)
+        r.ue()
+        r.ue()
+        r.skip(1)
+        if r.u(1):  # seq_scaling_matrix_present_flag
+            for i in range(8 if chroma != 3 else 12):
+                if r.u(1):
+                    _skip_scaling_list(r, 16 if i < 6 else 64)
+    r.ue()  # log2_max_frame_num_minus4
+    poc_type = r.ue()
+    if poc_type == 0:
+        r.ue()
+    elif poc_type == 1:
+        r.skip(1)
+        r.se()
+        r.se()
+        for _ in range(r.ue()):
+            r.se()
+    r.ue()  # max_num_ref_frames
+    r.skip(1)
+    width_mbs = r.ue() + 1
+    height_units = r.ue() + 1
+    frame_mbs_only = r.u(1)
+    if not frame_mbs_only:
+        r.skip(1)
+    r.skip(1)  # direct_8x8_inference_flag
+    width = width_mbs * 16
+    height = (2 - frame_mbs_only) * height_units * 16
+    if r.u(1):  # frame_cropping_flag
+        left, right, top, bottom = r.ue(), r.ue(), r.ue(), r.ue()
+        if chroma == 0 or separate_planes:
+            unit_x, unit_y = 1, 2 - frame_mbs_only
+        else:
+            unit_x = 1 if chroma == 3 else 2
+            unit_y = (2 if chroma == 1 else 1) * (2 - frame_mbs_only)
+        width -= (left + right) * unit_x
+        height -= (top + bottom) * unit_y
+    fps = None
+    if r.u(1):  # vui_parameters_present_flag
+        if r.u(1):
+            if r.u(8) == 255:
+                r.skip(32)
+        if r.u(1):
+            r.skip(1)
+        if r.u(1):
+            r.skip(4)
+            if r.u(1):
+                r.skip(24)
+        if r.u(1):
+            r.ue()
+            r.ue()
+        if r.u(1):  # timing_info_present_flag
+            units, scale = r.u(32), r.u(32)
+            if units and scale:
+                fps = scale / (2 * units)
+    return width, height, fps
+
+
+def _skip_profile_tier_level(r, sub_layers):
+    r.skip(88 + 8)  # general profile/tier/flags, general_level_idc
+    present = [(r.u(1), r.u(1)) for _ in range(sub_layers)]
+    if sub_layers:
+        r.skip(2 * (8 - sub_layers))
+    for profile, level in present:
+        r.skip(88 * profile + 8 * level)
+
+
+def parse_hevc_sps(nal):
+    """(width, height, None) from an HEVC SPS NAL unit; the frame rate comes
+    from PTS spacing, since the VUI sits behind the reference picture sets."""
+    r = BitReader(rbsp(nal[2:]))
+    r.skip(4)
+    sub_layers = r.u(3)
+    r.skip(1)
+    _skip_profile_tier_level(r, sub_layers)
+    r.ue()  # sps_seq_parameter_set_id
+    chroma = r.ue()
+    if chroma == 3:
+        r.skip(1)
+    width, height = r.ue(), r.ue()
+    if r.u(1):  # conformance_window_flag
+        left, right, top, bottom = r.ue(), r.ue(), r.ue(), r.ue()
+        unit_x = 2 if chroma in (1, 2) else 1
+        unit_y = 2 if chroma == 1 else 1
+        width -= (left + right) * unit_x
+        height -= (top + bottom) * unit_y
+    return width, height, None
+
+
+def parse_mpeg2_sequence(data):
+    """(width, height, fps) from the bytes after a 00 00 01 B3 start code."""
+    width = (data[0] << 4) | (data[1] >> 4)
+    height = ((data[1] & 0x0F) << 8) | data[2]
+    return width, height, MPEG2_RATES.get(data[3] & 0x0F)
+
+
+def audio_header(codec, data):
+    """(codec, channels) from the start of an audio PES payload, or None."""
+    for i in range(min(len(data) - 7, 4096)):
+        b0, b1 = data[i], data[i + 1]
+        if codec == 'aac' and b0 == 0xFF and b1 & 0xF6 == 0xF0:
+            config = ((data[i + 2] & 1) << 2) | (data[i + 3] >> 6)
+            channels = ADTS_CHANNELS[config]
+            return (codec, channels) if channels else None
+        if codec in ('mp2', 'mp3') and b0 == 0xFF and b1 & 0xE0 == 0xE0 and (b1 >> 1) & 3:
+            layer = (b1 >> 1) & 3
+            name = {1: 'mp3', 2: 'mp2', 3: 'mp1'}[layer]
+            return name, 1 if data[i + 2 + 1] >> 6 == 3 else 2
+        if codec in ('ac3', 'eac3') and b0 == 0x0B and b1 == 0x77:
+            if data[i + 5] >> 3 > 10:  # bsid above 10 is E-AC-3
+                acmod = (data[i + 4] >> 1) & 7
+                lfe = data[i + 4] & 1
+                return 'eac3', AC3_CHANNELS[acmod] + lfe
+            bits = BitReader(bytes(data[i + 6:i + 8]))
+            acmod = bits.u(3)
+            if acmod & 1 and acmod != 1:
+                bits.skip(2)
+            if acmod & 4:
+                bits.skip(2)
+            if acmod == 2:
+                bits.skip(2)
+            return 'ac3', AC3_CHANNELS[acmod] + bits.u(1)
+    return None
+
+
+def _pts(data, offset):
+    return (((data[offset] >> 1) & 7) << 30 | data[offset + 1] << 22 | (data[offset + 2] >> 1) << 15
+            | data[offset + 3] << 7 | data[offset + 4] >> 1)
+
+
+def snap_rate(fps):
+    """Snap a measured rate onto the nearest broadcast rate within 1%."""
+    for rate in COMMON_RATES:
+        if abs(fps - rate) / rate < 0.01:
+            return rate
+    return fps
+
+
+class ElementaryStream:
+    __slots__ = ('pid', 'kind', 'codec', 'language', 'width', 'height', 'fps', 'channels', 'pes', 'pts',
+                 'done')
+
+    def __init__(self, pid, kind, codec, language=None):
+        self.pid = pid
+        self.kind = kind
+        self.codec = codec
+        self.language = language
+        self.width = self.height = self.fps = self.channels = None
+        self.pes = None
+        self.pts = []
+        self.done = codec not in PARSED
+
+
+class TSAnalyzer:
+    """Feed it stream chunks; read `decided` and info() when done."""
+
+    def __init__(self, sampler=None):
+        self.bytes = 0
+        self.sampler = sampler or BitrateSampler()
+        self.pmt_pid = None
+        self.pcr_pid = None
+        self.streams = None  # pid -> ElementaryStream, in PMT order, once the PMT is seen
+        self._pending = 0  # elementary payload bytes since the last PCR
+        self._pcr_offset = 0.0
+        self._last_pcr = None
+        self._now = None
+        self._sections = {}
+        self._tail = b''
+
+    @property
+    def metadata_done(self):
+        return self.streams is not None and all(s.done for s in self.streams.values())
+
+    @property
+    def decided(self):
+        """True when every stream's fields were found in-process."""
+        if not self.metadata_done:
+            return False
+        video = [s for s in self.streams.values() if s.kind == 'video']
+        audio = [s for s in self.streams.values() if s.kind == 'audio']
+        if not video and not audio:
+            return False
+        return all(s.codec in PARSED for s in video + audio)
+
+    def feed(self, chunk):
+        """Parse every whole packet in `chunk`, carrying a partial one over."""
+        self._now = time.monotonic()
+        view = memoryview(chunk)
+        pos = 0
+        if self._tail:
+            need = PACKET - len(self._tail)
+            if len(view) < need:
+                self._tail += bytes(view)
+                return
+            self._packet(memoryview(self._tail + bytes(view[:need])))
+            pos = need
+            self._tail = b''
+        end = len(view)
+        while pos + PACKET <= end:
+            if view[pos] != SYNC:
+                pos = self._resync(view, pos)
+                continue
+            self._packet(view[pos:pos + PACKET])
+            pos += PACKET
+        if pos < end:
+            self._tail = bytes(view[pos:])
+
+    def _resync(self, view, pos):
+        """Next offset where two packets in a row start with the sync byte."""
+        end = len(view)
+        for i in range(pos + 1, end):
+            if view[i] == SYNC and (i + PACKET >= end or view[i + PACKET] == SYNC):
+                return i
+        return end
+
+    def _packet(self, p):
+        self.bytes += PACKET
+        pid = ((p[1] & 0x1F) << 8) | p[2]
+        if pid == NULL_PID:
+            return
+        pusi = p[1] & 0x40
+        afc = (p[3] >> 4) & 3
+        start = 4
+        if afc & 2:
+            length = p[4]
+            if pid == self.pcr_pid and length >= 7 and p[5] & 0x10:
+                pcr = ((p[6] << 25) | (p[7] << 17) | (p[8] << 9) | (p[9] << 1) | (p[10] >> 7)) / 90000
+                pcr += self._pcr_offset
+                if self._last_pcr is not None and pcr < self._last_pcr:  # discontinuity: carry on the timeline
+                    self._pcr_offset += self._last_pcr - pcr
+                    pcr = self._last_pcr
+                self._last_pcr = pcr
+                self.sampler.add(self._pending, pcr, self._now)
+                self._pending = 0
+            start = 5 + length
+        if not afc & 1 or start >= PACKET:
+            return
+        payload = p[start:]
+        if pid == 0 or pid == self.pmt_pid:
+            self._psi(pid, payload, pusi)
+            return
+        if self.streams is None:
+            return
+        stream = self.streams.get(pid)
+        if stream is None:
+            return
+        self._pending += len(payload)
+        if not stream.done:
+            self._pes(stream, payload, pusi)
+
+    def _psi(self, pid, payload, pusi):
+        if pusi:
+            pointer = payload[0]
+            section = bytes(payload[1 + pointer:])
+        elif pid in self._sections:
+            section = self._sections[pid] + bytes(payload)
+        else:
+            return
+        if len(section) < 3:
+            self._sections[pid] = section
+            return
+        length = ((section[1] & 0x0F) << 8 | section[2]) + 3
+        if len(section) < length:
+            self._sections[pid] = section
+            return
+        self._sections.pop(pid, None)
+        section = section[:length]
+        if section[0] == 0x00:
+            self._pat(section)
+        elif section[0] == 0x02 and self.streams is None:
+            self._pmt(section)
+
+    def _pat(self, section):
+        for i in range(8, len(section) - 4, 4):
+            program = section[i] << 8 | section[i + 1]
+            if program:
+                self.pmt_pid = ((section[i + 2] & 0x1F) << 8) | section[i + 3]
+                return
+
+    def _pmt(self, section):
+        self.pcr_pid = ((section[8] & 0x1F) << 8) | section[9]
+        i = 12 + (((section[10] & 0x0F) << 8) | section[11])
+        streams = {}
+        end = len(section) - 4
+        while i + 5 <= end:
+            stream_type = section[i]
+            pid = ((section[i + 1] & 0x1F) << 8) | section[i + 2]
+            info_length = ((section[i + 3] & 0x0F) << 8) | section[i + 4]
+            descriptors = section[i + 5:i + 5 + info_length]
+            i += 5 + info_length
+            language = None
+            private_codec = None
+            j = 0
+            while j + 2 <= len(descriptors):
+                tag, size = descriptors[j], descriptors[j + 1]
+                body = descriptors[j + 2:j + 2 + size]
+                if tag == 0x0A and size >= 3:
+                    language = body[:3].decode('latin-1').strip('\0 ') or None
+                elif tag in PRIVATE_AUDIO:
+                    private_codec = PRIVATE_AUDIO[tag]
+                j += 2 + size
+            if stream_type in VIDEO_TYPES:
+                streams[pid] = ElementaryStream(pid, 'video', VIDEO_TYPES[stream_type])
+            elif stream_type in AUDIO_TYPES:
+                streams[pid] = ElementaryStream(pid, 'audio', AUDIO_TYPES[stream_type], language)
+            elif stream_type == 0x06 and private_codec:
+                streams[pid] = ElementaryStream(pid, 'audio', private_codec, language)
+        self.streams = streams
+
+    def _pes(self, stream, payload, pusi):
+        if pusi:
+            if len(payload) < 9 or payload[0] != 0 or payload[1] != 0 or payload[2] != 1:
+                return
+            header_length = payload[8]
+            if payload[7] & 0x80 and len(payload) >= 14 and stream.kind == 'video':
+                if len(stream.pts) < PTS_SAMPLES:
+                    stream.pts.append(_pts(payload, 9))
+            if stream.pes is None or stream.kind == 'audio':
+                stream.pes = bytearray()
+            stream.pes += payload[9 + header_length:]
+        elif stream.pes is not None:
+            stream.pes += payload
+        else:
+            return
+        if stream.kind == 'video':
+            self._video(stream)
+        else:
+            self._audio(stream)
+        if stream.pes is not None and len(stream.pes) > MAX_PES:
+            stream.pes = None
+
+    def _video(self, stream):
+        if stream.width is None:
+            data = stream.pes
+            found = _find_header(stream.codec, data)
+            if found is None:
+                return
+            stream.width, stream.height, stream.fps = found
+            stream.pes = None
+        if stream.fps is None and len(stream.pts) >= PTS_SAMPLES:
+            stream.fps = _pts_rate(stream.pts)
+        stream.done = stream.fps is not None
+
+    def _audio(self, stream):
+        header = audio_header(stream.codec, stream.pes)
+        if header is not None:
+            stream.codec, stream.channels = header
+            stream.done = True
+            stream.pes = None
+
+    def finish(self):
+        """Use whatever PTS samples there are for streams still missing a rate."""
+        for stream in (self.streams or {}).values():
+            if stream.kind == 'video' and stream.width is not None and stream.fps is None and len(stream.pts) > 2:
+                stream.fps = _pts_rate(stream.pts)
+                stream.done = stream.fps is not None
+
+    def info(self):
+        """A probe info dict (see probe.empty_info) of what was found."""
+        info = empty_info()
+        for stream in (self.streams or {}).values():
+            if stream.kind == 'video' and info['codec'] is None:
+                info['codec'] = stream.codec
+                if stream.width and stream.height:
+                    info['width'], info['height'] = stream.width, stream.height
+                info['fps'] = stream.fps
+            elif stream.kind == 'audio':
+                info['audio_tracks'].append({'codec': stream.codec, 'channels': stream.channels,
+                                             'language': stream.language})
+        info.update(self.sampler.stats())
+        return info
+
+
+def _find_header(codec, data):
+    """Parse the first complete sequence header in `data`, or None."""
+    start = 0
+    while True:
+        i = data.find(b'\x00\x00\x01', start)
+        if i < 0 or i + 4 >= len(data):
+            return None
+        nal = i + 3
+        if codec == 'h264' and data[nal] & 0x1F == 7 or codec == 'hevc' and (data[nal] >> 1) & 0x3F == 33:
+            end = data.find(b'\x00\x00\x01', nal)
+            if end < 0:
+                return None  # wait until the whole SPS is in
+            try:
+                parse = parse_h264_sps if codec == 'h264' else parse_hevc_sps
+                return parse(bytes(data[nal:end]))
+            except (ValueError, IndexError):
+                return None
+        if codec in ('mpeg1video', 'mpeg2video') and data[nal] == 0xB3:
+            if nal + 5 > len(data):
+                return None
+            return parse_mpeg2_sequence(data[nal + 1:nal + 5])
+        start = nal
+
+
+def _pts_rate(pts):
+    """Frame rate from the most common gap between sorted PTS values."""
+    ordered = sorted(pts)
+    gaps = sorted(b - a for a, b in zip(ordered, ordered[1:]) if b > a)
+    if not gaps:
+        return None
+    return snap_rate(90000 / gaps[len(gaps) // 2])
+
+
+def analyze(chunks, tolerance=TOLERANCE, max_seconds=MAX_SECONDS, max_bytes=MAX_BYTES, deadline=None,
+            cancel=None):
+    """Run a TSAnalyzer over `chunks` until it has every field and a bitrate
+    stable within `tolerance`, or gives up: `max_seconds` of stream, a
+    metadata field still missing after METADATA_SECONDS, `max_bytes` read,
+    the time.monotonic() `deadline` passed or the chunks ran out.  An OSError
+    from `chunks` (a read timeout or a dropped connection) interrupts the
+    sampler at the time it was raised; see BitrateSampler.interrupt()."""
+    analyzer = TSAnalyzer(BitrateSampler(tolerance, max_seconds=max_seconds))
+    sampler = analyzer.sampler
+    try:
+        for chunk in chunks:
+            if cancel is not None and cancel.is_set():
+                raise Cancelled()
+            analyzer.feed(chunk)
+            if analyzer.metadata_done:
+                if sampler.done:
+                    break
+            elif sampler.span >= METADATA_SECONDS:
+                break
+            if analyzer.bytes >= max_bytes or (deadline is not None and time.monotonic() >= deadline):
+                break
+    except OSError:
+        sampler.interrupt(time.monotonic())
+    analyzer.finish()
+    return analyzer
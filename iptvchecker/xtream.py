@@ -0,0 +1,176 @@
+"""Xtream Codes API loader.
+
+All requests share one pooled keep-alive session (gzip is negotiated by
+requests and decoded on the fly).  The auth and category calls run
+concurrently, and the potentially tens-of-MB get_live_streams response is
+decoded incrementally, one stream object at a time, so memory stays bounded
+by the compact Channel records rather than the raw JSON.  When only some
+categories are wanted, each is fetched in parallel with category_id=.
+"""
+import codecs
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .governor import account_key
+from .playlist import Channel, Playlist
+from .probe import USER_AGENT
+
+CHUNK_SIZE = 65536
+_SKIP = ' \t\r\n,'
+
+
+class XtreamError(Exception):
+    pass
+
+
+def iter_json_array(chunks, encoding='utf-8'):
+    """Yield the elements of a JSON array as its bytes arrive.
+
+    A response that is not an array (panels sometimes return an object keyed
+    by id, or an error object) is decoded whole; for an object its values are
+    yielded.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder(encoding)('replace')
+    buf = ''
+    pos = 0
+    started = False
+    whole = None
+    for chunk in chunks:
+        if whole is not None:
+            whole.append(text.decode(chunk))
+            continue
+        buf = buf[pos:] + text.decode(chunk)
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in _SKIP:
+                pos += 1
+            if pos >= len(buf):
+                break
+            if not started:
+                if buf[pos] != '[':
+                    whole = [buf[pos:]]
+                    break
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # element continues in the next chunk
+            if end == len(buf) and not isinstance(item, (dict, list)):
+                break  # a bare number or literal may still be cut short
+            pos = end
+            yield item
+    if whole is not None:
+        whole.append(text.decode(b'', final=True))
+        data = json.loads(''.join(whole))
+        yield from (data.values() if isinstance(data, dict) else [data])
+    elif started:
+        raise XtreamError("Truncated stream list from server")
+
+
+class XtreamClient:
+    def __init__(self, server, username, password, timeout=30, workers=8):
+        self.server = server.rstrip('/')
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.workers = workers
+        self.user_info = {}
+        self.server_info = {}
+        self.categories = {}
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['User-Agent'] = USER_AGENT
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _get(self, action=None, stream=False, **params):
+        params.update(username=self.username, password=self.password)
+        if action:
+            params['action'] = action
+        response = self.session.get(f"{self.server}/player_api.php", params=params,
+                                    timeout=self.timeout, stream=stream)
+        response.raise_for_status()
+        return response
+
+    def connect(self):
+        """Authenticate and fetch the live categories concurrently."""
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            auth = pool.submit(lambda: self._get().json())
+            categories = pool.submit(lambda: self._get('get_live_categories').json())
+            auth_data = auth.result()
+            if not isinstance(auth_data, dict) or auth_data.get('user_info', {}).get('auth') != 1:
+                categories.cancel()
+                raise XtreamError("Authentication failed")
+            self.user_info = auth_data.get('user_info', {})
+            self.server_info = auth_data.get('server_info', {})
+            self.categories = {str(cat['category_id']): sys.intern(cat['category_name'])
+                               for cat in categories.result() or ()}
+        return self.user_info
+
+    def stream_url(self, stream_id):
+        return f"{self.server}/live/{self.username}/{self.password}/{stream_id}.ts"
+
+    def iter_channels(self, category_id=None):
+        """Yield a Channel per live stream, decoding the response as it streams in."""
+        params = {'category_id': category_id} if category_id is not None else {}
+        with self._get('get_live_streams', stream=True, **params) as response:
+            for stream in iter_json_array(response.iter_content(CHUNK_SIZE)):
+                if not isinstance(stream, dict) or 'stream_id' not in stream:
+                    continue
+                group_name = self.categories.get(str(stream.get('category_id', '0')), 'Uncategorized')
+                yield Channel(stream.get('name', 'Unknown'), group_name,
+                              self.stream_url(stream['stream_id']), stream_id=stream.get('stream_id'))
+
+    def load(self, groups=None, progress=None, every=10000):
+        """Playlist of live channels; with `groups`, only those categories are
+        fetched (one parallel request each)."""
+        playlist = Playlist()
+        if self.user_info.get('max_connections'):
+            playlist.accounts[account_key(self.stream_url(0))] = (
+                self.user_info['max_connections'], self.user_info.get('active_cons', 0))
+
+        def add(channel):
+            playlist.add(channel)
+            if progress is not None and len(playlist) % every == 0:
+                progress(len(playlist))
+
+        if not groups:
+            for channel in self.iter_channels():
+                add(channel)
+            return playlist
+        by_name = {name: cat_id for cat_id, name in self.categories.items()}
+        missing = [g for g in groups if g not in by_name]
+        if missing:
+            raise XtreamError(f"Unknown categories: {', '.join(missing)}")
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            # Each worker decodes its own category; results are added in category order.
+            batches = pool.map(lambda name: list(self.iter_channels(by_name[name])), groups)
+            for batch in batches:
+                for channel in batch:
+                    add(channel)
+        return playlist
+
+
+def load_xtream(server, username, password, groups=None, timeout=30, progress=None):
+    """Authenticate against an Xtream Codes panel and return its live channels."""
+    with XtreamClient(server, username, password, timeout=timeout) as client:
+        client.connect()
+        return client.load(groups, progress=progress)
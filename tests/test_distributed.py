@@ -0,0 +1,54 @@
+"""Worker and coordinator protocol edges (needs requests)."""
+import pytest
+
+pytest.importorskip('requests')
+
+from iptvchecker import distributed  # noqa: E402
+from iptvchecker.distributed import Coordinator, DistributedError, ShardQueue, Worker  # noqa: E402
+from iptvchecker.playlist import Channel  # noqa: E402
+
+
+def scripted(monkeypatch, replies):
+    """A Worker whose /lease calls answer from `replies` in turn, then keep
+    failing; an exception in the list is raised instead."""
+    monkeypatch.setattr(distributed, 'POLL_SECONDS', 0)
+    worker = Worker('http://coordinator', tester=None, name='w')
+    calls = []
+
+    def post(path, payload):
+        calls.append(path)
+        reply = replies.pop(0) if replies else DistributedError("gone")
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    worker._post = post
+    return worker, calls
+
+
+def test_worker_rides_out_a_dropped_request(monkeypatch):
+    worker, calls = scripted(monkeypatch, [(204, None), DistributedError("reset"), (204, None), (410, None)])
+    assert worker.run() == 0
+    assert len(calls) == 4
+
+
+def test_worker_stops_once_coordinator_stays_away(monkeypatch):
+    worker, calls = scripted(monkeypatch, [(204, None)])
+    worker._lease_seconds = 0.05
+    assert worker.run() == 0
+    assert len(calls) > 1
+
+
+def test_results_with_malformed_rows_are_rejected():
+    channels = [Channel('One', 'News', 'http://h/1')]
+    coordinator = Coordinator(ShardQueue(channels))
+    _, lease = coordinator.handle('/lease', {'worker': 'w'})
+    good = {'channel': 'One', 'group': 'News', 'url': 'http://h/1', 'status': 'OK'}
+    for results in ([{'status': 'OK'}], [good, 'OK'], {'status': 'OK'}, [dict(good, status=None)]):
+        status, _ = coordinator.handle('/results', {'worker': 'w', 'shard': lease['shard'],
+                                                    'token': lease['token'], 'results': results})
+        assert status == 400
+    status, reply = coordinator.handle('/results', {'worker': 'w', 'shard': lease['shard'],
+                                                    'token': lease['token'], 'results': [good], 'done': True})
+    assert status == 200 and reply['accepted'] == 1
+    assert coordinator.done.is_set()
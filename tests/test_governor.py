@@ -0,0 +1,76 @@
+"""Governor windows and pushback rules."""
+import threading
+
+import pytest
+
+from iptvchecker.engine import Cancelled
+from iptvchecker.governor import Governor
+from iptvchecker.probe import THROTTLED
+
+
+def capped(cap):
+    governor = Governor(backoff=0)
+    governor.register('panel/user', cap)
+    return governor
+
+
+def test_403_on_a_single_connection_account_is_auth():
+    governor = capped(1)
+    governor.acquire('panel/user')
+    assert governor.release('panel/user', "Auth", 0) == "Auth"
+    stats, = governor.stats()
+    assert stats['throttles'] == 0 and stats['retries'] == 0
+    assert stats['window'] == 1 and stats['cooldown'] == 0
+
+
+def test_403_on_a_lone_probe_below_the_cap_is_auth():
+    governor = capped(10)
+    governor.acquire('panel/user')
+    assert governor.release('panel/user', "Auth", 0) == "Auth"
+    assert governor.limit('panel/user') == 10
+
+
+def test_403_at_the_cap_is_retried_then_throttled():
+    governor = capped(2)
+    for attempt in range(governor.max_retries + 1):
+        governor.acquire('panel/user')
+        governor.acquire('panel/user')
+        status = governor.release('panel/user', "Auth", attempt)
+        governor.release('panel/user', "OK", 0)
+        if attempt < governor.max_retries:
+            assert status is None
+    assert status == THROTTLED
+
+
+def test_429_is_always_pushback():
+    governor = capped(1)
+    governor.acquire('panel/user')
+    assert governor.release('panel/user', THROTTLED, 0) is None
+    governor.acquire('panel/user')
+    assert governor.release('panel/user', THROTTLED, governor.max_retries) == THROTTLED
+
+
+def test_acquire_waits_for_room_in_the_window():
+    governor = capped(1)
+    governor.acquire('panel/user')
+    entered = threading.Event()
+
+    def second():
+        governor.acquire('panel/user')
+        entered.set()
+
+    thread = threading.Thread(target=second, daemon=True)
+    thread.start()
+    assert not entered.wait(0.3)
+    governor.release('panel/user', "OK", 0)
+    assert entered.wait(2)
+    thread.join(2)
+
+
+def test_acquire_gives_up_when_cancelled():
+    governor = capped(1)
+    governor.acquire('panel/user')
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(Cancelled):
+        governor.acquire('panel/user', cancel)
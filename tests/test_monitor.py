@@ -0,0 +1,23 @@
+"""Monitor history bookkeeping."""
+from iptvchecker.monitor import ChannelHistory, MonitorPolicy
+
+
+def test_transient_results_leave_history_alone():
+    h = ChannelHistory(channel=None)
+    assert not h.record('OK', 1)
+    for status in ('Throttled', 'Error: connection reset', 'Throttled'):
+        assert not h.record(status, 2)
+    assert h.up and h.checks == 1 and h.streak == 0 and h.flips == 0
+    assert h.record('Dead', 3)
+    assert not h.record('Error: timeout', 4)
+    assert not h.up and h.streak == 1 and h.checks == 2 and h.checked_at == 3
+
+
+def test_transient_results_keep_the_down_interval():
+    policy = MonitorPolicy()
+    h = ChannelHistory(channel=None)
+    h.record('Dead', 0)
+    before = policy.interval(h)
+    for _ in range(5):
+        h.record('Throttled', 1)
+    assert policy.interval(h) == before
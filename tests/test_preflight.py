@@ -0,0 +1,70 @@
+"""Pre-flight reads of short bodies (needs requests)."""
+import pytest
+
+requests = pytest.importorskip('requests')
+
+from iptvchecker.preflight import SNIFF_BYTES, preflight  # noqa: E402
+
+MASTER = (b'#EXTM3U\n'
+          b'#EXT-X-STREAM-INF:BANDWIDTH=4500000,RESOLUTION=1920x1080\nhi/index.m3u8\n'
+          b'#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360\nlow/index.m3u8\n')
+
+
+class Response:
+    """Streams `body` once, like requests: a second iter_content() carries on
+    from the raw stream, or raises StreamConsumedError if the first one ran
+    to the end."""
+
+    def __init__(self, url, body, content_type):
+        self.url = url
+        self.status_code = 200
+        self.headers = {'Content-Type': content_type}
+        self.history = []
+        self._body = body
+        self._position = 0  # in the raw stream, shared by every iter_content()
+        self._consumed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, size):
+        if self._consumed:
+            raise requests.exceptions.StreamConsumedError()
+
+        def generate():
+            while self._position < len(self._body):
+                chunk = self._body[self._position:self._position + size]
+                self._position += len(chunk)
+                yield chunk
+            self._consumed = True
+        return generate()
+
+
+class Session:
+    def __init__(self, body, content_type):
+        self.body = body
+        self.content_type = content_type
+
+    def get(self, url, **kwargs):
+        return Response(url, self.body, self.content_type)
+
+
+def test_playlist_shorter_than_the_sniff_is_read():
+    assert len(MASTER) < SNIFF_BYTES
+    url = 'http://provider.example/live/u/p/1.m3u8'
+    status, detail = preflight(url, Session(MASTER, 'application/vnd.apple.mpegurl'), playlist=True)
+    assert status is None
+    assert detail['kind'] == 'hls'
+    assert detail['playlist'] == (MASTER.decode(), url)
+
+
+def test_playlist_longer_than_the_sniff_is_read_to_the_end():
+    body = MASTER + b''.join(b'#EXT-X-STREAM-INF:BANDWIDTH=%d\nv%d/index.m3u8\n' % (i, i) for i in range(300))
+    assert len(body) > SNIFF_BYTES
+    status, detail = preflight('http://provider.example/1.m3u8', Session(body, ''), playlist=True)
+    assert status is None
+    assert detail['playlist'][0] == body.decode()
+    assert detail['bytes_read'] == len(body)